@@ -0,0 +1,34 @@
+# alembic/env.py
+from logging.config import fileConfig
+
+from alembic import context
+
+from app.database import Base, engine
+from app.models import analytics, job, scan, user  # noqa: F401  (registers the tables with Base)
+
+if context.config.config_file_name is not None:
+    fileConfig(context.config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline():
+    context.configure(url=str(engine.url), target_metadata=target_metadata, literal_binds=True,
+                      render_as_batch=engine.dialect.name == "sqlite")
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    with engine.connect() as connection:
+        # SQLite can't ALTER most things in place; batch mode rebuilds the table
+        context.configure(connection=connection, target_metadata=target_metadata,
+                          render_as_batch=connection.dialect.name == "sqlite")
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
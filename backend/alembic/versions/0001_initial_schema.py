@@ -0,0 +1,51 @@
+"""initial schema (users, scans)
+
+Databases created by the app's create_all() before migrations existed
+already have these tables; they are left alone, so `alembic upgrade head`
+works on those as well as on an empty database.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("name", sa.String, nullable=True),
+            sa.Column("email", sa.String, nullable=False),
+            sa.Column("password", sa.String, nullable=False),
+            sa.Column("role", sa.Enum("user", "admin", name="roleenum"), nullable=True),
+            sa.Column("created_at", sa.DateTime, nullable=True),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+    if "scans" not in existing:
+        op.create_table(
+            "scans",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), nullable=True),
+            sa.Column("image_path", sa.String, nullable=False),
+            sa.Column("prediction", sa.String, nullable=False),
+            sa.Column("confidence", sa.Float, nullable=False),
+            sa.Column("raw_probs", sa.Text, nullable=True),
+            sa.Column("created_at", sa.DateTime, nullable=True),
+        )
+        op.create_index("ix_scans_id", "scans", ["id"])
+
+
+def downgrade():
+    op.drop_table("scans")
+    op.drop_table("users")
+    sa.Enum(name="roleenum").drop(op.get_bind(), checkfirst=True)
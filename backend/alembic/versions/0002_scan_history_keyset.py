@@ -0,0 +1,78 @@
+"""scan history: composite indexes, structured probabilities
+
+- (user_id, created_at, id) and (user_id, prediction, created_at, id)
+  indexes for keyset-paginated GET /scan/history
+- raw_probs (the text "[0.91, 0.06, 0.03]") -> probs JSON keyed by class,
+  backfilled in batches, then raw_probs is dropped
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+import ast
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# Class order of the model that wrote raw_probs; frozen here on purpose, so
+# later model changes can't alter what this migration does
+CLASS_NAMES = ["NORMAL", "BACTERIAL", "VIRAL"]
+BATCH = 5000
+
+scans = sa.table(
+    "scans",
+    sa.column("id", sa.Integer),
+    sa.column("raw_probs", sa.Text),
+    sa.column("probs", sa.JSON(none_as_null=True)),
+)
+
+
+def _parse(raw):
+    try:
+        values = ast.literal_eval(raw)
+        return {name: float(p) for name, p in zip(CLASS_NAMES, values)}
+    except (ValueError, SyntaxError, TypeError):
+        return None
+
+
+def _copy(bind, convert, source, target):
+    """Rewrites `target` from `source` for every row, BATCH rows at a time."""
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(scans.c.id, source).where(scans.c.id > last_id, source.isnot(None))
+            .order_by(scans.c.id).limit(BATCH)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            scans.update().where(scans.c.id == sa.bindparam("_id")).values({target.name: sa.bindparam("_value")}),
+            [{"_id": i, "_value": convert(v)} for i, v in rows],
+        )
+        last_id = rows[-1][0]
+
+
+def upgrade():
+    bind = op.get_bind()
+    op.add_column("scans", sa.Column("probs", sa.JSON, nullable=True))
+    _copy(bind, _parse, scans.c.raw_probs, scans.c.probs)
+    with op.batch_alter_table("scans") as batch:
+        batch.drop_column("raw_probs")
+    op.create_index("ix_scans_user_created", "scans", ["user_id", "created_at", "id"])
+    op.create_index("ix_scans_user_prediction_created", "scans", ["user_id", "prediction", "created_at", "id"])
+
+
+def downgrade():
+    bind = op.get_bind()
+    op.drop_index("ix_scans_user_prediction_created", table_name="scans")
+    op.drop_index("ix_scans_user_created", table_name="scans")
+    op.add_column("scans", sa.Column("raw_probs", sa.Text, nullable=True))
+    _copy(bind, lambda probs: str([probs[name] for name in CLASS_NAMES if name in probs]),
+          scans.c.probs, scans.c.raw_probs)
+    with op.batch_alter_table("scans") as batch:
+        batch.drop_column("probs")
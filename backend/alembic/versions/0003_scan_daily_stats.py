@@ -0,0 +1,35 @@
+"""scan analytics rollup (scan_daily_stats)
+
+Per UTC day x user x label x confidence decile counters, plus an
+all-users total, behind /admin/analytics. Created empty: fill it from
+existing scans with `python -m app.cli.backfill_analytics`.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "scan_daily_stats",
+        sa.Column("day", sa.Date, primary_key=True),
+        sa.Column("user_id", sa.Integer, primary_key=True),
+        sa.Column("label", sa.String, primary_key=True),
+        sa.Column("bucket", sa.Integer, primary_key=True),
+        sa.Column("count", sa.Integer, nullable=False),
+        sa.Column("confidence_sum", sa.Float, nullable=False),
+    )
+    op.create_index("ix_scan_daily_stats_user_day", "scan_daily_stats", ["user_id", "day"])
+
+
+def downgrade():
+    op.drop_index("ix_scan_daily_stats_user_day", table_name="scan_daily_stats")
+    op.drop_table("scan_daily_stats")
@@ -0,0 +1,26 @@
+"""scans.model_version
+
+The model registry version (short hash of the model file) that scored
+each scan. Left NULL for existing rows: which model scored them wasn't
+recorded.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("scans", sa.Column("model_version", sa.String, nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("scans") as batch:
+        batch.drop_column("model_version")
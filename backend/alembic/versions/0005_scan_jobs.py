@@ -0,0 +1,39 @@
+"""scan_jobs
+
+Durable queue behind POST /scan/predict/save?async=true: one row per
+queued upload, leased by a job worker while it is scored.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "scan_jobs",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("image_key", sa.String, nullable=False),
+        sa.Column("status", sa.String, nullable=False),
+        sa.Column("attempts", sa.Integer, nullable=False),
+        sa.Column("locked_by", sa.String, nullable=True),
+        sa.Column("lease_expires_at", sa.DateTime, nullable=True),
+        sa.Column("scan_id", sa.Integer, sa.ForeignKey("scans.id"), nullable=True),
+        sa.Column("error", sa.String, nullable=True),
+        sa.Column("created_at", sa.DateTime, nullable=True),
+        sa.Column("updated_at", sa.DateTime, nullable=True),
+    )
+    op.create_index("ix_scan_jobs_status_id", "scan_jobs", ["status", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_scan_jobs_status_id", table_name="scan_jobs")
+    op.drop_table("scan_jobs")
@@ -0,0 +1,42 @@
+# app/cli/backfill_analytics.py
+"""
+Rebuilds the scan_daily_stats rollup behind /admin/analytics from the scans
+table, in SQL (one GROUP BY, no rows through Python). Run it once after
+upgrading to fill the rollup from existing scans, or any time to repair it.
+
+The affected days are deleted and re-aggregated in one transaction, so a
+rebuild is idempotent. Scans saved while it runs may be counted twice if
+their day is in the rebuilt range: run it off-peak, or limit it to past
+days with --until.
+
+Run from the backend folder:
+    python -m app.cli.backfill_analytics
+    python -m app.cli.backfill_analytics --since 2026-01-01 --until 2026-02-01
+"""
+import argparse
+from datetime import date
+
+from sqlalchemy import func, select
+
+from app.database import SessionLocal
+from app.models import analytics, job, scan, user  # noqa: F401  (registers the mappers)
+from app.services.analytics_service import backfill_statements
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since", type=date.fromisoformat, default=None, help="first UTC day to rebuild (inclusive)")
+    parser.add_argument("--until", type=date.fromisoformat, default=None, help="last UTC day to rebuild (exclusive)")
+    args = parser.parse_args(argv)
+
+    with SessionLocal() as db, db.begin():
+        for statement in backfill_statements(args.since, args.until):
+            db.execute(statement)
+        Stat = analytics.ScanDailyStat
+        rows = db.scalar(select(func.count()).select_from(Stat))
+        scans = db.scalar(select(func.coalesce(func.sum(Stat.count), 0)).where(Stat.user_id == analytics.ALL_USERS))
+    print(f"rollup rebuilt: {rows} rows covering {scans} scans")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+# app/cli/bulk_score.py
+"""
+Offline bulk scoring of an image archive.
+
+Walks a directory (recursively) or reads a file list (one path per line),
+decodes and resizes images in a parallel tf.data pipeline, runs batched
+inference and appends one row per image to a CSV (or Parquet) file.
+
+The output file doubles as the checkpoint: rows are flushed after every
+batch, and a re-run with the same --out skips every path already scored in
+it, so an interrupted run resumes where it stopped; rows that ended in an
+error are dropped and those images scored again. Use --restart to start
+over.
+
+--save-scans copies each image that passed the X-ray filter into upload
+storage (content-addressed, like API uploads) and inserts a Scan row for
+it, so its image, thumbnail and heatmap URLs work like any other scan's.
+
+Decoding goes through app.ml.preprocess.prepare_image (draft-mode JPEG
+decode + reduce), the same code the API uses, so offline and online scores
+match exactly.
+
+Run from the backend folder:
+    python -m app.cli.bulk_score /data/archive --out scores.csv
+    python -m app.cli.bulk_score files.txt --out scores.parquet --save-scans --user-id 1
+"""
+import argparse
+import csv
+import hashlib
+import os
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from app.ml.predict import CLASS_NAMES, label_prediction, model_version, predict_batch
+from app.ml.preprocess import IMG_SIZE, prepare_image
+from app.utils.image_filter import is_mostly_grayscale_array
+from app.utils.uploads import IMAGE_EXTENSIONS
+
+FIELDS = ["path", "prediction", "confidence", *[f"prob_{c.lower()}" for c in CLASS_NAMES],
+          "is_xray", "model_version", "error"]
+
+
+def list_images(source: str) -> list[str]:
+    """All image paths under a directory, or the paths listed in a text file."""
+    if os.path.isdir(source):
+        paths = []
+        for root, dirs, files in os.walk(source):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            for name in sorted(files):
+                if not name.startswith(".") and os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    paths.append(os.path.join(root, name))
+        return paths
+    with open(source, "r") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def read_done(csv_path: str) -> set[str]:
+    """Paths scored without an error in a previous (possibly interrupted) run."""
+    if not os.path.exists(csv_path):
+        return set()
+    with open(csv_path, "r", newline="") as f:
+        return {row["path"] for row in csv.DictReader(f) if not row["error"]}
+
+
+def drop_failed(csv_path: str):
+    """Rewrites the output without its error rows, so retried images don't appear twice."""
+    if not os.path.exists(csv_path):
+        return
+    with open(csv_path, "r", newline="") as f:
+        rows = list(csv.DictReader(f))
+    if all(not row["error"] for row in rows):
+        return
+    tmp_path = csv_path + ".tmp"
+    with open(tmp_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(row for row in rows if not row["error"])
+    os.replace(tmp_path, csv_path)
+
+
+def trim_partial_line(csv_path: str):
+    """Cuts a half-written last row off so appended rows start on a fresh line."""
+    if not os.path.exists(csv_path):
+        return
+    with open(csv_path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def _load(path: bytes):
+    try:
+        with open(path.decode(), "rb") as f:
+            img = prepare_image(f.read())
+        return img.resized, is_mostly_grayscale_array(img.rgb), b""
+    except Exception as e:  # corrupt / unsupported file: keep its slot, report it
+        return np.zeros((IMG_SIZE, IMG_SIZE, 3), np.uint8), False, str(e).encode()
+
+
+def _load_tf(path):
+    image, is_gray, error = tf.numpy_function(_load, [path], [tf.uint8, tf.bool, tf.string])
+    image.set_shape((IMG_SIZE, IMG_SIZE, 3))
+    return path, image, is_gray, error
+
+
+def build_dataset(paths: list[str], batch_size: int, parallelism: int | None = None) -> tf.data.Dataset:
+    """(paths, uint8 images, is_gray, error) batches, decoded in parallel and prefetched."""
+    ds = tf.data.Dataset.from_tensor_slices(tf.constant(paths, dtype=tf.string))
+    ds = ds.map(_load_tf, num_parallel_calls=parallelism or os.cpu_count() or 1, deterministic=True)
+    ds = ds.batch(batch_size).prefetch(2)
+    # Fixed sizes instead of AUTOTUNE: the decode is a Python call, so there's
+    # little to tune, and the autotune thread stalls iterator teardown for ~30s
+    options = tf.data.Options()
+    options.autotune.enabled = False
+    return ds.with_options(options)
+
+
+def score_batch(paths, images, is_gray, errors, version: str, batch_size: int) -> list[dict]:
+    ok = errors == b""
+    # Always feed a full batch: every new batch shape costs a retrace
+    batch = np.zeros((batch_size, IMG_SIZE, IMG_SIZE, 3), np.float32)
+    n = int(ok.sum())
+    batch[:n] = images[ok] / np.float32(255.0)
+    probs = np.zeros((len(paths), len(CLASS_NAMES)), np.float32)
+    if n:
+        probs[ok] = predict_batch(batch)[:n]
+
+    rows = []
+    for i, path in enumerate(paths):
+        row = {"path": path.decode(), "model_version": version, "error": errors[i].decode()}
+        if ok[i]:
+            label, confidence, probs_list = label_prediction(probs[i])
+            row.update(prediction=label, confidence=round(confidence, 6), is_xray=bool(is_gray[i]))
+            row.update({f"prob_{c.lower()}": round(p, 6) for c, p in zip(CLASS_NAMES, probs_list)})
+        rows.append(row)
+    return rows
+
+
+def store_image(path: str) -> str:
+    """Copies an image into upload storage under its content key (deduplicated); returns the key."""
+    from app.utils.storage import content_key, sniff_extension, storage
+
+    with open(path, "rb") as f:
+        data = f.read()
+    staging = storage.new_staging_file()
+    try:
+        with staging:
+            staging.write(data)
+    except BaseException:
+        storage.discard(staging.name)
+        raise
+    key = content_key(hashlib.sha256(data).hexdigest(), sniff_extension(data[:132], os.path.basename(path)))
+    storage.put(staging.name, key)
+    return key
+
+
+def save_scans(rows: list[dict], user_id: int | None):
+    # Imported here so scoring to a file doesn't need a reachable database.
+    # Offline tool: uses the sync engine, one executemany per chunk
+    from datetime import datetime
+    from sqlalchemy import insert
+    from app.database import SessionLocal
+    from app.models import analytics, job, scan, user  # noqa: F401  (registers the mappers)
+    from app.services.analytics_service import rollup_rows, row_statements, upsert_statement
+
+    now = datetime.utcnow()
+    # Images the filter rejected aren't scans (the API refuses them too)
+    records = [
+        {
+            "user_id": user_id,
+            "image_path": store_image(r["path"]),
+            "prediction": r["prediction"],
+            "confidence": r["confidence"],
+            "probs": {c: r[f"prob_{c.lower()}"] for c in CLASS_NAMES},
+            "model_version": r["model_version"],
+            "created_at": now,
+        }
+        for r in rows if not r["error"] and r["is_xray"]
+    ]
+    if records:
+        with SessionLocal() as db:
+            db.execute(insert(scan.Scan), records)
+            stmt = upsert_statement(db.bind.dialect.name)
+            if stmt is not None:
+                db.execute(stmt, rollup_rows(records))
+            else:
+                for row in rollup_rows(records):
+                    add, create = row_statements(row)
+                    if db.execute(add).rowcount == 0:
+                        db.execute(create)
+            db.commit()
+
+
+def write_parquet(csv_path: str, out_path: str):
+    try:
+        import pyarrow.csv as pa_csv
+        import pyarrow.parquet as pq
+    except ImportError:
+        sys.exit("Parquet output needs pyarrow (pip install pyarrow); the CSV is at " + csv_path)
+    pq.write_table(pa_csv.read_csv(csv_path), out_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="image directory, or a text file with one path per line")
+    parser.add_argument("--out", required=True, help="results file (.csv or .parquet)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--parallelism", type=int, default=None, help="decode workers (default: CPU count)")
+    parser.add_argument("--save-scans", action="store_true",
+                        help="also store each X-ray in upload storage and insert a Scan row for it")
+    parser.add_argument("--user-id", type=int, default=None, help="owner of the inserted Scan rows")
+    parser.add_argument("--restart", action="store_true", help="ignore previous progress in --out")
+    parser.add_argument("--log-every", type=float, default=10.0, help="seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    parquet = args.out.endswith(".parquet")
+    csv_path = args.out + ".partial.csv" if parquet else args.out
+    if args.restart and os.path.exists(csv_path):
+        os.remove(csv_path)
+
+    # A crash mid-write can leave a truncated last row; that image is simply scored again
+    trim_partial_line(csv_path)
+    drop_failed(csv_path)
+    paths = list_images(args.source)
+    done = read_done(csv_path)
+    todo = [p for p in paths if p not in done]
+    version = model_version()
+    print(f"{len(paths)} images, {len(done)} already scored, {len(todo)} to go (model {version})", flush=True)
+
+    scored = failed = 0
+    start = last_log = time.perf_counter()
+    if todo:
+        new_file = not os.path.exists(csv_path)
+        with open(csv_path, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            if new_file:
+                writer.writeheader()
+            for batch in build_dataset(todo, args.batch_size, args.parallelism).as_numpy_iterator():
+                rows = score_batch(*batch, version=version, batch_size=args.batch_size)
+                # Database first: if we die in between, the rows get re-scored
+                # (and re-inserted) rather than silently missing from the DB
+                if args.save_scans:
+                    save_scans(rows, args.user_id)
+                writer.writerows(rows)
+                f.flush()
+
+                scored += len(rows)
+                failed += sum(1 for r in rows if r["error"])
+                now = time.perf_counter()
+                if now - last_log >= args.log_every:
+                    last_log = now
+                    print(f"{scored}/{len(todo)} scored, {scored / (now - start):.1f} images/sec", flush=True)
+
+    elapsed = time.perf_counter() - start
+    rate = scored / elapsed if elapsed > 0 else 0.0
+    print(f"done: {scored} scored ({failed} failed) in {elapsed:.1f}s, {rate:.1f} images/sec", flush=True)
+
+    if parquet:
+        write_parquet(csv_path, args.out)
+        os.remove(csv_path)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# app/cli/export_tflite.py
+"""
+Exports the Keras model to TFLite for INFERENCE_BACKEND=tflite.
+
+Writes <model>.<variant>.tflite next to the Keras model for each requested
+variant (fp16, dynamic, int8). int8 needs calibration images: a directory
+(or file list) of representative X-rays, preprocessed exactly like uploads.
+
+Run from the backend folder:
+    python -m app.cli.export_tflite --variants fp16 dynamic
+    python -m app.cli.export_tflite --variants int8 --calibration-dir /data/xrays/sample
+
+Then compare against Keras with:
+    python -m benchmarks.bench_backends --images /data/xrays/sample
+"""
+import argparse
+import os
+import sys
+
+from app.cli.bulk_score import list_images
+from app.ml.preprocess import prepare_image
+from app.ml.tflite_backend import TFLITE_VARIANTS, export_tflite, tflite_path
+
+
+def calibration_images(source: str, count: int):
+    images = []
+    for path in list_images(source):
+        if len(images) >= count:
+            break
+        try:
+            with open(path, "rb") as f:
+                images.append(prepare_image(f.read()).model_input)
+        except Exception as e:
+            print(f"skipping {path}: {e}")
+    return images
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=None, help="Keras model (default: the served model)")
+    parser.add_argument("--variants", nargs="+", choices=TFLITE_VARIANTS, default=["fp16", "dynamic"])
+    parser.add_argument("--calibration-dir", default=None, help="images for int8 calibration")
+    parser.add_argument("--calibration-count", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    if "int8" in args.variants and not args.calibration_dir:
+        sys.exit("int8 export needs --calibration-dir")
+
+    from tensorflow import keras
+    from app.config import settings
+
+    model_path = args.model or settings.MODEL_PATH
+    model = keras.models.load_model(model_path)
+    for variant in args.variants:
+        data = None
+        if variant == "int8":
+            data = calibration_images(args.calibration_dir, args.calibration_count)
+        out = tflite_path(model_path, variant)
+        with open(out, "wb") as f:
+            f.write(export_tflite(model, variant, data))
+        print(f"{variant:<8} {out} ({os.path.getsize(out) / 1e6:.1f} MB, keras {os.path.getsize(model_path) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# app/cli/rehome_uploads.py
+"""
+Moves uploads saved before content-addressed storage (flat
+UPLOAD_DIR/<uuid>.<ext> files) into the configured storage backend under
+their content hash, and points their scans rows at the new keys. Files
+with identical content collapse into one stored copy.
+
+Safe to re-run: rows that already have a content-addressed key (they
+contain a "/") are skipped, and a missing source file is reported, not fatal.
+
+Run from the backend folder:
+    python -m app.cli.rehome_uploads --dry-run
+    python -m app.cli.rehome_uploads
+"""
+import argparse
+import hashlib
+import os
+import shutil
+
+from sqlalchemy import select, update
+
+from app.database import SessionLocal
+from app.models import analytics, job, scan, user  # noqa: F401  (registers the mappers)
+from app.utils.storage import CHUNK_SIZE, _local_path, content_key, sniff_extension, storage
+
+
+def file_digest(path: str) -> tuple[str, bytes]:
+    """(sha256 hex, first 16 bytes) of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        head = f.read(132)
+        digest.update(head)
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest(), head
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would move")
+    parser.add_argument("--keep-originals", action="store_true", help="don't delete the flat files")
+    args = parser.parse_args(argv)
+
+    Scan = scan.Scan
+    moved = deduplicated = missing = 0
+    with SessionLocal() as db:
+        rows = db.execute(select(Scan.id, Scan.image_path).where(Scan.image_path.notlike("%/%"))).all()
+        for scan_id, image_path in rows:
+            source = _local_path(image_path)
+            if not os.path.isfile(source):
+                missing += 1
+                print(f"missing: scan {scan_id} {image_path}")
+                continue
+            digest, head = file_digest(source)
+            key = content_key(digest, sniff_extension(head, image_path))
+            if args.dry_run:
+                print(f"scan {scan_id}: {image_path} -> {key}")
+                continue
+
+            with storage.new_staging_file() as staging, open(source, "rb") as f:
+                shutil.copyfileobj(f, staging, CHUNK_SIZE)
+            if storage.put(staging.name, key):
+                moved += 1
+            else:
+                deduplicated += 1
+            db.execute(update(Scan).where(Scan.id == scan_id).values(image_path=key))
+            db.commit()
+            if not args.keep_originals:
+                os.remove(source)
+
+    print(f"{len(rows)} flat uploads: {moved} stored, {deduplicated} already stored (deduplicated), {missing} missing"
+          + (" [dry run]" if args.dry_run else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# app/cli/scan_worker.py
+"""
+Standalone consumer for the predict-and-save job queue
+(POST /scan/predict/save?async=true), for scaling scoring out of the API
+processes. Any number can run against the same database, on any host that
+sees the same storage; each claims its own batches. Set
+JOB_WORKER_ENABLED=false on the API to leave all the scoring to them.
+
+Stops on SIGINT/SIGTERM after finishing the batches in progress; a worker
+killed outright leaves its jobs to be claimed again once their lease
+(JOB_LEASE_SECONDS) runs out.
+
+Run from the backend folder:
+    python -m app.cli.scan_worker
+    python -m app.cli.scan_worker --batch-size 32 --concurrency 4
+"""
+import argparse
+import asyncio
+import signal
+
+from app.config import settings
+from app.database import async_engine
+from app.ml.engine import inference_engine
+from app.models import analytics, job, scan, user  # noqa: F401  (registers the mappers)
+from app.services.job_service import run_consumer
+
+
+async def run():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    inference_engine.start()
+    try:
+        await inference_engine.warm_up()
+        print(f"consuming jobs ({settings.JOB_WORKER_CONCURRENCY} x {settings.JOB_BATCH_SIZE}); Ctrl-C to stop", flush=True)
+        await run_consumer(stop)
+    finally:
+        inference_engine.stop()
+        await async_engine.dispose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=None, help="jobs claimed at a time (default: JOB_BATCH_SIZE)")
+    parser.add_argument("--concurrency", type=int, default=None, help="batches in flight (default: JOB_WORKER_CONCURRENCY)")
+    args = parser.parse_args(argv)
+    if args.batch_size:
+        settings.JOB_BATCH_SIZE = args.batch_size
+    if args.concurrency:
+        settings.JOB_WORKER_CONCURRENCY = args.concurrency
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
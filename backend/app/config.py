@@ -16,16 +16,119 @@ class Settings(BaseSettings):
 
     # Database
     DATABASE_URL: str
+    # Requests go through an asyncio engine on the same database; by default
+    # the driver is swapped (sqlite -> sqlite+aiosqlite, postgresql -> postgresql+asyncpg)
+    ASYNC_DATABASE_URL: str = ""
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0   # seconds to wait for a connection before failing
+    DB_POOL_RECYCLE: int = 1800     # seconds; reconnect before server/proxy idle timeouts
+    DB_POOL_PRE_PING: bool = True
 
     # JWT / Auth
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
     REFRESH_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7 days
+    # Authenticated users are cached per process for this long (0 = always
+    # hit the database). Edits through the ORM invalidate immediately.
+    AUTH_CACHE_TTL_SECONDS: float = 60.0
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
 
     # File paths
     UPLOAD_DIR: str = str(BASE_DIR / "uploads" / "scans")
-    MODEL_PATH: str = str(BASE_DIR / "ml" / "chest_xray_cnn_model.keras")
+    UPLOAD_MAX_BYTES: int = 25 * 1024 * 1024  # larger uploads get a 413
+    # WebP derivatives served by /media/{thumb,model}/<key>
+    THUMBNAIL_SIZE: int = 256
+    THUMBNAIL_QUALITY: int = 80
+    MEDIA_DERIVATIVES_AT_SAVE: bool = True  # render them right after a save (else on first request)
+
+    # Where saved uploads go: "local" (UPLOAD_DIR) or "s3" (needs boto3). Any
+    # S3-compatible store works through S3_ENDPOINT_URL, e.g. http://localhost:9000 for MinIO
+    STORAGE_BACKEND: str = "local"
+    S3_BUCKET: str = ""
+    S3_PREFIX: str = "scans/"
+    S3_ENDPOINT_URL: str = ""
+    S3_REGION: str = ""
+    S3_URL_EXPIRY_SECONDS: int = 3600
+    MODEL_PATH: str = str(BASE_DIR / "app" / "ml" / "chest_xray_cnn_model.keras")
+    # Model registry: every *.keras file in MODEL_REGISTRY_DIR (and MODEL_PATH)
+    # is a version that /admin/models can activate or shadow without a restart
+    MODEL_REGISTRY_DIR: str = ""
+    MODEL_REGISTRY_STATE: str = ""      # active/shadow choice; empty = <MODEL_REGISTRY_DIR>/registry.json (not kept without a dir)
+    MODEL_REGISTRY_MAX_LOADED: int = 3  # versions kept in memory per process (current, previous, shadow)
+    MODEL_SHADOW_MAX_INFLIGHT: int = 2  # shadow scorings running at once; sampled requests beyond that skip it
+    HEATMAP_FORMAT: str = "webp"  # "webp" or "png"; artifacts are served from UPLOAD_DIR
+    HEATMAP_MAX_BYTES: int = 1024 * 1024 * 1024  # UPLOAD_DIR/heatmaps; oldest artifacts removed beyond it (0 = no limit)
+
+    # Scoring backend: "keras", or "tflite" to score with an exported TFLite
+    # model (python -m app.cli.export_tflite). Grad-CAM always uses Keras.
+    INFERENCE_BACKEND: str = "keras"
+    TFLITE_VARIANT: str = "dynamic"  # "fp16", "dynamic" or "int8"
+    TFLITE_MODEL_PATH: str = ""      # empty = <model>.<variant>.tflite next to the Keras model
+
+    # Inference micro-batching
+    INFERENCE_BATCHING: bool = True
+    INFERENCE_MAX_BATCH_SIZE: int = 16
+    INFERENCE_MAX_WAIT_MS: float = 5.0
+
+    # Test-time augmentation for uncertain predictions: up to TTA_VIEWS augmented
+    # views (app/ml/tta.py) scored in ONE extra forward pass and averaged in;
+    # fewer views when the pass would exceed the latency budget
+    TTA_ENABLED: bool = False
+    TTA_VIEWS: int = 8
+    TTA_LATENCY_BUDGET_MS: float = 150.0  # 0 = no limit
+
+    # Run every inference path once at startup; /readyz reports ready after it
+    INFERENCE_WARMUP: bool = True
+
+    # Inference worker processes (0 = run in the API process's threadpool)
+    INFERENCE_WORKERS: int = 1
+    INFERENCE_WORKER_THREADS: int = 4   # concurrent jobs per worker (feeds the micro-batcher)
+    TF_INTRA_OP_THREADS: int = 0        # 0 = cpu_count // INFERENCE_WORKERS
+    TF_INTER_OP_THREADS: int = 1
+    INFERENCE_JOB_TIMEOUT_SECONDS: float = 300.0  # a worker job with no result by then fails (0 = wait forever)
+
+    # Batch prediction (/scan/predict/batch)
+    BATCH_MAX_IMAGE_BYTES: int = 25 * 1024 * 1024
+    BATCH_MAX_REQUEST_BYTES: int = 1024 * 1024 * 1024  # whole request body; larger gets a 413
+    BATCH_MAX_INFLIGHT_CHUNKS: int = 4  # chunks of INFERENCE_MAX_BATCH_SIZE images being scored at once
+
+    # Admission control for /scan/predict and /scan/predict/save (app/core/admission.py),
+    # per API process: requests beyond the slots and the queues get a 503 + Retry-After
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_MAX_IN_FLIGHT: int = 16
+    ADMISSION_RESERVED_AUTHENTICATED: int = 4    # slots anonymous requests never get
+    ADMISSION_MAX_QUEUE: int = 64                # authenticated requests waiting for a slot
+    ADMISSION_MAX_QUEUE_ANONYMOUS: int = 16
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 10.0
+
+    # Prediction cache (keyed by image hash + model version)
+    PREDICTION_CACHE_ENABLED: bool = True
+    PREDICTION_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    PREDICTION_CACHE_DIR: str = ""  # empty = memory only
+    PREDICTION_CACHE_DISK_MAX_BYTES: int = 1024 * 1024 * 1024
+
+    # Durable job queue for POST /scan/predict/save?async=true (app/services/job_service.py).
+    # The API process runs a consumer unless JOB_WORKER_ENABLED=false; more can
+    # run elsewhere with `python -m app.cli.scan_worker`
+    JOB_WORKER_ENABLED: bool = True
+    JOB_WORKER_CONCURRENCY: int = 2   # batches being scored at once per consumer process
+    JOB_BATCH_SIZE: int = 16          # jobs claimed (and scored in one forward pass) at a time
+    JOB_POLL_INTERVAL: float = 1.0    # seconds between queue polls when idle (enqueues in this process wake it at once)
+    JOB_LEASE_SECONDS: int = 120      # a running job not finished by then is assumed lost and claimed again
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETENTION_HOURS: int = 24 * 7  # finished jobs are deleted after this (their scans stay)
+
+    # Largest page GET /scan/history will return
+    HISTORY_MAX_PAGE_SIZE: int = 200
+
+    # On-demand profiling captures (/admin/profiling, app/ml/profiling.py)
+    PROFILE_DIR: str = str(BASE_DIR / "profiles")
+    PROFILE_MAX_CAPTURES: int = 50  # oldest are deleted beyond this
+
+    # Prometheus metrics at /metrics (per-stage timings, counters, DB timings)
+    METRICS_ENABLED: bool = True
 
     # CORS (optional)
     CORS_ORIGINS: List[str] = ["http://localhost:5173", "http://localhost:3000", "http://localhost:8080"]
@@ -0,0 +1,224 @@
+# app/core/admission.py
+"""
+Admission control for the scoring endpoints.
+
+Without it a traffic spike queues without limit inside the server: every
+waiting request holds its buffered upload, and everyone's latency climbs
+until requests time out. Here at most ADMISSION_MAX_IN_FLIGHT scoring
+requests run at once (per API process); a bounded number wait for a slot,
+authenticated ones ahead of anonymous ones, and the rest are turned away at
+once with 503 + Retry-After.
+
+A request is admitted BEFORE its body is read, so a request that is shed
+or waiting never buffers its upload; an admitted one holds its slot while
+the upload arrives. Bodies over the endpoint's size limit get a 413 from
+their Content-Length, or as soon as that many bytes have arrived.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from urllib.parse import parse_qs
+
+from fastapi import HTTPException
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from app.config import settings
+from app.core import metrics
+from app.core.metrics import REJECTIONS
+from app.core.security import decode_token, get_token_from_request
+
+AUTHENTICATED, ANONYMOUS = "authenticated", "anonymous"
+PRIORITIES = (AUTHENTICATED, ANONYMOUS)  # admission order
+
+# Room for the multipart framing and form fields around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+# Query values a FastAPI bool parameter reads as true (pydantic, case-insensitive)
+TRUE_VALUES = {"1", "on", "t", "true", "y", "yes"}
+
+
+class Overloaded(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    A counting semaphore with one bounded FIFO per priority class. Freed
+    slots go to the highest class with a waiter. `reserved` slots are only
+    ever given to authenticated requests, so they keep flowing when
+    anonymous traffic alone would fill every slot. Lives on one event loop.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: dict, reserved: int = 0, timeout: float = 10.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.reserved = min(reserved, max_in_flight - 1)
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiters = {p: deque() for p in PRIORITIES}
+        self.hold_seconds = None  # moving average of how long a slot is held, for Retry-After
+
+    def _limit(self, priority: str) -> int:
+        return self.max_in_flight if priority == AUTHENTICATED else self.max_in_flight - self.reserved
+
+    def _ahead(self, priority: str) -> bool:
+        """Whether requests of this class or a higher one are already waiting."""
+        return any(self.waiters[p] for p in PRIORITIES[:PRIORITIES.index(priority) + 1])
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue has probably drained."""
+        if not self.hold_seconds:
+            return 1
+        queued = sum(len(q) for q in self.waiters.values())
+        return max(1, min(60, math.ceil(self.hold_seconds * (queued + 1) / self.max_in_flight)))
+
+    async def acquire(self, priority: str):
+        """Waits for a slot; raises Overloaded if the queue is full or the wait times out."""
+        if self.in_flight < self._limit(priority) and not self._ahead(priority):
+            self.in_flight += 1
+            return
+        queue = self.waiters[priority]
+        if len(queue) >= self.max_queue[priority]:
+            raise Overloaded("queue_full", self.retry_after())
+        slot = asyncio.get_running_loop().create_future()
+        queue.append(slot)
+        try:
+            await asyncio.wait_for(slot, self.timeout)
+        except asyncio.TimeoutError:
+            raise Overloaded("timeout", self.retry_after())
+        except asyncio.CancelledError:
+            # Granted just as the client went away: hand the slot on
+            if slot.done() and not slot.cancelled():
+                self.release()
+            raise
+        finally:
+            if slot in queue:
+                queue.remove(slot)
+
+    def release(self, held: float | None = None):
+        self.in_flight -= 1
+        if held is not None:
+            self.hold_seconds = held if self.hold_seconds is None else self.hold_seconds + 0.1 * (held - self.hold_seconds)
+        for priority in PRIORITIES:
+            queue = self.waiters[priority]
+            while queue and self.in_flight < self._limit(priority):
+                slot = queue.popleft()
+                if not slot.done():
+                    self.in_flight += 1
+                    slot.set_result(None)
+            if queue:
+                return  # lower classes wait while a higher one is still queued
+
+
+controller = AdmissionController(
+    settings.ADMISSION_MAX_IN_FLIGHT,
+    {AUTHENTICATED: settings.ADMISSION_MAX_QUEUE, ANONYMOUS: settings.ADMISSION_MAX_QUEUE_ANONYMOUS},
+    reserved=settings.ADMISSION_RESERVED_AUTHENTICATED,
+    timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+)
+
+ADMISSION_SHED = metrics.registry.counter(
+    "pneumonia_admission_shed_total",
+    "Scoring requests turned away with a 503, by priority class and reason (queue_full, timeout).",
+    ["priority", "reason"])
+ADMISSION_WAIT_SECONDS = metrics.registry.histogram(
+    "pneumonia_admission_wait_seconds", "Time admitted scoring requests waited for a slot.", ["priority"])
+metrics.registry.gauge(
+    "pneumonia_admission_queue_depth", "Scoring requests waiting for a slot, by priority class.", ["priority"],
+    fn=lambda: {(p,): len(q) for p, q in controller.waiters.items()})
+metrics.registry.gauge(
+    "pneumonia_admission_in_flight", "Scoring requests holding a slot.",
+    fn=lambda: {(): controller.in_flight})
+
+
+def _queued(query: bytes) -> bool:
+    """Whether ?async= is set the way the route reads it (the last value wins)."""
+    values = parse_qs(query.decode("latin-1")).get("async")
+    return bool(values) and values[-1].lower() in TRUE_VALUES
+
+
+def _rule(path: str, query: bytes):
+    """(body limit in bytes, whether it needs a scoring slot) for a POST path, or None."""
+    if path == "/scan/predict":
+        return settings.UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD, True
+    if path == "/scan/predict/save":
+        # Queued saves are scored by the job workers, not in the request
+        return settings.UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD, not _queued(query)
+    if path == "/scan/predict/batch":
+        # Streams its results for a long time and bounds its own scoring
+        # (BATCH_MAX_INFLIGHT_CHUNKS): only the body size is limited
+        return settings.BATCH_MAX_REQUEST_BYTES, False
+    return None
+
+
+def _priority(scope) -> str:
+    """Authenticated if the request carries a valid token (checked again by the route)."""
+    token = get_token_from_request(Request(scope))
+    if token:
+        try:
+            if decode_token(token).get("user_id"):
+                return AUTHENTICATED
+        except HTTPException:
+            pass
+    return ANONYMOUS
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying the body limits and admission control above."""
+
+    def __init__(self, app, controller: AdmissionController = controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+        path = scope["path"]
+        root = scope.get("root_path", "")
+        if root and path.startswith(root):
+            path = path[len(root):]
+        rule = _rule(path, scope.get("query_string", b""))
+        if rule is None:
+            return await self.app(scope, receive, send)
+        max_bytes, gated = rule
+
+        length = dict(scope["headers"]).get(b"content-length")
+        if length and length.isdigit() and int(length) > max_bytes:
+            REJECTIONS.inc("too_large")
+            return await JSONResponse({"detail": f"Request body exceeds {max_bytes} bytes"}, status_code=413)(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            # Chunked uploads (or a lying Content-Length): stop once past the limit
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    REJECTIONS.inc("too_large")
+                    raise HTTPException(status_code=413, detail=f"Request body exceeds {max_bytes} bytes")
+            return message
+
+        if not gated or not settings.ADMISSION_ENABLED:
+            return await self.app(scope, limited_receive, send)
+
+        priority = _priority(scope)
+        start = time.perf_counter()
+        try:
+            await self.controller.acquire(priority)
+        except Overloaded as e:
+            ADMISSION_SHED.inc(priority, e.reason)
+            response = JSONResponse({"detail": "Server is busy, retry later"}, status_code=503,
+                                    headers={"Retry-After": str(e.retry_after)})
+            return await response(scope, receive, send)
+        admitted = time.perf_counter()
+        ADMISSION_WAIT_SECONDS.observe(admitted - start, priority)
+        try:
+            await self.app(scope, limited_receive, send)
+        finally:
+            self.controller.release(time.perf_counter() - admitted)
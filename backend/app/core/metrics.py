@@ -0,0 +1,263 @@
+# app/core/metrics.py
+"""
+Minimal Prometheus-style metrics: labelled counters, gauges and histograms,
+rendered in the text exposition format at /metrics.
+
+Recording is a dict update under a lock (about a microsecond), so it can
+stay on under load. Inference runs in worker processes: counters and
+histograms recorded there are drained every second and merged into the API
+process's registry (see app.ml.engine). Gauges are always local to the
+process that owns them.
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; spans a cache hit (~1ms) to a cold Grad-CAM pass on a busy node
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), fn=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # fn() -> value, or {label values tuple: value}; read at scrape time
+        self.fn = fn
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels) -> tuple:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+        return tuple(str(v) for v in labels)
+
+    def _labels(self, key, extra: str = "") -> str:
+        parts = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def _items(self):
+        if self.fn is None:
+            with self._lock:
+                return list(self._values.items())
+        value = self.fn()
+        return list(value.items()) if isinstance(value, dict) else [((), value)]
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self._items():
+            lines.append(f"{self.name}{self._labels(key)} {_fmt(value)}")
+        return lines
+
+    def drain(self) -> dict:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1.0):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def merge(self, values: dict):
+        with self._lock:
+            for key, v in values.items():
+                self._values[key] = self._values.get(key, 0.0) + v
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, *labels, amount: float = 1.0):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, *labels, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track(self, *labels):
+        """Counts the block as in progress while it runs."""
+        self.inc(*labels)
+        try:
+            yield
+        finally:
+            self.dec(*labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket (non-cumulative) counts incl. +Inf, sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def merge(self, values: dict):
+        with self._lock:
+            for key, (counts, total, n) in values.items():
+                state = self._values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+                state[0] = [a + b for a, b in zip(state[0], counts)]
+                state[1] += total
+                state[2] += n
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, (counts, total, n) in self._items():
+            cumulative = 0
+            for bound, c in zip((*self.buckets, math.inf), counts):
+                cumulative += c
+                le = 'le="%s"' % _fmt(bound)
+                lines.append(f"{self.name}_bucket{self._labels(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{self._labels(key)} {n}")
+        return lines
+
+    def _items(self):
+        with self._lock:
+            return [(k, (list(c), s, n)) for k, (c, s, n) in self._values.items()]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _add(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=(), fn=None) -> Counter:
+        return self._add(Counter(name, documentation, labelnames, fn))
+
+    def gauge(self, name, documentation, labelnames=(), fn=None) -> Gauge:
+        return self._add(Gauge(name, documentation, labelnames, fn))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def drain(self) -> dict:
+        """Counter/histogram values recorded since the last drain (then reset)."""
+        out = {}
+        for name, metric in self._metrics.items():
+            if metric.fn is None and isinstance(metric, (Counter, Histogram)):
+                values = metric.drain()
+                if values:
+                    out[name] = values
+        return out
+
+    def merge(self, deltas: dict):
+        """Adds values drained from another process's registry."""
+        for name, values in deltas.items():
+            metric = self._metrics.get(name)
+            if metric is not None:
+                metric.merge(values)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, status and in-flight count of every
+    HTTP request, labelled by route template (e.g. /scan/{scan_id}/heatmap)
+    so the label set stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, scope["method"], route, status)
+
+
+registry = Registry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "pneumonia_http_request_duration_seconds", "HTTP request latency, by route template.",
+    ["method", "route", "status"])
+HTTP_IN_FLIGHT = registry.gauge(
+    "pneumonia_http_requests_in_flight", "HTTP requests currently being served.")
+STAGE_SECONDS = registry.histogram(
+    "pneumonia_stage_duration_seconds",
+    "Time spent in each step of the prediction path (inference/gradcam are per forward pass).",
+    ["stage"])
+BATCH_SIZE = registry.histogram(
+    "pneumonia_inference_batch_size", "Images per forward pass.", ["pass"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+PREDICTIONS = registry.counter(
+    "pneumonia_predictions_total", "Predictions served (including cache hits), by label.", ["label"])
+REJECTIONS = registry.counter(
+    "pneumonia_rejections_total", "Uploads that got no prediction, by reason.", ["reason"])
+FAILURES = registry.counter(
+    "pneumonia_failures_total", "Steps that failed but were worked around (e.g. Grad-CAM), by stage.", ["stage"])
+UPLOADS_STORED = registry.counter(
+    "pneumonia_uploads_stored_total", "Saved uploads, by whether the content was new or already stored.", ["result"])
+DB_QUERY_SECONDS = registry.histogram(
+    "pneumonia_db_query_duration_seconds", "Database statement latency, by statement type.", ["operation"])
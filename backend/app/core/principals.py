@@ -0,0 +1,122 @@
+# app/core/principals.py
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import event
+
+from app.config import settings
+from app.core import metrics
+from app.models.user import User
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user as request handlers see it: no ORM session attached."""
+    id: int
+    email: str
+    name: str | None
+    role: str
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        role = user.role.value if hasattr(user.role, "value") else user.role
+        return cls(id=user.id, email=user.email, name=user.name, role=role or "user")
+
+
+class PrincipalCache:
+    """
+    Bounded LRU of user id -> Principal with a TTL, so authenticated
+    requests skip the `SELECT ... FROM users` on the hot path.
+
+    Entries are dropped explicitly whenever a User row is updated or
+    deleted through the ORM (see the mapper events below). The TTL bounds
+    staleness for changes this process can't see: other API processes, or
+    raw SQL against the users table.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # user id -> (principal, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, user_id: int) -> Principal | None:
+        with self._lock:
+            item = self._entries.get(user_id)
+            if item is None:
+                self.misses += 1
+                return None
+            principal, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._entries[user_id]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return principal
+
+    def put(self, principal: Principal):
+        with self._lock:
+            self._entries[principal.id] = (principal, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+principal_cache = None
+if settings.AUTH_CACHE_TTL_SECONDS > 0:
+    principal_cache = PrincipalCache(settings.AUTH_CACHE_TTL_SECONDS, settings.AUTH_CACHE_MAX_ENTRIES)
+
+
+def invalidate_principal(user_id: int):
+    """Call after changing a user outside the ORM (bulk UPDATE/DELETE, raw SQL)."""
+    if principal_cache is not None:
+        principal_cache.invalidate(user_id)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    invalidate_principal(target.id)
+
+
+# Read at scrape time
+metrics.registry.counter(
+    "pneumonia_auth_cache_lookups_total", "Principal cache lookups in get_current_user, by result.", ["result"],
+    fn=lambda: {("hit",): principal_cache.hits, ("miss",): principal_cache.misses} if principal_cache else {})
+metrics.registry.gauge(
+    "pneumonia_auth_cache_entries", "Principals currently cached.",
+    fn=lambda: len(principal_cache._entries) if principal_cache else 0)
@@ -1,8 +1,90 @@
 # app/database.py
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.config import settings
+from app.core import metrics
+from app.core.metrics import DB_QUERY_SECONDS
+
+# Sync driver -> asyncio driver for the same database
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+DB_POOL_WAIT_SECONDS = metrics.registry.histogram(
+    "pneumonia_db_pool_wait_seconds",
+    "Time to check a connection out of the async pool (includes connecting when the pool grows).")
+
+
+def async_database_url(url: str) -> str:
+    u = make_url(url)
+    return u.set(drivername=ASYNC_DRIVERS.get(u.drivername, u.drivername)).render_as_string(hide_password=False)
+
+
+def _pool_options(url: str) -> dict:
+    u = make_url(url)
+    options = {"pool_pre_ping": settings.DB_POOL_PRE_PING, "pool_recycle": settings.DB_POOL_RECYCLE}
+    if u.get_backend_name() == "sqlite" and u.database in (None, "", ":memory:"):
+        return options  # in-memory SQLite shares one connection (StaticPool): nothing to size
+    return {**options, "pool_size": settings.DB_POOL_SIZE, "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT}
+
+
+class _TimedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - start)
+
+
+def _time_queries(sync_engine):
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _query_start(conn, cursor, statement, parameters, context, executemany):
+        context._query_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _query_end(conn, cursor, statement, parameters, context, executemany):
+        # Label by statement type (SELECT, INSERT, ...) to keep the label set small
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        DB_QUERY_SECONDS.observe(time.perf_counter() - context._query_start, operation)
+
+
+# Request handlers use the async engine. The sync one is for create_all,
+# Alembic and the offline CLIs.
+engine = create_engine(settings.DATABASE_URL, future=True, **_pool_options(settings.DATABASE_URL))
+
+_async_url = settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL)
+_async_pool = _pool_options(_async_url)
+async_engine = create_async_engine(
+    _async_url, **_async_pool, **({"poolclass": _TimedPool} if "pool_size" in _async_pool else {}))
+
+_time_queries(engine)
+_time_queries(async_engine.sync_engine)
 
-engine = create_engine(settings.DATABASE_URL, future=True)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+# expire_on_commit=False: returned objects stay readable after commit without
+# an implicit (and, under asyncio, illegal) lazy refresh
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
+
+
+def _pool_state():
+    pool = async_engine.pool
+    if not isinstance(pool, AsyncAdaptedQueuePool):
+        return {}
+    return {("checked_out",): pool.checkedout(), ("idle",): pool.checkedin(), ("overflow",): max(pool.overflow(), 0)}
+
+
+# Read at scrape time
+metrics.registry.gauge(
+    "pneumonia_db_pool_connections", "Async pool connections, by state.", ["state"], fn=_pool_state)
@@ -1,18 +1,22 @@
 # app/deps.py
 from fastapi import Depends, Request, HTTPException, status
-from app.database import SessionLocal
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import AsyncSessionLocal
 from app.core.security import decode_token, get_token_from_request
+from app.core.principals import Principal, principal_cache
+from app.ml import profiling
 from app import models
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    # An AsyncSession only checks a connection out of the pool on first use
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-def get_current_user(request: Request, db: Session = Depends(get_db)):
+async def get_current_user(request: Request, db: AsyncSession = Depends(get_db)) -> Principal:
+    """
+    The authenticated user as a Principal. Served from the principal cache
+    when possible; the session is only used (and only connects) on a miss.
+    """
     token = get_token_from_request(request)
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
@@ -20,11 +24,37 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
     user_id = payload.get("user_id")
     if not user_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
-    user = db.query(models.user.User).filter(models.user.User.id == user_id).first()
+    principal = principal_cache.get(user_id) if principal_cache is not None else None
+    if principal is not None:
+        return principal
+    user = await db.get(models.user.User, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-    return user
+    principal = Principal.from_user(user)
+    if principal_cache is not None:
+        principal_cache.put(principal)
+    return principal
 
 def get_current_active_user(current_user = Depends(get_current_user)):
     # You can add extra checks (is_active) here
     return current_user
+
+def require_admin(current_user: Principal = Depends(get_current_user)) -> Principal:
+    if current_user.role != models.user.RoleEnum.admin.value:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
+
+async def profile_flag(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    `X-Profile: 1` from an admin captures a profile of this request's
+    prediction (app/ml/profiling.py). Ignored for anyone else. Async so the
+    flag is set in the request's own context.
+    """
+    if request.headers.get("x-profile") != "1":
+        return
+    try:
+        principal = await get_current_user(request, db)
+    except HTTPException:
+        return
+    if principal.role == models.user.RoleEnum.admin.value:
+        profiling.flag_request()
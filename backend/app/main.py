@@ -1,15 +1,55 @@
 # app/main.py
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware  # <--- IMPORT THIS
-from app.database import Base, engine
+from app.database import Base, engine, async_engine
 from app.config import settings
-from app.routers import auth as auth_router, scan as scan_router
+from app.core.admission import AdmissionMiddleware
+from app.core.metrics import MetricsMiddleware
+from app.models import analytics, job, scan, user  # noqa: F401  (registers the tables with Base)
+from app.routers import auth as auth_router, scan as scan_router, health as health_router, metrics as metrics_router, media as media_router, analytics as analytics_router, models as models_router, profiling as profiling_router
+from app.ml.engine import inference_engine
+from app.services.job_service import run_consumer
 
-# create tables (for dev). For migrations, use Alembic.
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Pneumonia Detector API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # create tables (for dev; a database created this way is already at the
+    # latest schema, so `alembic stamp head` it). Existing databases: `alembic upgrade head`.
+    await run_in_threadpool(Base.metadata.create_all, bind=engine)
+    # Spawn the inference workers up front so they load and warm up the model
+    # before traffic arrives. Warm-up runs in the background: the app serves
+    # /healthz right away and /readyz flips to 200 once it's done.
+    inference_engine.start()
+    warm_up = asyncio.create_task(inference_engine.warm_up())
+    # Consumer for queued predict-and-save jobs (POST /scan/predict/save?async=true)
+    stop_jobs = asyncio.Event()
+    jobs = asyncio.create_task(run_consumer(stop_jobs)) if settings.JOB_WORKER_ENABLED else None
+    yield
+    if jobs is not None:
+        # Let batches in progress finish; anything cut off is claimed again once its lease runs out
+        stop_jobs.set()
+        try:
+            await asyncio.wait_for(jobs, 30)
+        except asyncio.TimeoutError:
+            pass
+        except Exception:
+            logger.exception("Job consumer failed")
+    warm_up.cancel()
+    inference_engine.stop()
+    await async_engine.dispose()
+
+
+app = FastAPI(title="Pneumonia Detector API", lifespan=lifespan)
+
+# Body limits + admission control for the scoring endpoints. Added first so it
+# runs inside CORS (browsers can read its 503s) and inside the metrics middleware
+app.add_middleware(AdmissionMiddleware)
 
 # --- ADD CORS MIDDLEWARE ---
 # This must come BEFORE you include your routers
@@ -22,8 +62,18 @@ app.add_middleware(
 )
 # --------------------------
 
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # serve uploaded images at /uploads/scans/<filename>
-app.mount("/uploads/scans", StaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
+app.mount("/uploads/scans", media_router.ImmutableStaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
 
+app.include_router(health_router.router)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics_router.router)
 app.include_router(auth_router.router)
-app.include_router(scan_router.router)
\ No newline at end of file
+app.include_router(scan_router.router)
+app.include_router(media_router.router)
+app.include_router(analytics_router.router)
+app.include_router(models_router.router)
+app.include_router(profiling_router.router)
\ No newline at end of file
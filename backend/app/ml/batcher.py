@@ -0,0 +1,118 @@
+# app/ml/batcher.py
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Gathers concurrent single-image inference requests into batches.
+
+    Callers submit one preprocessed image at a time; a background thread
+    waits up to `max_wait_ms` for more requests (or until `max_batch_size`
+    is reached), runs ONE forward pass on the stacked batch and hands each
+    caller back its own row of the output.
+    """
+
+    def __init__(self, predict_fn, max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        # predict_fn takes an (N, H, W, C) array and returns an (N, ...) array,
+        # or a tuple of them
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, arr) -> Future:
+        """
+        Queues one image, shaped (1, H, W, C) or (H, W, C).
+        Returns a Future that resolves to that image's output row.
+        """
+        arr = np.asarray(arr)
+        if arr.ndim == 3:
+            arr = arr[np.newaxis, ...]
+        fut = Future()
+        self._ensure_started()
+        self._queue.put((arr, fut))
+        return fut
+
+    def predict(self, arr, timeout: float | None = None):
+        """Blocking helper: submit and wait for this image's row."""
+        return self.submit(arr).result(timeout)
+
+    def close(self, wait: bool = True):
+        """Stops the worker thread after it drains what is already queued."""
+        thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            if wait:
+                thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        nxt = self._queue.get(timeout=remaining)
+                    else:
+                        # Window is over, but still take anything already waiting
+                        nxt = self._queue.get_nowait()
+                except Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    break
+                batch.append(nxt)
+
+            self._flush(batch)
+            if stop:
+                return
+
+    def _flush(self, batch):
+        # Drop requests whose callers gave up before we got to them
+        batch = [(arr, fut) for arr, fut in batch if fut.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            stacked = np.concatenate([arr for arr, _ in batch], axis=0)
+            outputs = self.predict_fn(stacked)
+        except Exception as e:
+            for _, fut in batch:
+                fut.set_exception(e)
+            return
+
+        # predict_fn may return one array or a tuple of per-row arrays
+        multi = isinstance(outputs, tuple)
+        outputs = tuple(np.asarray(o) for o in outputs) if multi else np.asarray(outputs)
+
+        def rows(o, start, n):
+            return o[start] if n == 1 else o[start:start + n]
+
+        row = 0
+        for arr, fut in batch:
+            n = arr.shape[0]
+            if multi:
+                fut.set_result(tuple(rows(o, row, n) for o in outputs))
+            else:
+                fut.set_result(rows(outputs, row, n))
+            row += n
@@ -0,0 +1,171 @@
+# app/ml/cache.py
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from app.config import settings
+
+
+class PredictionCache:
+    """
+    Content-addressed cache of prediction results.
+
+    Keys are sha256(image bytes) + model version, so a re-upload of the same
+    study hits the cache and a new model never sees stale results.
+    Two tiers:
+      - memory : LRU bounded by an (approximate) total size in bytes
+      - disk   : optional JSON files under `disk_dir`, survives restarts,
+                 oldest files are removed once `disk_max_bytes` is exceeded
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: str | None = None, disk_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(p.stat().st_size for p in self.disk_dir.glob("*/*.json"))
+
+    @staticmethod
+    def make_key(file_bytes: bytes, model_version: str, digest: str | None = None) -> str:
+        # digest: sha256 hex of file_bytes, when the caller already has it
+        return f"{digest or hashlib.sha256(file_bytes).hexdigest()}-{model_version}"
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return item[0]
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        # Promote to the memory tier
+        self._put_memory(key, value, len(json.dumps(value)))
+        return value
+
+    def put(self, key: str, value: dict):
+        payload = json.dumps(value)
+        self._put_memory(key, value, len(payload))
+        self._write_disk(key, payload)
+
+    def _put_memory(self, key: str, value: dict, size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def _disk_path(self, key: str) -> Path:
+        # Fan out over 256 subdirectories to keep directories small
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def _read_disk(self, key: str) -> dict | None:
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key: str, payload: str):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        path.parent.mkdir(exist_ok=True)
+        try:
+            replaced = path.stat().st_size
+        except OSError:
+            replaced = 0
+        # Write-then-rename so a crash never leaves a half-written entry
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w") as f:
+            f.write(payload)
+        os.replace(tmp, path)
+        with self._lock:
+            self._disk_bytes += len(payload) - replaced
+            over = self._disk_bytes > self.disk_max_bytes
+        if over:
+            self._trim_disk()
+
+    def _trim_disk(self):
+        # Drop the oldest files until we're back under 90% of the budget
+        files = []
+        for p in self.disk_dir.glob("*/*.json"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        target = self.disk_max_bytes * 0.9
+        for _, size, p in files:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self.disk_evictions += 1
+        with self._lock:
+            self._disk_bytes = total
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_enabled": self.disk_dir is not None,
+                "disk_bytes": self._disk_bytes,
+                "disk_evictions": self.disk_evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+prediction_cache = None
+if settings.PREDICTION_CACHE_ENABLED:
+    prediction_cache = PredictionCache(
+        max_bytes=settings.PREDICTION_CACHE_MAX_BYTES,
+        disk_dir=settings.PREDICTION_CACHE_DIR or None,
+        disk_max_bytes=settings.PREDICTION_CACHE_DISK_MAX_BYTES,
+    )
@@ -0,0 +1,320 @@
+# app/ml/engine.py
+import asyncio
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import pickle
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+
+from fastapi.concurrency import run_in_threadpool
+from app.config import settings
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+# How often workers ship their recorded metrics to the API process
+METRICS_FLUSH_INTERVAL = 1.0
+
+INFERENCE_IN_FLIGHT = metrics.registry.gauge(
+    "pneumonia_inference_jobs_in_flight", "Inference jobs submitted and not finished yet.")
+
+
+class WorkerCrashedError(RuntimeError):
+    """Raised for jobs that were running on a worker process that died."""
+
+
+class InferenceTimeoutError(RuntimeError):
+    """Raised for jobs with no result after INFERENCE_JOB_TIMEOUT_SECONDS."""
+
+
+def _pin_threads(intra_op: int, inter_op: int):
+    # Must run before TensorFlow executes anything in this process
+    os.environ["OMP_NUM_THREADS"] = str(intra_op)
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(intra_op)
+    os.environ["TF_NUM_INTEROP_THREADS"] = str(inter_op)
+    if settings.INFERENCE_BACKEND == "tflite":
+        # The interpreter reads the thread count from the env var above
+        return
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+
+
+def _worker_main(slot: int, tasks, results, intra_op: int, inter_op: int, threads: int):
+    """
+    Entry point of one replica. Loads and warms up the model once, reports
+    ready, then serves jobs from its own task queue with `threads` runner
+    threads, so concurrent jobs can still be merged by the in-process
+    micro-batcher.
+    """
+    _pin_threads(intra_op, inter_op)
+    from app.ml.predict import warm_up
+    warm_up()
+    metrics.registry.drain()  # warm-up passes aren't traffic
+    # job_id None = control message for the engine, not a job result
+    results.put((None, True, ("ready", slot)))
+
+    def flush_metrics():
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            deltas = metrics.registry.drain()
+            if deltas:
+                results.put((None, True, ("metrics", deltas)))
+
+    threading.Thread(target=flush_metrics, name="metrics-flush", daemon=True).start()
+
+    def loop():
+        while True:
+            job = tasks.get()
+            if job is None:
+                # Pass the stop signal on to the other runner threads
+                tasks.put(None)
+                return
+            job_id, fn, args = job
+            try:
+                ok, payload = True, fn(*args)
+            except Exception as e:
+                ok, payload = False, e
+            # Pickled here rather than by the queue's feeder thread, which
+            # only prints pickling errors: the job would never get an answer
+            try:
+                data = pickle.dumps(payload)
+            except Exception:
+                text = "".join(traceback.format_exception(payload)) if not ok else \
+                    f"Result of {getattr(fn, '__name__', fn)} can't be pickled:\n{traceback.format_exc()}"
+                ok, data = False, pickle.dumps(RuntimeError(text))
+            results.put((job_id, ok, data))
+
+    runners = [threading.Thread(target=loop, daemon=True) for _ in range(max(1, threads))]
+    for t in runners:
+        t.start()
+    for t in runners:
+        t.join()
+
+
+class InferenceEngine:
+    """
+    Runs blocking model code outside the event loop.
+
+    With `replicas > 0`, jobs go to a pool of worker processes that each
+    hold their own copy of the model, with TF intra/inter-op threads pinned
+    per replica so throughput scales with cores. A watchdog restarts any
+    worker that dies and fails the jobs it had in flight.
+    With `replicas == 0`, jobs run in this process on the threadpool.
+    """
+
+    def __init__(self, replicas: int = 1, threads_per_replica: int = 4,
+                 intra_op_threads: int = 0, inter_op_threads: int = 1, timeout: float = 0.0):
+        self.replicas = max(0, int(replicas))
+        self.timeout = timeout or None
+        self.threads_per_replica = threads_per_replica
+        cpus = os.cpu_count() or 1
+        self.intra_op_threads = intra_op_threads or max(1, cpus // max(1, self.replicas))
+        self.inter_op_threads = max(1, inter_op_threads)
+
+        self._ctx = mp.get_context("spawn")  # TF is not fork-safe
+        self._workers = []    # slot -> Process
+        self._tasks = []      # slot -> Queue
+        self._inflight = []   # slot -> {job_id: Future}
+        self._results = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._ids = itertools.count()
+        self._running = False
+        self._threads = []
+        self._ready = set()         # slots whose worker has warmed up
+        self._local_ready = False   # replicas == 0: this process has warmed up
+        self.restarts = 0
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    @property
+    def ready(self) -> bool:
+        """True once every replica (or this process) has loaded and warmed up the model."""
+        if self.replicas == 0:
+            return self._local_ready
+        return self._running and len(self._ready) == self.replicas
+
+    @property
+    def ready_replicas(self) -> int:
+        return len(self._ready)
+
+    async def warm_up(self):
+        """
+        Warms up in-process inference. Worker replicas warm themselves up
+        as they start, so there's nothing to do for them here.
+        """
+        if self.replicas == 0 and not self._local_ready:
+            from app.ml.predict import warm_up
+            await run_in_threadpool(warm_up)
+            self._local_ready = True
+
+    def start(self):
+        with self._start_lock:
+            if self._running or self.replicas == 0:
+                return
+            self._results = self._ctx.Queue()
+            for slot in range(self.replicas):
+                self._tasks.append(None)
+                self._workers.append(None)
+                self._inflight.append({})
+                self._spawn(slot)
+            self._running = True
+        self._threads = [
+            threading.Thread(target=self._collect, name="inference-results", daemon=True),
+            threading.Thread(target=self._watch, name="inference-watchdog", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout: float = 10.0):
+        if not self._running:
+            return
+        self._running = False
+        for q in self._tasks:
+            q.put(None)
+        for p in self._workers:
+            p.join(timeout)
+            if p.is_alive():
+                p.terminate()
+        self._results.put(None)  # wake the collector
+        for t in self._threads:
+            t.join(timeout)
+        with self._lock:
+            for jobs in self._inflight:
+                for fut in jobs.values():
+                    if not fut.done():
+                        fut.set_exception(RuntimeError("Inference engine stopped"))
+                jobs.clear()
+        self._workers, self._tasks, self._inflight, self._threads = [], [], [], []
+        self._ready.clear()
+
+    def _spawn(self, slot: int):
+        tasks = self._ctx.Queue()
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(slot, tasks, self._results, self.intra_op_threads, self.inter_op_threads, self.threads_per_replica),
+            name=f"inference-worker-{slot}",
+            daemon=True,
+        )
+        proc.start()
+        self._tasks[slot] = tasks
+        self._workers[slot] = proc
+
+    def submit(self, fn, *args, slot: int | None = None) -> Future:
+        """
+        Queues fn(*args) on the least-loaded replica (or on `slot`). `fn`
+        must be a module-level function so it can be pickled by reference.
+        """
+        if not self._running:
+            self.start()
+        fut = Future()
+        job_id = next(self._ids)
+        with self._lock:
+            if slot is None:
+                slot = min(range(self.replicas), key=lambda i: len(self._inflight[i]))
+            self._inflight[slot][job_id] = fut
+            self._tasks[slot].put((job_id, fn, args))
+        return fut
+
+    async def run(self, fn, *args):
+        """Awaitable fn(*args) that never blocks the event loop."""
+        with INFERENCE_IN_FLIGHT.track():
+            if self.replicas == 0:
+                return await run_in_threadpool(fn, *args)
+            return await self._wait(self.submit(fn, *args))
+
+    async def _wait(self, fut: Future):
+        """A submitted job's result, or InferenceTimeoutError after `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(fut), self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                for jobs in self._inflight:
+                    for job_id, pending in list(jobs.items()):
+                        if pending is fut:
+                            del jobs[job_id]  # a late result is dropped by _collect
+            raise InferenceTimeoutError(f"No inference result after {self.timeout:g}s")
+
+    async def broadcast(self, fn, *args) -> list:
+        """
+        fn(*args) once on every replica (or once in this process), e.g. to
+        load a model everywhere before traffic is pointed at it. Waits for
+        all of them; raises the first failure.
+        """
+        if self.replicas == 0:
+            return [await run_in_threadpool(fn, *args)]
+        if not self._running:
+            self.start()
+        return list(await asyncio.gather(
+            *(self._wait(self.submit(fn, *args, slot=slot)) for slot in range(self.replicas))))
+
+    def _collect(self):
+        while True:
+            msg = self._results.get()
+            if msg is None:
+                return
+            job_id, ok, payload = msg
+            if job_id is None:
+                kind, value = payload
+                if kind == "ready":
+                    self._ready.add(value)
+                elif kind == "metrics":
+                    metrics.registry.merge(value)
+                continue
+            with self._lock:
+                fut = None
+                for jobs in self._inflight:
+                    fut = jobs.pop(job_id, None)
+                    if fut is not None:
+                        break
+            if fut is None or fut.cancelled():
+                continue
+            try:
+                payload = pickle.loads(payload)
+            except Exception as e:
+                ok, payload = False, RuntimeError(f"Inference result couldn't be unpickled: {e!r}")
+            if ok:
+                fut.set_result(payload)
+            else:
+                fut.set_exception(payload)
+
+    def _watch(self):
+        while self._running:
+            for slot, proc in enumerate(self._workers):
+                if proc.is_alive() or not self._running:
+                    continue
+                with self._lock:
+                    lost = list(self._inflight[slot].values())
+                    self._inflight[slot].clear()
+                    self._ready.discard(slot)
+                    self._spawn(slot)
+                    self.restarts += 1
+                logger.error("Inference worker %d died (exit code %s), restarted", slot, proc.exitcode)
+                for fut in lost:
+                    if not fut.done():
+                        fut.set_exception(WorkerCrashedError(f"Inference worker {slot} crashed"))
+            time.sleep(0.5)
+
+
+inference_engine = InferenceEngine(
+    replicas=settings.INFERENCE_WORKERS,
+    threads_per_replica=settings.INFERENCE_WORKER_THREADS,
+    intra_op_threads=settings.TF_INTRA_OP_THREADS,
+    inter_op_threads=settings.TF_INTER_OP_THREADS,
+    timeout=settings.INFERENCE_JOB_TIMEOUT_SECONDS,
+)
+
+# Read at scrape time
+metrics.registry.gauge(
+    "pneumonia_inference_workers_ready", "Inference worker processes that are warmed up.",
+    fn=lambda: inference_engine.ready_replicas)
+metrics.registry.counter(
+    "pneumonia_inference_worker_restarts_total", "Inference worker processes restarted after dying.",
+    fn=lambda: inference_engine.restarts)
@@ -0,0 +1,56 @@
+# app/ml/overlay.py
+import io
+
+import numpy as np
+from PIL import Image
+
+# matplotlib's "jet" colormap as piecewise-linear (x, value) control points
+_JET_SEGMENTS = {
+    "red": ((0.0, 0.0), (0.35, 0.0), (0.66, 1.0), (0.89, 1.0), (1.0, 0.5)),
+    "green": ((0.0, 0.0), (0.125, 0.0), (0.375, 1.0), (0.64, 1.0), (0.91, 0.0), (1.0, 0.0)),
+    "blue": ((0.0, 0.5), (0.11, 1.0), (0.34, 1.0), (0.65, 0.0), (1.0, 0.0)),
+}
+
+
+def _build_jet_lut() -> np.ndarray:
+    x = np.linspace(0.0, 1.0, 256)
+    channels = []
+    for name in ("red", "green", "blue"):
+        xp, fp = zip(*_JET_SEGMENTS[name])
+        channels.append(np.interp(x, xp, fp))
+    return np.round(np.stack(channels, axis=1) * 255.0).astype(np.uint8)
+
+
+# (256, 3) uint8 color table, built once at import
+JET_LUT = _build_jet_lut()
+
+def render_overlay(image: np.ndarray, heatmap: np.ndarray, alpha: float = 0.4) -> np.ndarray:
+    """
+    Superimposes a [0, 1] heatmap (h, w) on a uint8 RGB image (H, W, 3).
+    Everything stays in integer NumPy: one LUT gather for the colors, one
+    widening copy for the blend, one LUT gather for the final rescale.
+    """
+    idx = np.uint8(255 * np.clip(heatmap, 0.0, 1.0))
+    colored = Image.fromarray(JET_LUT[idx]).resize((image.shape[1], image.shape[0]))
+
+    blended = np.asarray(colored, dtype=np.uint16) * int(round(alpha * 256))
+    blended >>= 8
+    blended += image
+
+    # Stretch to the full 0-255 range (what keras' array_to_img used to do)
+    lo, hi = int(blended.min()), int(blended.max())
+    scale = np.clip((np.arange(hi + 1) - lo) * 255 // max(hi - lo, 1), 0, 255).astype(np.uint8)
+    return scale[blended]
+
+
+def encode_image(arr: np.ndarray, fmt: str = "webp") -> bytes:
+    buf = io.BytesIO()
+    img = Image.fromarray(arr)
+    if fmt == "webp":
+        # method=0 is the fastest encoder setting; size is within a few % of the default
+        img.save(buf, format="WEBP", quality=80, method=0)
+    elif fmt == "png":
+        img.save(buf, format="PNG", optimize=False, compress_level=6)
+    else:
+        img.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
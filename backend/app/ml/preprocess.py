@@ -0,0 +1,51 @@
+# app/ml/preprocess.py
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.ml.radiograph import open_image
+
+# Model input size (square)
+IMG_SIZE = 150
+# Longest side we keep for the grayscale filter; plenty for a colour check
+FILTER_SIZE = 256
+
+
+@dataclass
+class PreparedImage:
+    """One decoded upload, shared by the grayscale filter and the model."""
+    rgb: np.ndarray      # reduced uint8 RGB image (about FILTER_SIZE px) for the filter
+    resized: np.ndarray  # uint8 RGB image at IMG_SIZE x IMG_SIZE
+
+    @property
+    def model_input(self) -> np.ndarray:
+        """(1, IMG_SIZE, IMG_SIZE, 3) float32 batch scaled to [0, 1]."""
+        return (self.resized.astype(np.float32) / 255.0)[np.newaxis, ...]
+
+
+def prepare_image(file_bytes: bytes, size: int = IMG_SIZE, filter_size: int = FILTER_SIZE) -> PreparedImage:
+    """
+    Decodes an upload ONCE, close to the size we actually need.
+
+    JPEGs are decoded in draft mode, which lets libjpeg scale by 1/2, 1/4
+    or 1/8 during decoding, so a 3000+ px photo never exists at full size.
+    Other formats decode at full size but are immediately shrunk with a
+    cheap integer box reduce before any conversion or resampling. DICOM and
+    16-bit images are windowed down to 8-bit while being reduced (see
+    app/ml/radiograph.py).
+    """
+    target = max(size, filter_size)
+    img = open_image(file_bytes, target)
+
+    # No-op for anything that isn't a JPEG
+    img.draft("RGB", (target, target))
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    factor = min(img.size) // target
+    if factor >= 2:
+        img = img.reduce(factor)
+    img = img.convert("RGB")
+
+    resized = img.resize((size, size))
+    return PreparedImage(rgb=np.asarray(img), resized=np.asarray(resized))
@@ -0,0 +1,161 @@
+# app/ml/profiling.py
+"""
+On-demand profiling of the prediction path.
+
+An admin turns it on for a sampled fraction of requests (PUT
+/admin/profiling) or flags a single request (header `X-Profile: 1` with
+an admin token). The engine call for such a request then runs through
+run_profiled() on the inference worker: a cProfile of the call, plus a
+TensorFlow profiler trace of the model calls made meanwhile, written to
+PROFILE_DIR/<capture id>/. Only the newest PROFILE_MAX_CAPTURES are kept.
+
+Off (the default), the prediction path only reads a context variable and
+one attribute per request. With INFERENCE_BATCHING the forward pass runs
+on the micro-batcher's thread: the Python profile shows it as a wait and
+the TF trace has the details (of every request in that batch).
+"""
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+
+from app.config import settings
+
+META_FILE = "meta.json"
+
+
+class ProfilingControls:
+    """Sampling settings of this API process, changed through /admin/profiling."""
+
+    def __init__(self):
+        self.rate = 0.0
+        self.tf_trace = True
+
+
+controls = ProfilingControls()
+
+# Set for a request flagged with X-Profile by an admin (see app/deps.py)
+_flagged = contextvars.ContextVar("profile_request", default=False)
+
+
+def flag_request():
+    _flagged.set(True)
+
+
+@dataclass(frozen=True)
+class Capture:
+    """What to record for one engine call; sent to the worker with the job."""
+    id: str
+    reason: str  # "sampled" or "flagged"
+    tf_trace: bool
+
+
+def capture_for_request() -> Capture | None:
+    """A Capture if this request's engine call should be profiled, else None."""
+    if _flagged.get():
+        reason = "flagged"
+    elif controls.rate and random.random() < controls.rate:
+        reason = "sampled"
+    else:
+        return None
+    capture_id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    return Capture(capture_id, reason, controls.tf_trace)
+
+
+# The TF profiler allows one session per process: concurrent captures skip the trace
+_tf_trace_lock = threading.Lock()
+
+
+def run_profiled(capture: Capture, fn, *args):
+    """fn(*args) under cProfile (and the TF profiler); runs on the inference worker."""
+    directory = os.path.join(settings.PROFILE_DIR, capture.id)
+    os.makedirs(directory, exist_ok=True)
+    tf_trace = capture.tf_trace and _tf_trace_lock.acquire(blocking=False)
+    if tf_trace:
+        import tensorflow as tf
+        try:
+            tf.profiler.experimental.start(directory)
+        except Exception:
+            tf_trace = False
+            _tf_trace_lock.release()
+    profiler = cProfile.Profile()
+    error = None
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        return fn(*args)
+    except Exception as e:
+        error = repr(e)
+        raise
+    finally:
+        profiler.disable()
+        seconds = time.perf_counter() - start
+        if tf_trace:
+            try:
+                tf.profiler.experimental.stop()
+            finally:
+                _tf_trace_lock.release()
+        _write(directory, capture, profiler, fn, seconds, tf_trace, error)
+        _rotate()
+
+
+def _write(directory: str, capture: Capture, profiler: cProfile.Profile, fn, seconds: float, tf_trace: bool, error):
+    profiler.dump_stats(os.path.join(directory, "profile.pstats"))
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(40)
+    with open(os.path.join(directory, "profile.txt"), "w") as f:
+        f.write(summary.getvalue())
+    meta = {"id": capture.id, "reason": capture.reason, "function": fn.__name__, "seconds": round(seconds, 4),
+            "tf_trace": tf_trace, "pid": os.getpid(), "created_at": datetime.utcnow().isoformat(), "error": error}
+    with open(os.path.join(directory, META_FILE), "w") as f:
+        json.dump(meta, f)
+
+
+def _rotate():
+    """Drops the oldest captures beyond PROFILE_MAX_CAPTURES (ids sort by time)."""
+    try:
+        names = sorted(os.listdir(settings.PROFILE_DIR))
+    except FileNotFoundError:
+        return
+    for name in names[:max(0, len(names) - settings.PROFILE_MAX_CAPTURES)]:
+        shutil.rmtree(os.path.join(settings.PROFILE_DIR, name), ignore_errors=True)
+
+
+def list_captures() -> list[dict]:
+    """Metadata of the stored captures, newest first, with their files."""
+    try:
+        names = sorted(os.listdir(settings.PROFILE_DIR), reverse=True)
+    except FileNotFoundError:
+        return []
+    captures = []
+    for name in names:
+        directory = os.path.join(settings.PROFILE_DIR, name)
+        try:
+            with open(os.path.join(directory, META_FILE)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue  # still being written, or not a capture
+        meta["files"] = sorted(
+            os.path.relpath(os.path.join(root, file), directory)
+            for root, _, files in os.walk(directory) for file in files)
+        captures.append(meta)
+    return captures
+
+
+def capture_file(capture_id: str, path: str) -> str:
+    """Local path of a file of a capture; raises FileNotFoundError (also for paths outside it)."""
+    root = os.path.realpath(settings.PROFILE_DIR)
+    directory = os.path.realpath(os.path.join(root, capture_id))
+    full = os.path.realpath(os.path.join(directory, path))
+    if os.path.dirname(directory) != root or not full.startswith(directory + os.sep) or not os.path.isfile(full):
+        raise FileNotFoundError(path)
+    return full
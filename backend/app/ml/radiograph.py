@@ -0,0 +1,166 @@
+# app/ml/radiograph.py
+"""
+DICOM and high bit depth (16-bit PNG/TIFF) radiographs.
+
+They come out as 8-bit grayscale PIL images, already reduced to about the
+size the caller needs, with a window/level applied: the DICOM's own
+WindowCenter/WindowWidth (after RescaleSlope/Intercept) when present,
+otherwise a percentile window over the image. MONOCHROME1 is inverted.
+
+Pixels are never turned into a full-resolution float array: the image is
+box-reduced in integer arithmetic, one strip of rows at a time, and only
+the reduced image is converted and windowed. Uncompressed DICOM pixel data
+is read in place from the upload's bytes (no copy at all). Compressed
+transfer syntaxes go through pydicom's decoders (RLE natively; JPEG,
+JPEG-LS and JPEG 2000 through the pylibjpeg plugins in requirements.txt)
+and are decoded at full size first.
+"""
+import io
+
+import numpy as np
+from PIL import Image
+
+# PIL modes with more than 8 bits per sample
+WIDE_MODES = ("I;16", "I;16L", "I;16B", "I;16N", "I", "F")
+# Window used when the image doesn't carry one
+PERCENTILE_WINDOW = (0.5, 99.5)
+# Pixels reduced per strip: bounds the temporary integer copy
+STRIP_PIXELS = 1 << 20
+
+
+def is_dicom(data: bytes) -> bool:
+    """DICOM Part 10 files: a 128-byte preamble, then "DICM"."""
+    return data[128:132] == b"DICM"
+
+
+def block_reduce(pixels: np.ndarray, target: int, mask: int | None = None) -> np.ndarray:
+    """
+    Box average of a 2-D integer or float array by the largest whole factor
+    that keeps the short side at `target` px or more, as float32. Works on
+    strips of rows, so the only temporaries are one strip (as int64/float64)
+    and the reduced output. `mask` keeps only the stored bits of each pixel.
+    """
+    factor = max(1, min(pixels.shape) // target)
+    h, w = (pixels.shape[0] // factor) * factor, (pixels.shape[1] // factor) * factor
+    out = np.empty((h // factor, w // factor), dtype=np.float32)
+    acc = np.float64 if pixels.dtype.kind == "f" else np.int64
+    rows = max(1, STRIP_PIXELS // (w * factor)) * factor
+    for top in range(0, h, rows):
+        strip = pixels[top:min(top + rows, h), :w]
+        if mask is not None:
+            strip = strip & mask
+        blocks = strip.reshape(strip.shape[0] // factor, factor, w // factor, factor)
+        out[top // factor:(top + strip.shape[0]) // factor] = blocks.sum(axis=(1, 3), dtype=acc) / (factor * factor)
+    return out
+
+
+def apply_window(values: np.ndarray, center: float | None = None, width: float | None = None,
+                 invert: bool = False) -> np.ndarray:
+    """float values -> uint8 through a linear window (DICOM PS3.3 C.11.2.1.2), or a percentile one."""
+    if center is None or not width or width < 1:
+        lo, hi = np.percentile(values, PERCENTILE_WINDOW)
+    else:
+        lo, hi = center - 0.5 - (width - 1) / 2, center - 0.5 + (width - 1) / 2
+    scaled = np.clip((values - lo) / max(float(hi - lo), 1e-6), 0.0, 1.0)
+    if invert:
+        scaled = 1.0 - scaled
+    return (scaled * 255.0 + 0.5).astype(np.uint8)
+
+
+def _first(value):
+    """First of a possibly multi-valued DICOM element, as float (None if absent)."""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value[0])
+    except TypeError:
+        return float(value)
+
+
+def _native_pixels(ds, data: bytes):
+    """
+    The first frame of uncompressed monochrome pixel data as a read-only
+    view into `data`, or None if pydicom has to decode it.
+    """
+    syntax = ds.file_meta.get("TransferSyntaxUID")
+    element = ds.get_item("PixelData", keep_deferred=True)
+    if (syntax is None or syntax.is_compressed or not syntax.is_little_endian or element is None
+            or getattr(element, "value_tell", None) is None or ds.get("SamplesPerPixel", 1) != 1
+            or ds.BitsAllocated not in (8, 16)):
+        return None
+    dtype = np.dtype(f"{'i' if ds.get('PixelRepresentation', 0) else 'u'}{ds.BitsAllocated // 8}").newbyteorder("<")
+    count = ds.Rows * ds.Columns
+    if element.value_tell + count * dtype.itemsize > len(data):
+        return None
+    return np.frombuffer(data, dtype=dtype, count=count, offset=element.value_tell).reshape(ds.Rows, ds.Columns)
+
+
+def dicom_to_gray(data: bytes, target: int) -> Image.Image:
+    """Windowed 8-bit "L" image of a DICOM's first frame, about `target` px on the short side."""
+    try:
+        import pydicom
+    except ImportError:
+        raise ValueError("DICOM uploads need pydicom (pip install \"pydicom>=3\")")
+
+    # defer_size: large values (the pixel data) are only located, not read
+    ds = pydicom.dcmread(io.BytesIO(data), defer_size=1024)
+    pixels = _native_pixels(ds, data)
+    mask = None
+    if pixels is not None:
+        stored = ds.get("BitsStored", ds.BitsAllocated)
+        if stored < ds.BitsAllocated and pixels.dtype.kind == "u":
+            mask = (1 << stored) - 1  # high bits may hold overlays
+    else:
+        pixels = ds.pixel_array  # compressed: full decode by pydicom (masks and sign-extends itself)
+        if pixels.ndim == 4 or (pixels.ndim == 3 and ds.get("SamplesPerPixel", 1) == 1):
+            pixels = pixels[0]  # first frame
+        if pixels.ndim == 3:
+            pixels = pixels.mean(axis=2, dtype=np.float32)  # colour secondary capture
+
+    values = block_reduce(pixels, target, mask)
+    slope, intercept = _first(ds.get("RescaleSlope")), _first(ds.get("RescaleIntercept"))
+    if slope is not None or intercept is not None:
+        values = values * np.float32(slope if slope is not None else 1.0) + np.float32(intercept or 0.0)
+    gray = apply_window(values, _first(ds.get("WindowCenter")), _first(ds.get("WindowWidth")),
+                        invert=ds.get("PhotometricInterpretation") == "MONOCHROME1")
+    return Image.fromarray(gray, "L")
+
+
+def wide_to_gray(img: Image.Image, target: int) -> Image.Image:
+    """Windowed 8-bit "L" image of a 16-bit/32-bit grayscale PIL image, about `target` px on the short side."""
+    pixels = np.asarray(img)
+    img.close()  # the decoded copy isn't needed any more
+    return Image.fromarray(apply_window(block_reduce(pixels, target)), "L")
+
+
+def open_image(data: bytes, target: int) -> Image.Image:
+    """
+    PIL image of an upload. DICOM and wide grayscale images come back as
+    windowed 8-bit "L", reduced to about `target` px; anything else is
+    returned as opened (lazily), for the caller to decode.
+    """
+    if is_dicom(data):
+        return dicom_to_gray(data, target)
+    img = Image.open(io.BytesIO(data))
+    if img.mode in WIDE_MODES:
+        return wide_to_gray(img, target)
+    return img
+
+
+def verify_image(data: bytes):
+    """
+    Cheap check that an upload is an image open_image() can read, without
+    decoding its pixels (PIL's verify(); DICOM: header plus pixel data
+    present). Raises ValueError otherwise.
+    """
+    try:
+        if is_dicom(data):
+            import pydicom
+            ds = pydicom.dcmread(io.BytesIO(data), defer_size=1024)
+            if "PixelData" not in ds or not ds.get("Rows") or not ds.get("Columns"):
+                raise ValueError("DICOM without pixel data")
+        else:
+            with Image.open(io.BytesIO(data)) as img:
+                img.verify()
+    except Exception as e:
+        raise ValueError("Invalid image") from e
@@ -0,0 +1,217 @@
+# app/ml/registry.py
+"""
+Which model versions exist, and which one serves traffic.
+
+A version is a Keras model file: settings.MODEL_PATH, plus every *.keras
+file in MODEL_REGISTRY_DIR. Its id is the short content hash of the file it
+is scored with (the Keras model, or its TFLite export), so everything keyed
+on it (prediction cache entries, Scan.model_version) follows the weights.
+
+The active version, and an optional shadow version scored on a sample of
+traffic for comparison only, are chosen through /admin/models and persisted
+to MODEL_REGISTRY_STATE so they survive restarts. Every process re-reads
+that file when it changes (checked at most once per STATE_CHECK_INTERVAL),
+so other API workers and the job consumers follow a swap within a second or
+so. Loading the models happens in app.ml.predict, in whichever process does
+the scoring.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from pathlib import Path
+
+from app.config import settings
+from app.ml.tflite_backend import tflite_path
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of MODEL_REGISTRY_STATE for changes by other processes
+STATE_CHECK_INTERVAL = 1.0
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """One model version. Small and picklable: jobs carry it to the workers."""
+    version: str
+    path: str          # Keras model: Grad-CAM, and scoring with the keras backend
+    scoring_path: str  # what predict_batch() runs: the Keras model or its TFLite export
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+
+def scoring_path(path: str) -> str:
+    if settings.INFERENCE_BACKEND != "tflite":
+        return path
+    if settings.TFLITE_MODEL_PATH and os.path.abspath(path) == os.path.abspath(settings.MODEL_PATH):
+        return settings.TFLITE_MODEL_PATH
+    return tflite_path(path, settings.TFLITE_VARIANT)
+
+
+@lru_cache(maxsize=256)
+def _file_hash(path: str, mtime_ns: int, size: int) -> str:
+    # (mtime, size) are part of the key: a file replaced in place is hashed again
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()[:12]
+
+
+def spec_for(path: str) -> ModelSpec:
+    """Raises FileNotFoundError if the model (or its TFLite export) is missing."""
+    scoring = scoring_path(path)
+    st = os.stat(scoring)
+    return ModelSpec(_file_hash(scoring, st.st_mtime_ns, st.st_size), path, scoring)
+
+
+class ModelRegistry:
+    """
+    Available versions plus the active/shadow choice. Swapping is a single
+    reference assignment: requests pick up a spec once and use it to the
+    end, so in-flight work finishes on the version it started with.
+    """
+
+    def __init__(self, default_path: str, registry_dir: str = "", state_path: str = ""):
+        self.default_path = default_path
+        self.registry_dir = registry_dir
+        self.state_path = state_path or (os.path.join(registry_dir, "registry.json") if registry_dir else "")
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._state_mtime = None
+        self._next_check = 0.0
+        self._active = None
+        self._shadow = None
+        self._shadow_rate = 0.0
+
+    def _paths(self) -> list[str]:
+        paths = [self.default_path]
+        if self.registry_dir and os.path.isdir(self.registry_dir):
+            paths += sorted(str(p) for p in Path(self.registry_dir).glob("*.keras"))
+        return list(dict.fromkeys(os.path.abspath(p) for p in paths))
+
+    def available(self) -> dict[str, ModelSpec]:
+        """version -> spec for every model file present (hashes are cached per file)."""
+        specs = {}
+        for path in self._paths():
+            try:
+                spec = spec_for(path)
+            except FileNotFoundError:
+                continue  # e.g. no TFLite export of it yet
+            specs.setdefault(spec.version, spec)
+        return specs
+
+    def resolve(self, version: str) -> ModelSpec:
+        """Raises KeyError for unknown versions."""
+        self._ensure_loaded()
+        for spec in (self._active, self._shadow):
+            if spec is not None and spec.version == version:
+                return spec
+        return self.available()[version]
+
+    def _ensure_loaded(self):
+        """Loads the state on first use, and again whenever its file has changed."""
+        if self._loaded and (not self.state_path or time.monotonic() < self._next_check):
+            return
+        with self._lock:
+            self._next_check = time.monotonic() + STATE_CHECK_INTERVAL
+            mtime = self._mtime()
+            if self._loaded and mtime == self._state_mtime:
+                return
+            try:
+                state = self._read_state()
+            except (OSError, ValueError) as e:
+                logger.warning("Can't read the model registry state (%s)", e)
+                if self._loaded:
+                    return  # keep serving what we have
+                state = {}
+            active, shadow, shadow_rate = spec_for(os.path.abspath(self.default_path)), None, 0.0
+            try:
+                if state.get("active"):
+                    active = spec_for(state["active"])
+                if state.get("shadow"):
+                    shadow = spec_for(state["shadow"])
+                    shadow_rate = float(state.get("shadow_rate", 0.0))
+            except FileNotFoundError as e:
+                logger.warning("Model registry state points at a missing model (%s), using the default", e)
+            if self._loaded and active != self._active:
+                logger.info("Active model changed to %s (%s)", active.version, active.name)
+            self._active, self._shadow, self._shadow_rate = active, shadow, shadow_rate
+            self._state_mtime = mtime
+            self._loaded = True
+
+    def _mtime(self) -> int | None:
+        try:
+            return os.stat(self.state_path).st_mtime_ns if self.state_path else None
+        except FileNotFoundError:
+            return None
+
+    def _read_state(self) -> dict:
+        if not self.state_path or not os.path.isfile(self.state_path):
+            return {}
+        with open(self.state_path) as f:
+            return json.load(f)
+
+    def _save(self):
+        if not self.state_path:
+            return
+        state = {
+            "active": self._active.path,
+            "shadow": self._shadow.path if self._shadow else None,
+            "shadow_rate": self._shadow_rate,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+        self._state_mtime = self._mtime()  # our own write: nothing to reload
+
+    @property
+    def active(self) -> ModelSpec:
+        self._ensure_loaded()
+        return self._active
+
+    @property
+    def shadow(self) -> ModelSpec | None:
+        self._ensure_loaded()
+        return self._shadow
+
+    @property
+    def shadow_rate(self) -> float:
+        self._ensure_loaded()
+        return self._shadow_rate
+
+    def activate(self, spec: ModelSpec):
+        self._ensure_loaded()
+        with self._lock:
+            self._active = spec
+            self._save()
+
+    def set_shadow(self, spec: ModelSpec | None, rate: float = 0.0):
+        self._ensure_loaded()
+        with self._lock:
+            self._shadow, self._shadow_rate = spec, (rate if spec is not None else 0.0)
+            self._save()
+
+    def describe(self) -> dict:
+        active, shadow = self.active, self.shadow
+        return {
+            "active": asdict(active),
+            "shadow": asdict(shadow) if shadow else None,
+            "shadow_rate": self.shadow_rate,
+            "versions": [
+                {"version": v, "name": spec.name, "active": v == active.version,
+                 "shadow": shadow is not None and v == shadow.version}
+                for v, spec in self.available().items()
+            ],
+        }
+
+
+model_registry = ModelRegistry(settings.MODEL_PATH, settings.MODEL_REGISTRY_DIR, settings.MODEL_REGISTRY_STATE)
@@ -0,0 +1,94 @@
+# app/ml/tflite_backend.py
+import threading
+from pathlib import Path
+
+import numpy as np
+
+# Quantization variants we export; see export_tflite()
+TFLITE_VARIANTS = ("fp16", "dynamic", "int8")
+
+
+def tflite_path(model_path: str, variant: str) -> str:
+    """app/ml/chest_xray_cnn_model.keras -> app/ml/chest_xray_cnn_model.<variant>.tflite"""
+    p = Path(model_path)
+    return str(p.with_name(f"{p.stem}.{variant}.tflite"))
+
+
+def _interpreter_class():
+    # Prefer the standalone runtimes: they don't drag in the full TensorFlow
+    # package, which is most of the per-replica memory
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteModel:
+    """
+    Minimal predict_on_batch() equivalent on top of a TFLite interpreter.
+
+    The interpreter is not thread-safe, so calls are serialized; the
+    micro-batcher already funnels concurrent requests into one caller.
+    Tensors are only re-allocated when the batch size changes.
+    """
+
+    def __init__(self, path: str, num_threads: int | None = None):
+        self.path = path
+        self._interpreter = _interpreter_class()(model_path=path, num_threads=num_threads)
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = None
+        self._lock = threading.Lock()
+
+    def _resize(self, n: int):
+        if n != self._batch_size:
+            shape = [n, *self._input["shape"][1:]]
+            self._interpreter.resize_tensor_input(self._input["index"], shape)
+            self._interpreter.allocate_tensors()
+            self._batch_size = n
+
+    def predict_on_batch(self, batch: np.ndarray) -> np.ndarray:
+        with self._lock:
+            self._resize(len(batch))
+            x = batch.astype(np.float32, copy=False)
+            scale, zero_point = self._input["quantization"]
+            if self._input["dtype"] != np.float32 and scale:
+                # Fully integer model: quantize the input ourselves
+                x = np.round(x / scale + zero_point)
+            self._interpreter.set_tensor(self._input["index"], x.astype(self._input["dtype"], copy=False))
+            self._interpreter.invoke()
+            out = self._interpreter.get_tensor(self._output["index"])
+            scale, zero_point = self._output["quantization"]
+            if self._output["dtype"] != np.float32 and scale:
+                out = (out.astype(np.float32) - zero_point) * scale
+            return np.array(out, dtype=np.float32)
+
+
+def export_tflite(model, variant: str, representative_data=None) -> bytes:
+    """
+    Converts a Keras model to a TFLite flatbuffer.
+
+      - fp16    : float16 weights, float compute (about half the size, ~no accuracy loss)
+      - dynamic : int8 weights, activations quantized on the fly (dynamic range)
+      - int8    : int8 weights and activations, calibrated on `representative_data`
+                  (an iterable of (1, H, W, 3) float32 arrays); inputs/outputs stay float
+    """
+    import tensorflow as tf
+
+    if variant not in TFLITE_VARIANTS:
+        raise ValueError(f"unknown TFLite variant {variant!r}, expected one of {TFLITE_VARIANTS}")
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if variant == "fp16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == "int8":
+        if representative_data is None:
+            raise ValueError("int8 export needs representative (calibration) images")
+        converter.representative_dataset = lambda: ([x] for x in representative_data)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    return converter.convert()
@@ -0,0 +1,95 @@
+# app/ml/tta.py
+"""
+Test-time augmentation for uncertain predictions.
+
+A prediction below CONFIDENCE_THRESHOLD is re-scored on augmented views of
+the same image (flip, small crops and shifts, contrast changes), all in ONE
+forward pass, and the probabilities of the original and the views are
+averaged. Confident predictions never pay for it.
+"""
+import threading
+
+import numpy as np
+from PIL import Image, ImageEnhance, ImageOps
+
+from app.config import settings
+from app.core import metrics
+from app.ml.preprocess import IMG_SIZE
+
+TTA_OUTCOMES = metrics.registry.counter(
+    "pneumonia_tta_total",
+    "Uncertain predictions sent to test-time augmentation, by outcome (resolved: now above the "
+    "confidence threshold; uncertain: still below it; skipped: no view fits the latency budget).",
+    ["outcome"])
+
+
+def _box(scale: float, dx: float = 0.0, dy: float = 0.0):
+    """Crop box covering `scale` of the image, moved by (dx, dy) of the free margin (-1..1)."""
+    side = IMG_SIZE * scale
+    margin = (IMG_SIZE - side) / 2
+    left, top = margin * (1 + dx), margin * (1 + dy)
+    return left, top, left + side, top + side
+
+
+def _crop(box):
+    return lambda img: img.resize((IMG_SIZE, IMG_SIZE), Image.Resampling.BILINEAR, box=box)
+
+
+def _contrast(factor: float):
+    return lambda img: ImageEnhance.Contrast(img).enhance(factor)
+
+
+# Applied in this order: TTA_VIEWS=n uses the first n
+VIEWS = [
+    ("flip", ImageOps.mirror),
+    ("crop_center", _crop(_box(0.9))),
+    ("contrast_up", _contrast(1.2)),
+    ("contrast_down", _contrast(0.8)),
+    ("shift_left", _crop(_box(0.92, dx=-1))),
+    ("shift_right", _crop(_box(0.92, dx=1))),
+    ("shift_up", _crop(_box(0.92, dy=-1))),
+    ("shift_down", _crop(_box(0.92, dy=1))),
+    ("flip_crop_center", lambda img: ImageOps.mirror(_crop(_box(0.9))(img))),
+    ("crop_top_left", _crop(_box(0.85, dx=-1, dy=-1))),
+    ("crop_top_right", _crop(_box(0.85, dx=1, dy=-1))),
+    ("crop_bottom", _crop(_box(0.85, dy=1))),
+]
+
+
+def augment(resized: np.ndarray, n: int) -> np.ndarray:
+    """The first `n` views of a uint8 IMG_SIZE x IMG_SIZE RGB image, as an (n, H, W, 3) model batch."""
+    img = Image.fromarray(resized)
+    views = [np.asarray(fn(img)) for _, fn in VIEWS[:n]]
+    return np.stack(views).astype(np.float32) / np.float32(255.0)
+
+
+class LatencyBudget:
+    """
+    Sizes TTA passes to TTA_LATENCY_BUDGET_MS from a moving average of
+    the cost per view measured in this process.
+    """
+
+    def __init__(self, budget_ms: float, alpha: float = 0.2):
+        self.budget = budget_ms / 1000.0
+        self.alpha = alpha
+        self.per_view = None  # seconds, unknown until the first pass
+        self._lock = threading.Lock()
+
+    def views(self, wanted: int) -> int:
+        if self.per_view is None or self.budget <= 0:
+            return wanted
+        views = max(0, min(wanted, int(self.budget / self.per_view)))
+        if views == 0:
+            # Let the estimate decay while skipping, so one slow pass (e.g. a
+            # retrace) can't switch TTA off for good: it gets re-measured
+            with self._lock:
+                self.per_view *= 1 - self.alpha
+        return views
+
+    def record(self, views: int, seconds: float):
+        sample = seconds / max(1, views)
+        with self._lock:
+            self.per_view = sample if self.per_view is None else self.per_view + self.alpha * (sample - self.per_view)
+
+
+budget = LatencyBudget(settings.TTA_LATENCY_BUDGET_MS)
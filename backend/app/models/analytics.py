@@ -0,0 +1,29 @@
+# app/models/analytics.py
+from sqlalchemy import Column, Integer, String, Float, Date, Index
+from app.database import Base
+
+# No-user scans (e.g. saved by the bulk-score CLI without --user-id) roll up
+# under user_id 0: NULLs can't take part in the upsert's conflict key
+NO_USER = 0
+# Every scan is also counted under this pseudo-user, so reports over all
+# users read days x labels x buckets rows instead of summing every user's
+ALL_USERS = -1
+
+class ScanDailyStat(Base):
+    """
+    Rollup of scans per UTC day x user x label x confidence decile, kept
+    up to date by create_scan (see app/services/analytics_service.py) and
+    rebuilt by `python -m app.cli.backfill_analytics`.
+    """
+    __tablename__ = "scan_daily_stats"
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, primary_key=True, default=NO_USER)
+    label = Column(String, primary_key=True)
+    bucket = Column(Integer, primary_key=True)  # confidence decile: 0 = [0, 0.1), ..., 9 = [0.9, 1.0]
+    count = Column(Integer, nullable=False, default=0)
+    confidence_sum = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        # Reports filter on one user (or ALL_USERS) and a day range
+        Index("ix_scan_daily_stats_user_day", "user_id", "day"),
+    )
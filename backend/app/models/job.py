@@ -0,0 +1,29 @@
+# app/models/job.py
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from datetime import datetime
+from app.database import Base
+
+class ScanJob(Base):
+    """
+    A queued predict-and-save (POST /scan/predict/save?async=true). The upload
+    is already stored under `image_key`; a job worker scores it and creates
+    the Scan. See app/services/job_service.py.
+    """
+    __tablename__ = "scan_jobs"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    image_key = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued")  # queued | running | done | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    # A running job whose lease has expired was claimed by a worker that died: it is claimable again
+    locked_by = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    scan_id = Column(Integer, ForeignKey("scans.id"), nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Workers claim the oldest queued (or lease-expired running) jobs
+        Index("ix_scan_jobs_status_id", "status", "id"),
+    )
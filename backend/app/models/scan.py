@@ -1,5 +1,5 @@
 # app/models/scan.py
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -11,7 +11,15 @@ class Scan(Base):
     image_path = Column(String, nullable=False)   # local path served via static route
     prediction = Column(String, nullable=False)
     confidence = Column(Float, nullable=False)
-    raw_probs = Column(Text, nullable=True)
+    probs = Column(JSON(none_as_null=True), nullable=True)  # {"NORMAL": 0.91, "BACTERIAL": 0.06, ...}
+    model_version = Column(String, nullable=True)  # registry version (model file hash) that scored it; NULL for older rows
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", backref="scans")
+
+    __table_args__ = (
+        # History is read newest-first per user, keyset-paginated on (created_at, id)
+        Index("ix_scans_user_created", "user_id", "created_at", "id"),
+        # Same, filtered by label
+        Index("ix_scans_user_prediction_created", "user_id", "prediction", "created_at", "id"),
+    )
@@ -0,0 +1,48 @@
+# app/routers/analytics.py
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.deps import get_db, require_admin
+from app.services import analytics_service
+
+# Everything here reads the scan_daily_stats rollup, never the scans table:
+# cost scales with days x users x labels, not with the number of scans
+router = APIRouter(prefix="/admin/analytics", tags=["analytics"], dependencies=[Depends(require_admin)])
+
+
+def _range(since: date | None, until: date | None):
+    if since is not None and until is not None and until <= since:
+        raise HTTPException(status_code=400, detail="until must be after since")
+
+
+@router.get("/daily")
+async def daily(since: date | None = Query(None, description="first UTC day, inclusive"),
+                until: date | None = Query(None, description="last UTC day, exclusive"),
+                user_id: int | None = None, db: AsyncSession = Depends(get_db)):
+    """Scans per day, in total and per label."""
+    _range(since, until)
+    return await analytics_service.daily_volumes(db, since, until, user_id)
+
+
+@router.get("/labels")
+async def labels(since: date | None = None, until: date | None = None, user_id: int | None = None,
+                 db: AsyncSession = Depends(get_db)):
+    """Count and mean confidence per predicted label."""
+    _range(since, until)
+    return await analytics_service.label_distribution(db, since, until, user_id)
+
+
+@router.get("/confidence")
+async def confidence(since: date | None = None, until: date | None = None, user_id: int | None = None,
+                     label: str | None = None, db: AsyncSession = Depends(get_db)):
+    """Histogram of confidences in deciles."""
+    _range(since, until)
+    return await analytics_service.confidence_histogram(db, since, until, user_id, label)
+
+
+@router.get("/users")
+async def users(since: date | None = None, until: date | None = None, limit: int = Query(20, ge=1, le=200),
+                db: AsyncSession = Depends(get_db)):
+    """Users with the most scans (user_id 0: scans saved without an owner)."""
+    _range(since, until)
+    return await analytics_service.top_users(db, since, until, limit)
@@ -1,35 +1,27 @@
 # app/routers/auth.py
 from fastapi import APIRouter, Depends, HTTPException, status, Response, Cookie
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.schemas.user import UserCreate, UserLogin, Token
 from app.deps import get_db
-from app.services.auth_service import create_user, authenticate_user, create_tokens_for_user
+from app.services.auth_service import create_user, authenticate_user, create_tokens_for_user, get_user_by_email
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 @router.post("/register", response_model=Token)
-def register(user_in: UserCreate, response: Response, db: Session = Depends(get_db)):
-    existing = db.query.__self__.query  # placeholder to avoid unused import; actual check below
-    if db.query.__class__:
-        pass
+async def register(user_in: UserCreate, response: Response, db: AsyncSession = Depends(get_db)):
     # check existing
-    if db.query.__class__:
-        pass
-    if db.query(models.user.User).filter(models.user.User.email == user_in.email).first():
+    if await get_user_by_email(db, user_in.email):
         raise HTTPException(status_code=400, detail="Email already registered")
-    user = create_user(db, user_in.name, user_in.email, user_in.password)
+    user = await create_user(db, user_in.name, user_in.email, user_in.password)
     access, refresh = create_tokens_for_user(user)
     # set cookies
     response.set_cookie(key="access_token", value=access, httponly=True, secure=False, samesite="lax")
     response.set_cookie(key="refresh_token", value=refresh, httponly=True, secure=False, samesite="lax")
     return {"access_token": access, "token_type": "bearer"}
 
-# We import here models to avoid circular import earlier
-from app import models
-
 @router.post("/login", response_model=Token)
-def login(credentials: UserLogin, response: Response, db: Session = Depends(get_db)):
-    user = authenticate_user(db, credentials.email, credentials.password)
+async def login(credentials: UserLogin, response: Response, db: AsyncSession = Depends(get_db)):
+    user = await authenticate_user(db, credentials.email, credentials.password)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
     access, refresh = create_tokens_for_user(user)
@@ -0,0 +1,24 @@
+# app/routers/health.py
+from fastapi import APIRouter, Response, status
+from app.ml.engine import inference_engine
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving HTTP."""
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+def readyz(response: Response):
+    """Readiness: the model is loaded and warmed up, so requests won't stall."""
+    ready = inference_engine.ready
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {
+        "status": "ready" if ready else "warming_up",
+        "workers": inference_engine.replicas,
+        "workers_ready": inference_engine.ready_replicas,
+    }
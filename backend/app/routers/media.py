@@ -0,0 +1,67 @@
+# app/routers/media.py
+import os
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, RedirectResponse, Response
+from fastapi.staticfiles import StaticFiles
+from app.schemas.scan import MediaVariant
+from app.services.media_service import IMMUTABLE, ensure_derivative, etag, original_path
+from app.utils.storage import storage
+
+router = APIRouter(prefix="/media", tags=["media"])
+
+
+def _not_modified(request: Request, tag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # If-None-Match uses weak comparison: W/"x" matches "x"
+    candidates = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return "*" in candidates or tag in candidates
+
+
+@router.api_route("/{variant}/{key:path}", methods=["GET", "HEAD"])
+async def get_media(variant: MediaVariant, key: str, request: Request):
+    """
+    A stored upload (`original`) or one of its WebP derivatives, rendered
+    on first request and cached. Keys never change content, so responses
+    carry a strong ETag and an immutable, year-long Cache-Control;
+    If-None-Match gets a 304 and Range / If-Range requests are honoured.
+    """
+    tag = etag(key, variant.value)
+    headers = {"ETag": tag, "Cache-Control": IMMUTABLE}
+    if _not_modified(request, tag):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        if variant == MediaVariant.original:
+            path = original_path(key)
+            if path is None:
+                # Remote backend: send the client straight to the object store
+                return RedirectResponse(await run_in_threadpool(storage.url, key))
+            # FileResponse only opens the file while sending: check it exists first
+            if not await run_in_threadpool(os.path.isfile, path):
+                raise FileNotFoundError(key)
+            return FileResponse(path, headers=headers)
+        path = await run_in_threadpool(ensure_derivative, key, variant.value)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Not found")
+    except OSError:
+        # PIL couldn't decode the stored file
+        raise HTTPException(status_code=415, detail="Cannot render this file")
+    return FileResponse(path, media_type="image/webp", headers=headers)
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    StaticFiles for directories whose files never change once written
+    (uploads, derivatives and heatmaps are all content- or uuid-named):
+    adds a year-long immutable Cache-Control on top of its ETag/304 and
+    Range handling.
+    """
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = IMMUTABLE
+        return response
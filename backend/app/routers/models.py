@@ -0,0 +1,39 @@
+# app/routers/models.py
+from fastapi import APIRouter, Depends, HTTPException
+from app.deps import require_admin
+from app.schemas.registry import ModelActivate, RegistryOut, ShadowConfig
+from app.services.model_service import activate_model, clear_shadow_model, describe_models, set_shadow_model
+
+router = APIRouter(prefix="/admin/models", tags=["models"], dependencies=[Depends(require_admin)])
+
+
+@router.get("", response_model=RegistryOut)
+async def list_models():
+    """Available model versions, and which ones are active and shadowed."""
+    return await describe_models()
+
+
+@router.post("/active", response_model=RegistryOut)
+async def activate(body: ModelActivate):
+    """Hot-swaps the served model. Returns once every replica has it loaded."""
+    try:
+        return await activate_model(body.version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown model version {body.version}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not load model {body.version}: {e}")
+
+
+@router.put("/shadow", response_model=RegistryOut)
+async def set_shadow(body: ShadowConfig):
+    try:
+        return await set_shadow_model(body.version, body.rate)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown model version {body.version}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not load model {body.version}: {e}")
+
+
+@router.delete("/shadow", response_model=RegistryOut)
+async def clear_shadow():
+    return await clear_shadow_model()
@@ -0,0 +1,44 @@
+# app/routers/profiling.py
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from app.deps import require_admin
+from app.ml.profiling import capture_file
+from app.schemas.profiling import ProfilingConfig, ProfilingOut
+from app.services.profiling_service import configure_profiling, describe_profiling
+
+router = APIRouter(prefix="/admin/profiling", tags=["profiling"], dependencies=[Depends(require_admin)])
+
+
+@router.get("", response_model=ProfilingOut)
+async def list_profiles():
+    """Sampling settings and the stored captures, newest first."""
+    return await describe_profiling()
+
+
+@router.put("", response_model=ProfilingOut)
+async def set_profiling(body: ProfilingConfig):
+    """
+    Profiles a sampled fraction of prediction requests (per API process).
+    To capture one specific request instead, send it with `X-Profile: 1`.
+    """
+    return await configure_profiling(body.rate, body.tf_trace)
+
+
+@router.delete("", response_model=ProfilingOut)
+async def stop_profiling():
+    return await configure_profiling(0.0)
+
+
+@router.get("/captures/{capture_id}/{path:path}")
+async def download_capture_file(capture_id: str, path: str):
+    """
+    One file of a capture: profile.txt (top functions by cumulative time),
+    profile.pstats (load with pstats or snakeviz) or the TF trace under
+    plugins/profile/ (open the capture directory in TensorBoard).
+    """
+    try:
+        full = await run_in_threadpool(capture_file, capture_id, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Capture file not found")
+    return FileResponse(full, media_type="text/plain" if full.endswith(".txt") else "application/octet-stream")
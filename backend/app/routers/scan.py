@@ -1,62 +1,285 @@
 # app/routers/scan.py
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.deps import get_db, get_current_user
-from app.ml.predict import predict_from_bytes
-from app.utils.storage import save_file_local
-from app.services.scan_service import create_scan, get_user_scans
-from app.schemas.scan import ScanOut
+import asyncio
+import json
+import time
+from datetime import datetime
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.deps import get_db, get_current_user, profile_flag, require_admin
+from app.core.metrics import REJECTIONS, STAGE_SECONDS, UPLOADS_STORED
+from app.ml.predict import probs_by_class
+from app.ml.radiograph import verify_image
+from app.services.inference_service import predict_upload, predict_many, heatmap_for_upload, read_heatmap_base64, cache_stats
+from app.utils.uploads import iter_upload_images
+from app.config import settings
+from app.utils.storage import storage, read_upload, stage_upload, public_url, UploadTooLarge
+from app.services.media_service import ensure_derivatives
+from app.services.scan_service import create_scan, get_user_scans, get_user_scan
+from app.services.job_service import FINISHED, enqueue, get_user_job, wait_for_change
+from app.database import AsyncSessionLocal
+from app.schemas.job import JobOut
+from app.schemas.scan import ScanPage, ScanPredictOut, HeatmapMode
 import io
-from app.utils.image_filter import is_mostly_grayscale
 
 router = APIRouter(prefix="/scan", tags=["scan"])
 
-@router.post("/predict")
-async def predict_scan(file: UploadFile = File(...)):
-    contents = await file.read()
+@router.post("/predict", dependencies=[Depends(profile_flag)])
+async def predict_scan(file: UploadFile = File(...), heatmap: HeatmapMode = Query(HeatmapMode.inline)):
+    # Anonymous uploads aren't stored, so there's nothing to build a lazy
+    # heatmap from later: "lazy" behaves like "false" here
+    try:
+        with STAGE_SECONDS.time("upload_read"):
+            contents, digest = await read_upload(file, settings.UPLOAD_MAX_BYTES)
+    except UploadTooLarge as e:
+        REJECTIONS.inc("too_large")
+        raise HTTPException(status_code=413, detail=str(e))
 
-    # Step 1: Quick filter check
-    is_gray = is_mostly_grayscale(contents)
-    if not is_gray:
+    # Quick grayscale filter + model prediction, from one decode of the upload.
+    # Runs on the inference workers (or comes from the prediction cache)
+    try:
+        result = await predict_upload(contents, apply_filter=True, with_heatmap=heatmap in (HeatmapMode.inline, HeatmapMode.base64), digest=digest)
+    except Exception as e:
+        REJECTIONS.inc("invalid_image")
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {e}")
+
+    if result is None:
         return {"message": "The uploaded image does not look like a chest X-ray.", 
                 "prediction": "Unknown", "confidence": None}
 
-    # Step 2: Proceed to model prediction
-    try:
-        # --- START CHANGE ---
-        # predict_from_bytes now returns 4 values
-        label, confidence, probs, heatmap_base64 = predict_from_bytes(contents)
-        return {
-            "prediction": label,
-            "confidence": confidence,
-            "probabilities": probs, # Keep this for compatibility
-            "heatmap": heatmap_base64 # <-- NEW: Send heatmap to frontend
-        }
-        # --- END CHANGE ---
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Prediction failed: {e}")
+    label, confidence, probs, heatmap_path, model_version = result
+    heatmap_base64 = None
+    if heatmap_path and heatmap == HeatmapMode.base64:
+        heatmap_base64 = await run_in_threadpool(read_heatmap_base64, heatmap_path)
+    return {
+        "prediction": label,
+        "confidence": confidence,
+        "probabilities": probs, # Keep this for compatibility
+        "heatmap_url": public_url(heatmap_path) if heatmap_path else None,
+        "heatmap": heatmap_base64, # only with heatmap=base64
+        "model_version": model_version,
+    }
 
-@router.post("/predict/save", response_model=ScanOut)
-async def predict_and_save(file: UploadFile = File(...), db: Session = Depends(get_db), current_user = Depends(get_current_user)):
-    contents = await file.read()
+def _lazy_heatmap_url(scan) -> str | None:
+    return f"/scan/{scan.id}/heatmap" if scan.prediction != "NORMAL" else None
+
+def _job_out(job, scan=None) -> JobOut:
+    out = JobOut(id=job.id, status=job.status, attempts=job.attempts, error=job.error,
+                 created_at=job.created_at, updated_at=job.updated_at,
+                 status_url=f"/scan/jobs/{job.id}", events_url=f"/scan/jobs/{job.id}/events")
+    if scan is not None:
+        out.scan = ScanPredictOut.model_validate(scan)
+        out.scan.heatmap_url = _lazy_heatmap_url(scan)
+    return out
+
+async def _keep_upload(background_tasks: BackgroundTasks, staged):
+    with STAGE_SECONDS.time("upload_write"):
+        stored = await run_in_threadpool(storage.put, staged.path, staged.key)
+    UPLOADS_STORED.inc("new" if stored else "duplicate")
+    if settings.MEDIA_DERIVATIVES_AT_SAVE:
+        # After the response is sent, so history thumbnails are ready when first listed
+        background_tasks.add_task(ensure_derivatives, staged.key)
+
+@router.post("/predict/save", response_model=ScanPredictOut, responses={202: {"model": JobOut}}, dependencies=[Depends(profile_flag)])
+async def predict_and_save(background_tasks: BackgroundTasks, file: UploadFile = File(...), heatmap: HeatmapMode = Query(HeatmapMode.lazy),
+                           async_: bool = Query(False, alias="async", description="queue it and return 202 with a job to poll or subscribe to"),
+                           db: AsyncSession = Depends(get_db), current_user = Depends(get_current_user)):
+    # Streamed to a staging file (hashed on the way), then stored under its
+    # content hash once it has been scored: re-uploads share one stored file
+    try:
+        with STAGE_SECONDS.time("upload_read"):
+            staged = await stage_upload(file, settings.UPLOAD_MAX_BYTES)
+    except UploadTooLarge as e:
+        REJECTIONS.inc("too_large")
+        raise HTTPException(status_code=413, detail=str(e))
+    if async_:
+        # Stored right away and scored by a job worker (app/services/job_service.py),
+        # once a cheap header check says it is an image. Heatmaps are always lazy here
+        try:
+            await run_in_threadpool(verify_image, staged.data)
+        except ValueError:
+            await run_in_threadpool(storage.discard, staged.path)
+            REJECTIONS.inc("invalid_image")
+            raise HTTPException(status_code=400, detail="Invalid image")
+        await _keep_upload(background_tasks, staged)
+        job = await enqueue(db, current_user.id, staged.key)
+        out = _job_out(job)
+        return JSONResponse(jsonable_encoder(out), status_code=202, headers={"Location": out.status_url})
     try:
-        # --- START CHANGE ---
-        # Get all 4 values, but we'll only use 3
-        label, confidence, probs, _ = predict_from_bytes(contents) 
-        # --- END CHANGE ---
+        label, confidence, probs, heatmap_path, model_version = await predict_upload(staged.data, apply_filter=False, with_heatmap=heatmap in (HeatmapMode.inline, HeatmapMode.base64), digest=staged.sha256)
     except Exception:
+        await run_in_threadpool(storage.discard, staged.path)
+        REJECTIONS.inc("invalid_image")
         raise HTTPException(status_code=400, detail="Invalid image or prediction failed")
     
-    filename = save_file_local(contents, file.filename)
+    await _keep_upload(background_tasks, staged)
     
-    # --- START CHANGE ---
-    # Save 'probs' (the list) as a string, just like before.
-    # The heatmap is ignored and not saved to the DB.
-    scan = create_scan(db, current_user.id, filename, label, confidence, str(probs))
-    # --- END CHANGE ---
-    return scan
-
-@router.get("/history", response_model=list[ScanOut])
-def history(db: Session = Depends(get_db), current_user = Depends(get_current_user)):
-    scans = get_user_scans(db, current_user.id)
-    return scans
\ No newline at end of file
+    # The heatmap is not saved to the DB; it can be rebuilt from the upload
+    scan = await create_scan(db, current_user.id, staged.key, label, confidence, probs_by_class(probs), model_version)
+    out = ScanPredictOut.model_validate(scan)
+    if heatmap == HeatmapMode.lazy:
+        out.heatmap_url = _lazy_heatmap_url(scan)
+    elif heatmap_path and heatmap == HeatmapMode.inline:
+        out.heatmap_url = public_url(heatmap_path)
+    elif heatmap_path and heatmap == HeatmapMode.base64:
+        out.heatmap = await run_in_threadpool(read_heatmap_base64, heatmap_path)
+    return out
+
+async def _score_chunk(chunk, heatmap: HeatmapMode):
+    """NDJSON-ready dicts for one chunk of (index, name, bytes_or_error)."""
+    lines = []
+    valid = [(i, name, data) for i, name, data in chunk if not isinstance(data, Exception)]
+    if len(valid) < len(chunk):
+        REJECTIONS.inc("invalid_upload", amount=len(chunk) - len(valid))
+    results = []
+    if valid:
+        try:
+            results = await predict_many([data for _, _, data in valid], with_heatmap=heatmap in (HeatmapMode.inline, HeatmapMode.base64))
+        except Exception as e:
+            REJECTIONS.inc("error", amount=len(valid))
+            results = [e] * len(valid)
+    results = dict(zip((i for i, _, _ in valid), results))
+
+    for i, name, data in chunk:
+        result = data if isinstance(data, Exception) else results[i]
+        line = {"index": i, "filename": name}
+        if isinstance(result, Exception):
+            line["error"] = f"Prediction failed: {result}"
+        elif result is None:
+            line.update(prediction="Unknown", confidence=None,
+                        message="The uploaded image does not look like a chest X-ray.")
+        else:
+            label, confidence, probs, heatmap_path, model_version = result
+            line.update(prediction=label, confidence=confidence, probabilities=probs, model_version=model_version,
+                        heatmap_url=public_url(heatmap_path) if heatmap_path else None)
+            if heatmap_path and heatmap == HeatmapMode.base64:
+                line["heatmap"] = await run_in_threadpool(read_heatmap_base64, heatmap_path)
+        lines.append(line)
+    return lines
+
+async def _stream_batch(files: list[UploadFile], heatmap: HeatmapMode):
+    # Read images one by one and keep at most BATCH_MAX_INFLIGHT_CHUNKS chunks
+    # in flight, so memory stays bounded however big the upload/archive is
+    images = iter_upload_images(files)
+    chunk_size = settings.INFERENCE_MAX_BATCH_SIZE
+    pending = set()
+    index = 0
+    exhausted = False
+    try:
+        while not exhausted or pending:
+            while not exhausted and len(pending) < settings.BATCH_MAX_INFLIGHT_CHUNKS:
+                chunk = []
+                while len(chunk) < chunk_size:
+                    item = await run_in_threadpool(next, images, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    chunk.append((index, *item))
+                    index += 1
+                if chunk:
+                    pending.add(asyncio.create_task(_score_chunk(chunk, heatmap)))
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                for line in task.result():
+                    yield json.dumps(line) + "\n"
+    finally:
+        # Client went away (or we're done): don't leave work running
+        for task in pending:
+            task.cancel()
+
+@router.post("/predict/batch", dependencies=[Depends(profile_flag)])
+async def predict_batch(files: list[UploadFile] = File(...), heatmap: HeatmapMode = Query(HeatmapMode.false), current_user = Depends(get_current_user)):
+    """
+    Scores many images (plain files and/or zip archives) in one request.
+    Results are streamed back as NDJSON, one line per image, in completion
+    order; each line carries the image's `index` and `filename`.
+    "lazy" heatmaps need a stored upload, so they behave like "false" here.
+    """
+    return StreamingResponse(_stream_batch(files, heatmap), media_type="application/x-ndjson")
+
+@router.get("/history", response_model=ScanPage)
+async def history(
+    limit: int = Query(50, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE),
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
+    since: datetime | None = Query(None, description="only scans created at or after this time (UTC)"),
+    until: datetime | None = Query(None, description="only scans created before this time (UTC)"),
+    label: str | None = Query(None, description="only scans with this prediction, e.g. NORMAL"),
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_user),
+):
+    """The user's scans, newest first, one page at a time."""
+    try:
+        items, next_cursor = await get_user_scans(db, current_user.id, limit, cursor, since, until, label)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return ScanPage(items=items, next_cursor=next_cursor)
+
+@router.get("/jobs/{job_id}", response_model=JobOut)
+async def job_status(job_id: int, db: AsyncSession = Depends(get_db), current_user = Depends(get_current_user)):
+    """An async predict-and-save job; `scan` is set once it's done."""
+    row = await get_user_job(db, current_user.id, job_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_out(*row)
+
+async def _job_events(user_id: int, job_id: int):
+    # A fresh session per look: nothing is held open while waiting
+    last, last_sent = None, time.monotonic()
+    while True:
+        async with AsyncSessionLocal() as db:
+            row = await get_user_job(db, user_id, job_id)
+        if row is None:
+            return  # purged meanwhile
+        out = _job_out(*row)
+        if out.status != last:
+            last, last_sent = out.status, time.monotonic()
+            yield f"event: {out.status}\ndata: {out.model_dump_json()}\n\n"
+        elif time.monotonic() - last_sent > 15:
+            # Keeps proxies from closing an idle stream
+            last_sent = time.monotonic()
+            yield ": keepalive\n\n"
+        if out.status in FINISHED:
+            return
+        await wait_for_change(settings.JOB_POLL_INTERVAL)
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: int, db: AsyncSession = Depends(get_db), current_user = Depends(get_current_user)):
+    """
+    Server-sent events for a job: one event per status change (named after
+    the status, the JobOut as data), ending after "done" or "failed".
+    """
+    if not await get_user_job(db, current_user.id, job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(_job_events(current_user.id, job_id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/cache/stats", dependencies=[Depends(require_admin)])
+def prediction_cache_stats():
+    return cache_stats()
+
+@router.get("/{scan_id}/heatmap", dependencies=[Depends(profile_flag)])
+async def scan_heatmap(scan_id: int, db: AsyncSession = Depends(get_db), current_user = Depends(get_current_user)):
+    """
+    Grad-CAM overlay for a saved scan, built on first request from the stored
+    upload. Redirects to the artifact on the static uploads mount.
+    """
+    scan = await get_user_scan(db, current_user.id, scan_id)
+    if not scan:
+        raise HTTPException(status_code=404, detail="Scan not found")
+    try:
+        contents = await run_in_threadpool(storage.read, scan.image_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Stored upload not found")
+
+    try:
+        heatmap_path = await heatmap_for_upload(contents, scan.model_version)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Heatmap generation failed: {e}")
+    if heatmap_path is None:
+        raise HTTPException(status_code=404, detail="No heatmap for this scan")
+
+    return RedirectResponse(public_url(heatmap_path))
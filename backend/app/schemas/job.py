@@ -0,0 +1,16 @@
+# app/schemas/job.py
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+from app.schemas.scan import ScanPredictOut
+
+class JobOut(BaseModel):
+    id: int
+    status: str          # queued | running | done | failed
+    attempts: int
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    status_url: str      # poll this ...
+    events_url: str      # ... or subscribe here (text/event-stream)
+    scan: Optional[ScanPredictOut] = None  # once done
@@ -0,0 +1,24 @@
+# app/schemas/profiling.py
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+
+class ProfilingConfig(BaseModel):
+    rate: float = Field(..., ge=0.0, le=1.0)  # fraction of prediction requests to profile; 0 = off
+    tf_trace: bool = True                     # also record a TensorFlow profiler trace
+
+class CaptureOut(BaseModel):
+    id: str
+    reason: str       # sampled | flagged
+    function: str     # the inference entry point that was profiled
+    seconds: float
+    tf_trace: bool
+    pid: int
+    created_at: datetime
+    error: Optional[str] = None
+    files: list[str]  # download from /admin/profiling/captures/{id}/{file}
+
+class ProfilingOut(BaseModel):
+    rate: float
+    tf_trace: bool
+    captures: list[CaptureOut]
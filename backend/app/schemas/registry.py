@@ -0,0 +1,27 @@
+# app/schemas/registry.py
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class ModelSpecOut(BaseModel):
+    version: str
+    path: str
+    scoring_path: str
+
+class ModelVersionOut(BaseModel):
+    version: str
+    name: str
+    active: bool
+    shadow: bool
+
+class RegistryOut(BaseModel):
+    active: ModelSpecOut
+    shadow: Optional[ModelSpecOut] = None
+    shadow_rate: float
+    versions: list[ModelVersionOut]
+
+class ModelActivate(BaseModel):
+    version: str
+
+class ShadowConfig(BaseModel):
+    version: str
+    rate: float = Field(0.05, gt=0.0, le=1.0)  # fraction of predictions also scored by the shadow
@@ -1,7 +1,20 @@
 # app/schemas/scan.py
-from pydantic import BaseModel
+from pydantic import BaseModel, computed_field
 from typing import Optional
 from datetime import datetime
+from enum import Enum
+from app.utils.storage import media_url
+
+class HeatmapMode(str, Enum):
+    false = "false"    # no Grad-CAM at all
+    lazy = "lazy"      # return a URL, generate the heatmap when it's fetched
+    inline = "inline"  # compute now, return the artifact's static URL
+    base64 = "base64"  # compute now and embed the artifact as base64 (opt-in)
+
+class MediaVariant(str, Enum):
+    original = "original"  # the stored upload as-is
+    thumb = "thumb"        # small WebP for lists (THUMBNAIL_SIZE px)
+    model = "model"        # WebP at model input resolution
 
 class ScanOut(BaseModel):
     id: int
@@ -9,7 +22,25 @@ class ScanOut(BaseModel):
     prediction: str
     confidence: float
     created_at: datetime
+    model_version: Optional[str] = None
     model_config = {
     "from_attributes": True
 }
 
+    @computed_field
+    @property
+    def image_url(self) -> str:
+        return media_url(self.image_path)
+
+    @computed_field
+    @property
+    def thumbnail_url(self) -> str:
+        return media_url(self.image_path, MediaVariant.thumb.value)
+
+class ScanPredictOut(ScanOut):
+    heatmap_url: Optional[str] = None
+    heatmap: Optional[str] = None
+
+class ScanPage(BaseModel):
+    items: list[ScanOut]
+    next_cursor: Optional[str] = None  # pass back as ?cursor= for the next page; null on the last page
@@ -0,0 +1,184 @@
+# app/services/analytics_service.py
+import bisect
+import logging
+from collections import defaultdict
+from datetime import date, datetime
+
+from sqlalchemy import case, delete, func, insert, literal, select, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.analytics import ALL_USERS, NO_USER, ScanDailyStat
+from app.models.scan import Scan
+
+logger = logging.getLogger(__name__)
+
+# Upper edges of confidence deciles 0..8; anything >= 0.9 is bucket 9.
+# The same literals drive the Python and the SQL side, so both agree
+# exactly on boundary values
+BUCKET_EDGES = [(i + 1) / 10 for i in range(9)]
+BUCKETS = len(BUCKET_EDGES) + 1
+
+
+def confidence_bucket(confidence: float) -> int:
+    return bisect.bisect_right(BUCKET_EDGES, confidence)
+
+
+def rollup_rows(scans) -> list[dict]:
+    """
+    Aggregates scan dicts (user_id, prediction, confidence, created_at) into
+    rollup increments: one for the owner, one for ALL_USERS.
+    """
+    acc = defaultdict(lambda: [0, 0.0])
+    for s in scans:
+        day, label, bucket = s["created_at"].date(), s["prediction"], confidence_bucket(s["confidence"])
+        for user_id in (s.get("user_id") or NO_USER, ALL_USERS):
+            acc[(day, user_id, label, bucket)][0] += 1
+            acc[(day, user_id, label, bucket)][1] += s["confidence"]
+    return [
+        {"day": day, "user_id": user_id, "label": label, "bucket": bucket, "count": n, "confidence_sum": total}
+        for (day, user_id, label, bucket), (n, total) in acc.items()
+    ]
+
+
+def upsert_statement(dialect_name: str):
+    """
+    INSERT ... ON CONFLICT DO UPDATE adding to the existing counters: one
+    statement, no read-modify-write race between concurrent saves. None for
+    databases without it (see row_statements).
+    """
+    dialect = {"sqlite": sqlite, "postgresql": postgresql}.get(dialect_name)
+    if dialect is None:
+        return None
+    stmt = dialect.insert(ScanDailyStat)
+    return stmt.on_conflict_do_update(
+        index_elements=["day", "user_id", "label", "bucket"],
+        set_={
+            "count": ScanDailyStat.count + stmt.excluded.count,
+            "confidence_sum": ScanDailyStat.confidence_sum + stmt.excluded.confidence_sum,
+        },
+    )
+
+
+def row_statements(row: dict):
+    """
+    (UPDATE adding to the counters, INSERT) for one rollup row: the portable
+    upsert, where the INSERT runs only if the UPDATE matched nothing. Two
+    concurrent first saves of a key can still collide on the INSERT.
+    """
+    key = (ScanDailyStat.day == row["day"], ScanDailyStat.user_id == row["user_id"],
+           ScanDailyStat.label == row["label"], ScanDailyStat.bucket == row["bucket"])
+    add = update(ScanDailyStat).where(*key).values(
+        count=ScanDailyStat.count + row["count"],
+        confidence_sum=ScanDailyStat.confidence_sum + row["confidence_sum"],
+    )
+    return add, insert(ScanDailyStat).values(**row)
+
+
+async def record_scans(db: AsyncSession, scans: list[dict]):
+    """
+    Adds scans to the rollups in the caller's transaction (no commit). On
+    databases without ON CONFLICT, a failed update is logged and skipped
+    rather than failing the save: python -m app.cli.backfill_analytics
+    rebuilds the rollups from the scans.
+    """
+    rows = rollup_rows(scans)
+    if not rows:
+        return
+    stmt = upsert_statement(db.bind.dialect.name)
+    if stmt is not None:
+        await db.execute(stmt, rows)
+        return
+    try:
+        async with db.begin_nested():
+            for row in rows:
+                add, create = row_statements(row)
+                if (await db.execute(add)).rowcount == 0:
+                    await db.execute(create)
+    except DBAPIError:
+        logger.warning("Analytics rollups not updated for %d scans; run python -m app.cli.backfill_analytics",
+                       len(scans), exc_info=True)
+
+
+def _bucket_sql():
+    return case(*[(Scan.confidence < edge, i) for i, edge in enumerate(BUCKET_EDGES)], else_=BUCKETS - 1)
+
+
+def backfill_statements(since: date | None = None, until: date | None = None) -> list:
+    """
+    Statements (a delete, then inserts-from-select) rebuilding the rollups
+    for [since, until) (everything by default) straight from the scans
+    table, in SQL. Run them in order, in one transaction.
+    """
+    clear = delete(ScanDailyStat)
+    if since is not None:
+        clear = clear.where(ScanDailyStat.day >= since)
+    if until is not None:
+        clear = clear.where(ScanDailyStat.day < until)
+    statements = [clear]
+    for user_id in (func.coalesce(Scan.user_id, literal(NO_USER)), literal(ALL_USERS)):
+        keys = (func.date(Scan.created_at), user_id, Scan.prediction, _bucket_sql())
+        source = select(*keys, func.count(), func.sum(Scan.confidence)).where(Scan.created_at.isnot(None))
+        if since is not None:
+            source = source.where(Scan.created_at >= datetime.combine(since, datetime.min.time()))
+        if until is not None:
+            source = source.where(Scan.created_at < datetime.combine(until, datetime.min.time()))
+        statements.append(insert(ScanDailyStat).from_select(
+            ["day", "user_id", "label", "bucket", "count", "confidence_sum"], source.group_by(*keys)))
+    return statements
+
+
+def _filtered(query, since: date | None, until: date | None, user_id: int | None, label: str | None = None):
+    # No user_id: read the ALL_USERS totals, never sum the per-user rows
+    if since is not None:
+        query = query.where(ScanDailyStat.day >= since)
+    if until is not None:
+        query = query.where(ScanDailyStat.day < until)
+    query = query.where(ScanDailyStat.user_id == (ALL_USERS if user_id is None else user_id))
+    if label is not None:
+        query = query.where(ScanDailyStat.label == label)
+    return query
+
+
+async def daily_volumes(db: AsyncSession, since=None, until=None, user_id=None) -> list[dict]:
+    query = _filtered(
+        select(ScanDailyStat.day, ScanDailyStat.label, func.sum(ScanDailyStat.count)),
+        since, until, user_id,
+    ).group_by(ScanDailyStat.day, ScanDailyStat.label).order_by(ScanDailyStat.day)
+    days = {}
+    for day, label, n in (await db.execute(query)).all():
+        entry = days.setdefault(day, {"day": day, "total": 0, "labels": {}})
+        entry["total"] += n
+        entry["labels"][label] = n
+    return list(days.values())
+
+
+async def label_distribution(db: AsyncSession, since=None, until=None, user_id=None) -> dict:
+    query = _filtered(
+        select(ScanDailyStat.label, func.sum(ScanDailyStat.count), func.sum(ScanDailyStat.confidence_sum)),
+        since, until, user_id,
+    ).group_by(ScanDailyStat.label)
+    labels = {label: {"count": n, "mean_confidence": round(total / n, 4) if n else None}
+              for label, n, total in (await db.execute(query)).all()}
+    return {"total": sum(v["count"] for v in labels.values()), "labels": labels}
+
+
+async def confidence_histogram(db: AsyncSession, since=None, until=None, user_id=None, label=None) -> list[dict]:
+    query = _filtered(
+        select(ScanDailyStat.bucket, func.sum(ScanDailyStat.count)),
+        since, until, user_id, label,
+    ).group_by(ScanDailyStat.bucket)
+    counts = dict((await db.execute(query)).all())
+    edges = [0.0, *BUCKET_EDGES, 1.0]
+    return [{"lower": edges[i], "upper": edges[i + 1], "count": counts.get(i, 0)} for i in range(BUCKETS)]
+
+
+async def top_users(db: AsyncSession, since=None, until=None, limit: int = 20) -> list[dict]:
+    query = select(ScanDailyStat.user_id, func.sum(ScanDailyStat.count)).where(ScanDailyStat.user_id != ALL_USERS)
+    if since is not None:
+        query = query.where(ScanDailyStat.day >= since)
+    if until is not None:
+        query = query.where(ScanDailyStat.day < until)
+    query = query.group_by(ScanDailyStat.user_id).order_by(func.sum(ScanDailyStat.count).desc()).limit(limit)
+    return [{"user_id": user_id, "count": n} for user_id, n in (await db.execute(query)).all()]
@@ -1,22 +1,29 @@
 # app/services/auth_service.py
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.security import hash_password, verify_password, create_access_token, create_refresh_token
 from app import models
 from datetime import timedelta
 
-def create_user(db: Session, name: str, email: str, password: str, role: str = "user"):
-    hashed = hash_password(password)
+# bcrypt is deliberately slow (~100ms+): hash/verify in the threadpool, off the event loop
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    return (await db.execute(select(models.user.User).where(models.user.User.email == email))).scalars().first()
+
+async def create_user(db: AsyncSession, name: str, email: str, password: str, role: str = "user"):
+    hashed = await run_in_threadpool(hash_password, password)
     user = models.user.User(name=name, email=email, password=hashed, role=role)
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = db.query(models.user.User).filter(models.user.User.email == email).first()
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = await get_user_by_email(db, email)
     if not user:
         return None
-    if not verify_password(password, user.password):
+    if not await run_in_threadpool(verify_password, password, user.password):
         return None
     return user
 
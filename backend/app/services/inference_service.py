@@ -0,0 +1,250 @@
+# app/services/inference_service.py
+import asyncio
+import base64
+import logging
+import random
+from fastapi.concurrency import run_in_threadpool
+from app.config import settings
+from app.core import metrics
+from app.core.metrics import PREDICTIONS, REJECTIONS, STAGE_SECONDS
+from app.ml.cache import prediction_cache, PredictionCache
+from app.ml.engine import inference_engine
+from app.ml.predict import predict_from_bytes, filter_and_predict, filter_and_predict_many, score_only
+from app.ml.profiling import capture_for_request, run_profiled
+from app.ml.registry import ModelSpec, model_registry
+from app.utils.storage import save_heatmap_local, file_exists_local, read_file_local
+
+logger = logging.getLogger(__name__)
+
+SHADOW_PREDICTIONS = metrics.registry.counter(
+    "pneumonia_shadow_predictions_total",
+    "Sampled predictions also scored by the shadow model, by outcome "
+    "(agree/disagree on the label, skipped at MODEL_SHADOW_MAX_INFLIGHT, failed).",
+    ["outcome"])
+SHADOW_CONFIDENCE_DELTA = metrics.registry.histogram(
+    "pneumonia_shadow_confidence_delta",
+    "Absolute difference between the served and the shadow model's top-class confidence.",
+    buckets=(0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0))
+
+# Shadow scorings in flight, also holding references so they aren't collected
+_shadow_tasks = set()
+
+
+def _lookup(contents: bytes, digest: str | None = None, spec: ModelSpec | None = None):
+    """
+    Model version + cache key + (copy of the) cached entry; runs in the
+    threadpool. The version is picked here once, and the whole request
+    sticks to it even if the active version is swapped meanwhile.
+    """
+    with STAGE_SECONDS.time("cache_lookup"):
+        spec = spec or model_registry.active
+        # TTA changes results without changing the model: keep its entries apart
+        variant = f"{spec.version}-tta{settings.TTA_VIEWS}" if settings.TTA_ENABLED else spec.version
+        key = PredictionCache.make_key(contents, variant, digest)
+        if prediction_cache is None:
+            return spec, key, {}
+        entry = dict(prediction_cache.get(key) or {})
+        # The heatmap artifact may have been cleaned up since it was cached
+        if entry.get("heatmap") and not file_exists_local(entry["heatmap"]):
+            del entry["heatmap"]
+        return spec, key, entry
+
+
+def _to_result(entry: dict, with_heatmap: bool, version: str):
+    heatmap = entry.get("heatmap") if with_heatmap else None
+    return entry["label"], entry["confidence"], entry["probabilities"], heatmap, version
+
+
+def _from_cache(entry: dict, apply_filter: bool, with_heatmap: bool, version: str):
+    """(hit, result) for a cached entry; result is None for a filtered-out image."""
+    if apply_filter and entry.get("is_gray") is False:
+        return True, None
+    # "heatmap" is only present once Grad-CAM has run (it may be None, e.g. for NORMAL)
+    if ("label" in entry and (entry.get("is_gray") or not apply_filter)
+            and (not with_heatmap or "heatmap" in entry)):
+        return True, _to_result(entry, with_heatmap, version)
+    return False, None
+
+
+def _store(key: str, entry: dict, result, with_heatmap: bool, version: str):
+    """
+    Writes the heatmap artifact and updates the cache for a fresh result;
+    returns it with the heatmap bytes replaced by the artifact path and the
+    model version appended. Results from a cut-short TTA pass aren't
+    cached. Runs in the threadpool.
+    """
+    cacheable = getattr(result, "cacheable", True)
+    if result is not None:
+        label, confidence, probs, heatmap_bytes = result
+        heatmap_path = None
+        if heatmap_bytes is not None:
+            # Content-addressed, so re-uploads of the same study share one artifact
+            with STAGE_SECONDS.time("artifact_write"):
+                heatmap_path = save_heatmap_local(key, heatmap_bytes)
+        result = label, confidence, probs, heatmap_path, version
+        entry.update(label=label, confidence=confidence, probabilities=probs)
+        if with_heatmap:
+            entry["heatmap"] = heatmap_path
+    if prediction_cache is not None and cacheable:
+        prediction_cache.put(key, entry)
+    return result
+
+
+def _count(result):
+    """Served-prediction / rejection counters, cache hits included."""
+    if result is None:
+        REJECTIONS.inc("not_xray")
+    elif isinstance(result, Exception):
+        REJECTIONS.inc("invalid_image")
+    else:
+        PREDICTIONS.inc(result[0])
+
+
+async def _run(fn, *args):
+    """inference_engine.run for the prediction path, under the profiler if this request is picked for it."""
+    capture = capture_for_request()
+    if capture is None:
+        return await inference_engine.run(fn, *args)
+    return await inference_engine.run(run_profiled, capture, fn, *args)
+
+
+async def predict_upload(contents: bytes, apply_filter: bool = True, with_heatmap: bool = True, digest: str | None = None):
+    """
+    Runs (or fetches from the prediction cache) the prediction for an upload.
+    Returns None when `apply_filter` is set and the image doesn't look like a
+    chest X-ray, otherwise (label, confidence, probs, heatmap_path,
+    model_version) where heatmap_path is the overlay artifact relative to
+    UPLOAD_DIR (or None).
+    With with_heatmap=False, Grad-CAM is skipped and the heatmap is None.
+    Pass `digest` (sha256 hex of contents) if already computed, to skip re-hashing.
+    A sample of predictions is also scored by the shadow model, if one is
+    set, after the fact and off the request path.
+    """
+    spec, result = await _predict(contents, apply_filter, with_heatmap, digest)
+    _count(result)
+    if result is not None:
+        _maybe_shadow(contents, result, spec)
+    return result
+
+
+async def _predict(contents: bytes, apply_filter: bool, with_heatmap: bool, digest: str | None = None,
+                   spec: ModelSpec | None = None):
+    # Hashing (and the first registry access) can take a few ms; keep it off the loop
+    spec, key, entry = await run_in_threadpool(_lookup, contents, digest, spec)
+    hit, result = _from_cache(entry, apply_filter, with_heatmap, spec.version)
+    if not hit:
+        # Everything between handing the job over and getting the result back:
+        # queueing, IPC, micro-batching and the model stages themselves
+        with STAGE_SECONDS.time("engine_roundtrip"):
+            if apply_filter:
+                result = await _run(filter_and_predict, contents, with_heatmap, spec)
+                entry["is_gray"] = result is not None
+            else:
+                result = await _run(predict_from_bytes, contents, with_heatmap, spec)
+                entry.setdefault("is_gray", None)
+        result = await run_in_threadpool(_store, key, entry, result, with_heatmap, spec.version)
+    return spec, result
+
+
+def _maybe_shadow(contents: bytes, result, spec: ModelSpec):
+    """
+    Schedules a shadow scoring for a sampled fraction of predictions. Extra
+    cost is bounded: at most MODEL_SHADOW_MAX_INFLIGHT run at once (more
+    are skipped, not queued), and they score only, without Grad-CAM.
+    """
+    shadow = model_registry.shadow
+    if shadow is None or shadow.version == spec.version or random.random() >= model_registry.shadow_rate:
+        return
+    if len(_shadow_tasks) >= settings.MODEL_SHADOW_MAX_INFLIGHT:
+        SHADOW_PREDICTIONS.inc("skipped")
+        return
+    task = asyncio.create_task(_shadow(contents, result, shadow))
+    _shadow_tasks.add(task)
+    task.add_done_callback(_shadow_tasks.discard)
+
+
+async def _shadow(contents: bytes, result, shadow: ModelSpec):
+    label, confidence = result[0], result[1]
+    try:
+        with STAGE_SECONDS.time("shadow_roundtrip"):
+            shadow_label, shadow_confidence, _ = await inference_engine.run(score_only, contents, shadow)
+    except Exception:
+        SHADOW_PREDICTIONS.inc("failed")
+        logger.warning("Shadow scoring with model %s failed", shadow.version, exc_info=True)
+        return
+    SHADOW_PREDICTIONS.inc("agree" if shadow_label == label else "disagree")
+    SHADOW_CONFIDENCE_DELTA.observe(abs(shadow_confidence - confidence))
+    if shadow_label != label:
+        logger.info("Shadow model %s disagrees: %s (%.3f) vs served %s (%.3f) from %s",
+                    shadow.version, shadow_label, shadow_confidence, label, confidence, result[4])
+
+
+async def predict_many(contents_list: list[bytes], with_heatmap: bool = False, apply_filter: bool = True):
+    """
+    Filter + prediction for several uploads at once. Cache misses are scored
+    together as one batch on a single worker, all by the same model version.
+    Returns one item per upload, in order: the predict_upload result, None if
+    filtered out, or the exception raised for an undecodable image. With
+    apply_filter=False every decodable image is scored, as in predict_upload.
+    """
+    def lookup_all():
+        spec = model_registry.active
+        return spec, [_lookup(c, None, spec)[1:] for c in contents_list]
+
+    spec, lookups = await run_in_threadpool(lookup_all)
+    results = [None] * len(contents_list)
+    misses = []
+    for i, (_, entry) in enumerate(lookups):
+        hit, results[i] = _from_cache(entry, apply_filter, with_heatmap, spec.version)
+        if not hit:
+            misses.append(i)
+    if misses:
+        with STAGE_SECONDS.time("engine_roundtrip"):
+            outputs = await _run(
+                filter_and_predict_many, [contents_list[i] for i in misses], with_heatmap, spec, apply_filter)
+        await run_in_threadpool(_store_many, lookups, misses, outputs, results, with_heatmap, spec.version, apply_filter)
+    for result in results:
+        _count(result)
+    return results
+
+
+def _store_many(lookups, misses, outputs, results, with_heatmap: bool, version: str, apply_filter: bool = True):
+    for i, output in zip(misses, outputs):
+        if isinstance(output, Exception):
+            results[i] = output
+            continue
+        key, entry = lookups[i]
+        if apply_filter:
+            entry["is_gray"] = output is not None
+        else:
+            entry.setdefault("is_gray", None)
+        results[i] = _store(key, entry, output, with_heatmap, version)
+
+
+def _spec_or_active(version: str | None) -> ModelSpec:
+    try:
+        return model_registry.resolve(version) if version else model_registry.active
+    except KeyError:
+        return model_registry.active  # that model file is gone
+
+
+async def heatmap_for_upload(contents: bytes, version: str | None = None):
+    """
+    Heatmap artifact path for a stored upload, generated on demand and kept
+    in the prediction cache. None for NORMAL predictions. Uses the model
+    `version` that scored it, while that version is still available.
+    """
+    spec = await run_in_threadpool(_spec_or_active, version)
+    _, (_, _, _, heatmap_path, _) = await _predict(contents, apply_filter=False, with_heatmap=True, spec=spec)
+    return heatmap_path
+
+
+def read_heatmap_base64(heatmap_path: str) -> str:
+    """Opt-in inline form of an artifact, for clients that can't fetch URLs."""
+    return base64.b64encode(read_file_local(heatmap_path)).decode("utf-8")
+
+
+def cache_stats() -> dict:
+    if prediction_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **prediction_cache.stats()}
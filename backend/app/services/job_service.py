@@ -0,0 +1,279 @@
+# app/services/job_service.py
+"""
+Durable queue for asynchronous predict-and-save.
+
+POST /scan/predict/save?async=true stores the upload and inserts a
+"queued" ScanJob; consumers (run_consumer, in the API process and/or
+`python -m app.cli.scan_worker`) claim jobs in batches, score each batch in
+one forward pass and write the scans and the job results in one transaction.
+
+Claiming is a single UPDATE ... RETURNING over `SELECT ... FOR UPDATE SKIP
+LOCKED` on PostgreSQL, so concurrent consumers never get the same job and
+never wait on each other. SQLite has no row locks (FOR UPDATE is left out);
+the UPDATE takes the database write lock, which serializes claims instead.
+
+A claim is a lease: a consumer that dies mid-batch (or whose inference
+worker crashes) leaves "running" jobs whose lease runs out, and the next
+claim picks them up again, up to JOB_MAX_ATTEMPTS attempts.
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models
+from app.config import settings
+from app.core import metrics
+from app.database import AsyncSessionLocal
+from app.ml.predict import probs_by_class
+from app.services.analytics_service import record_scans
+from app.services.inference_service import predict_many
+from app.utils.storage import storage
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+FINISHED = (DONE, FAILED)
+
+JOBS = metrics.registry.counter(
+    "pneumonia_jobs_total",
+    "Predict-and-save jobs by outcome (enqueued, done, failed, retried: put back after an error "
+    "or an expired lease).",
+    ["outcome"])
+JOB_QUEUE_SECONDS = metrics.registry.histogram(
+    "pneumonia_job_queue_seconds",
+    "Time from enqueueing a job to its first claim.",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0))
+
+# Set (and replaced) whenever jobs are enqueued or finished in this process:
+# wakes idle consumers and SSE streams at once. Other processes poll.
+_changed = asyncio.Event()
+
+
+def _notify():
+    global _changed
+    event, _changed = _changed, asyncio.Event()
+    event.set()
+
+
+async def wait_for_change(timeout: float):
+    """Returns when jobs change in this process, or after `timeout` seconds."""
+    try:
+        await asyncio.wait_for(_changed.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def enqueue(db: AsyncSession, user_id: int, image_key: str):
+    now = datetime.utcnow()
+    job = models.job.ScanJob(user_id=user_id, image_key=image_key, status=QUEUED, attempts=0,
+                             created_at=now, updated_at=now)
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    JOBS.inc("enqueued")
+    _notify()
+    return job
+
+
+async def get_user_job(db: AsyncSession, user_id: int, job_id: int):
+    """(job, scan or None) for one of the user's jobs, or None."""
+    ScanJob, Scan = models.job.ScanJob, models.scan.Scan
+    query = (
+        select(ScanJob, Scan)
+        .outerjoin(Scan, Scan.id == ScanJob.scan_id)
+        .where(ScanJob.id == job_id, ScanJob.user_id == user_id)
+    )
+    return (await db.execute(query)).first()
+
+
+def _claimable(now: datetime):
+    ScanJob = models.job.ScanJob
+    return and_(
+        or_(ScanJob.status == QUEUED, and_(ScanJob.status == RUNNING, ScanJob.lease_expires_at < now)),
+        ScanJob.attempts < settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+async def claim(db: AsyncSession, limit: int) -> tuple[str, list]:
+    """
+    Leases up to `limit` of the oldest claimable jobs and commits. Returns
+    (lease token, rows of id/user_id/image_key/attempts/created_at).
+    """
+    ScanJob = models.job.ScanJob
+    now = datetime.utcnow()
+    token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    # Lost jobs that are out of attempts won't be claimed again: fail them
+    abandoned = (await db.execute(
+        update(ScanJob)
+        .where(ScanJob.status == RUNNING, ScanJob.lease_expires_at < now,
+               ScanJob.attempts >= settings.JOB_MAX_ATTEMPTS)
+        .values(status=FAILED, error="Worker lost the job too many times", locked_by=None,
+                lease_expires_at=None, updated_at=now)
+        .returning(ScanJob.id)
+    )).all()
+    picked = (
+        select(ScanJob.id).where(_claimable(now)).order_by(ScanJob.id).limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    rows = (await db.execute(
+        update(ScanJob)
+        .where(ScanJob.id.in_(picked))
+        .values(status=RUNNING, attempts=ScanJob.attempts + 1, locked_by=token,
+                lease_expires_at=now + timedelta(seconds=settings.JOB_LEASE_SECONDS), updated_at=now)
+        .returning(ScanJob.id, ScanJob.user_id, ScanJob.image_key, ScanJob.attempts, ScanJob.created_at)
+        .execution_options(synchronize_session=False)
+    )).all()
+    await db.commit()
+    if abandoned:
+        JOBS.inc("failed", amount=len(abandoned))
+        _notify()
+    for row in rows:
+        if row.attempts == 1:
+            JOB_QUEUE_SECONDS.observe((now - row.created_at).total_seconds())
+        else:
+            JOBS.inc("retried")
+    return token, sorted(rows, key=lambda r: r.id)
+
+
+async def _read(key: str):
+    try:
+        return await run_in_threadpool(storage.read, key)
+    except FileNotFoundError as e:
+        return e
+
+
+async def process(token: str, jobs: list):
+    """
+    Scores a claimed batch and records the outcome. Jobs that can't succeed
+    (missing upload, undecodable image) fail; if scoring itself fails the
+    whole batch is put back in the queue (or failed, out of attempts).
+    """
+    contents = await asyncio.gather(*(_read(job.image_key) for job in jobs))
+    readable = [i for i, c in enumerate(contents) if not isinstance(c, Exception)]
+    results = list(contents)  # the FileNotFoundError stays for missing uploads
+    try:
+        if readable:
+            scored = await predict_many([contents[i] for i in readable], apply_filter=False)
+            for i, result in zip(readable, scored):
+                results[i] = result
+    except Exception as e:
+        logger.warning("Scoring %d jobs failed", len(jobs), exc_info=True)
+        await _release(token, jobs, f"Prediction failed: {e}")
+        return
+    await _finish(token, jobs, results)
+
+
+async def _finish(token: str, jobs: list, results: list):
+    ScanJob, Scan = models.job.ScanJob, models.scan.Scan
+    now = datetime.utcnow()
+    async with AsyncSessionLocal() as db:
+        # Only jobs still leased under this token: one whose lease ran out may
+        # have been claimed (and finished) by another consumer meanwhile
+        owned = set((await db.execute(
+            update(ScanJob)
+            .where(ScanJob.id.in_([job.id for job in jobs]), ScanJob.locked_by == token, ScanJob.status == RUNNING)
+            .values(updated_at=now)
+            .returning(ScanJob.id)
+            .execution_options(synchronize_session=False)
+        )).scalars())
+        if len(owned) < len(jobs):
+            logger.warning("%d jobs were reclaimed before they finished", len(jobs) - len(owned))
+        scans, updates = {}, []
+        for job, result in zip(jobs, results):
+            if job.id not in owned:
+                continue
+            if isinstance(result, Exception):
+                error = "Stored upload not found" if isinstance(result, FileNotFoundError) else "Invalid image"
+                updates.append({"id": job.id, "status": FAILED, "error": error})
+                continue
+            label, confidence, probs, _, model_version = result
+            scans[job.id] = Scan(user_id=job.user_id, image_path=job.image_key, prediction=label,
+                                 confidence=confidence, probs=probs_by_class(probs),
+                                 model_version=model_version, created_at=now)
+        db.add_all(scans.values())
+        await db.flush()
+        await record_scans(db, [{"user_id": s.user_id, "prediction": s.prediction, "confidence": s.confidence,
+                                 "created_at": s.created_at} for s in scans.values()])
+        updates += [{"id": job_id, "status": DONE, "scan_id": scan.id} for job_id, scan in scans.items()]
+        if updates:
+            await db.execute(update(ScanJob), [{**u, "locked_by": None, "lease_expires_at": None, "updated_at": now}
+                                               for u in updates])
+        await db.commit()
+    JOBS.inc("done", amount=len(scans))
+    JOBS.inc("failed", amount=len(updates) - len(scans))
+    _notify()
+
+
+async def _release(token: str, jobs: list, error: str):
+    """Puts a batch back in the queue; jobs out of attempts fail instead."""
+    ScanJob = models.job.ScanJob
+    ids = [job.id for job in jobs]
+    now = datetime.utcnow()
+    leased = and_(ScanJob.id.in_(ids), ScanJob.locked_by == token, ScanJob.status == RUNNING)
+    async with AsyncSessionLocal() as db:
+        failed = (await db.execute(
+            update(ScanJob).where(leased, ScanJob.attempts >= settings.JOB_MAX_ATTEMPTS)
+            .values(status=FAILED, error=error, locked_by=None, lease_expires_at=None, updated_at=now)
+            .returning(ScanJob.id)
+        )).all()
+        await db.execute(
+            update(ScanJob).where(leased)
+            .values(status=QUEUED, error=error, locked_by=None, lease_expires_at=None, updated_at=now))
+        await db.commit()
+    JOBS.inc("failed", amount=len(failed))
+    _notify()
+
+
+async def purge_finished(db: AsyncSession, before: datetime) -> int:
+    """Deletes done/failed jobs last updated before `before`; the scans stay."""
+    ScanJob = models.job.ScanJob
+    result = await db.execute(delete(ScanJob).where(ScanJob.status.in_(FINISHED), ScanJob.updated_at < before))
+    await db.commit()
+    return result.rowcount
+
+
+async def _consume(stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            async with AsyncSessionLocal() as db:
+                token, jobs = await claim(db, settings.JOB_BATCH_SIZE)
+        except Exception:
+            # e.g. SQLite busy under heavy write load, or the database restarting
+            logger.warning("Claiming jobs failed", exc_info=True)
+            jobs = []
+        if jobs:
+            try:
+                await process(token, jobs)
+            except Exception:
+                # e.g. the database going away while recording the results:
+                # the lease runs out and the batch is claimed again
+                logger.exception("Processing %d jobs failed", len(jobs))
+            continue
+        await wait_for_change(settings.JOB_POLL_INTERVAL)
+
+
+async def _purge(stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            async with AsyncSessionLocal() as db:
+                await purge_finished(db, datetime.utcnow() - timedelta(hours=settings.JOB_RETENTION_HOURS))
+        except Exception:
+            logger.warning("Purging finished jobs failed", exc_info=True)
+        try:
+            await asyncio.wait_for(stop.wait(), 3600)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_consumer(stop: asyncio.Event):
+    """
+    Claims and scores jobs until `stop` is set: JOB_WORKER_CONCURRENCY
+    batches at a time, so one batch's database writes overlap the next
+    one's scoring. A batch in progress when `stop` is set is finished first.
+    """
+    await asyncio.gather(_purge(stop), *(_consume(stop) for _ in range(settings.JOB_WORKER_CONCURRENCY)))
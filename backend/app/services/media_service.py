@@ -0,0 +1,92 @@
+# app/services/media_service.py
+import hashlib
+import io
+import logging
+import os
+import uuid
+
+from PIL import Image, ImageOps
+
+from app.config import settings
+from app.core.metrics import STAGE_SECONDS
+from app.ml.preprocess import IMG_SIZE
+from app.ml.radiograph import open_image
+from app.utils.storage import LocalStorage, _local_path, storage
+
+logger = logging.getLogger(__name__)
+
+# variant -> longest side of the WebP derivative
+DERIVATIVES = {
+    "thumb": settings.THUMBNAIL_SIZE,  # history lists
+    "model": IMG_SIZE,                 # model input resolution
+}
+# Stored objects never change under a key (content hashes, or the old
+# random names), so anything served for a key can be cached forever
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def _rendition(variant: str) -> str:
+    # The size is part of the name: changing THUMBNAIL_SIZE gives new files and ETags
+    return variant if variant == "original" else f"{variant}-{DERIVATIVES[variant]}"
+
+
+def etag(key: str, variant: str) -> str:
+    """Strong validator: a key's bytes (and so its derivatives) never change."""
+    return '"' + hashlib.sha256(f"{_rendition(variant)}:{key}".encode()).hexdigest()[:32] + '"'
+
+
+def derivative_path(key: str, variant: str) -> str:
+    """UPLOAD_DIR/derived/<variant>-<size>/<key without extension>.webp, keeping the key's fan-out."""
+    return _local_path(f"derived/{_rendition(variant)}/{os.path.splitext(key)[0]}.webp")
+
+
+def render_derivative(data: bytes, size: int) -> bytes:
+    # DICOM / 16-bit: already windowed to 8-bit and reduced close to `size`
+    img = open_image(data, size)
+    # JPEG: let libjpeg downscale while decoding (1/2, 1/4, 1/8)
+    img.draft("RGB", (size, size))
+    img = ImageOps.exif_transpose(img)
+    img = img.convert("L" if img.mode in ("L", "I", "I;16", "F") else "RGB")
+    img.thumbnail((size, size), Image.Resampling.LANCZOS)
+    buf = io.BytesIO()
+    img.save(buf, format="WEBP", quality=settings.THUMBNAIL_QUALITY, method=4)
+    return buf.getvalue()
+
+
+def ensure_derivative(key: str, variant: str) -> str:
+    """
+    Local path of a derivative, rendering and caching it on first use.
+    Raises FileNotFoundError if the original isn't stored. Blocking: call
+    from the threadpool.
+    """
+    path = derivative_path(key, variant)
+    if os.path.isfile(path):
+        return path
+    data = storage.read(key)
+    with STAGE_SECONDS.time(f"derive_{variant}"):
+        rendered = render_derivative(data, DERIVATIVES[variant])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write-then-rename: concurrent requests for a new thumbnail both render,
+    # one rename wins, and nobody reads a partial file
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(rendered)
+    os.replace(tmp_path, path)
+    return path
+
+
+def ensure_derivatives(key: str):
+    """All derivatives of a freshly saved upload (run as a background task)."""
+    for variant in DERIVATIVES:
+        try:
+            ensure_derivative(key, variant)
+        except Exception:
+            # Not fatal: the media route renders it on first request instead
+            logger.warning("Could not render %s derivative of %s", variant, key, exc_info=True)
+
+
+def original_path(key: str) -> str | None:
+    """Local file for an original, or None when the backend isn't local (serve storage.url instead)."""
+    if isinstance(storage, LocalStorage):
+        return _local_path(key)
+    return None
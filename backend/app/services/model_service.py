@@ -0,0 +1,36 @@
+# app/services/model_service.py
+from fastapi.concurrency import run_in_threadpool
+from app.ml.engine import inference_engine
+from app.ml.predict import warm_up
+from app.ml.registry import model_registry
+
+
+async def describe_models() -> dict:
+    # Lists the registry directory and hashes new files: off the loop
+    return await run_in_threadpool(model_registry.describe)
+
+
+async def activate_model(version: str) -> dict:
+    """
+    Makes `version` the one that serves traffic. Raises KeyError for unknown
+    versions. It is loaded and warmed up on every inference replica first;
+    meanwhile requests keep being served by the current version, and the
+    ones already running finish on it after the swap.
+    """
+    spec = await run_in_threadpool(model_registry.resolve, version)
+    await inference_engine.broadcast(warm_up, spec)
+    await run_in_threadpool(model_registry.activate, spec)
+    return await describe_models()
+
+
+async def set_shadow_model(version: str, rate: float) -> dict:
+    """Scores a `rate` fraction of predictions with `version` as well, for comparison only."""
+    spec = await run_in_threadpool(model_registry.resolve, version)
+    await inference_engine.broadcast(warm_up, spec, False)
+    await run_in_threadpool(model_registry.set_shadow, spec, rate)
+    return await describe_models()
+
+
+async def clear_shadow_model() -> dict:
+    await run_in_threadpool(model_registry.set_shadow, None)
+    return await describe_models()
@@ -0,0 +1,16 @@
+# app/services/profiling_service.py
+from fastapi.concurrency import run_in_threadpool
+from app.ml import profiling
+
+
+async def describe_profiling() -> dict:
+    # Walks the capture directory: off the loop
+    captures = await run_in_threadpool(profiling.list_captures)
+    return {"rate": profiling.controls.rate, "tf_trace": profiling.controls.tf_trace, "captures": captures}
+
+
+async def configure_profiling(rate: float, tf_trace: bool = True) -> dict:
+    """Profiles a `rate` fraction of this API process's prediction requests from now on."""
+    profiling.controls.rate = rate
+    profiling.controls.tf_trace = tf_trace
+    return await describe_profiling()
@@ -1,13 +1,78 @@
 # app/services/scan_service.py
-from sqlalchemy.orm import Session
+import base64
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert, select, tuple_
 from app import models
+from app.services.analytics_service import record_scans
 
-def create_scan(db: Session, user_id: int | None, filename: str, prediction: str, confidence: float, raw_probs: str):
-    scan = models.scan.Scan(user_id=user_id, image_path=filename, prediction=prediction, confidence=confidence, raw_probs=raw_probs)
+async def create_scan(db: AsyncSession, user_id: int | None, filename: str, prediction: str, confidence: float, probs: dict | None,
+                      model_version: str | None = None):
+    # created_at is set here (not by the column default) so the rollup and
+    # the row agree on the day; both are written in the same transaction
+    scan = models.scan.Scan(user_id=user_id, image_path=filename, prediction=prediction, confidence=confidence,
+                            probs=probs, model_version=model_version, created_at=datetime.utcnow())
     db.add(scan)
-    db.commit()
-    db.refresh(scan)
+    await record_scans(db, [{"user_id": user_id, "prediction": prediction, "confidence": confidence,
+                             "created_at": scan.created_at}])
+    await db.commit()
+    await db.refresh(scan)
     return scan
 
-def get_user_scans(db: Session, user_id: int):
-    return db.query(models.scan.Scan).filter(models.scan.Scan.user_id == user_id).order_by(models.scan.Scan.created_at.desc()).all()
+def encode_cursor(created_at: datetime, scan_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{scan_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Raises ValueError on anything that isn't a cursor we handed out."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, scan_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(scan_id)
+    except Exception:
+        raise ValueError("invalid cursor")
+
+async def get_user_scans(db: AsyncSession, user_id: int, limit: int = 50, cursor: str | None = None,
+                   since: datetime | None = None, until: datetime | None = None, label: str | None = None):
+    """
+    One page of a user's scans, newest first, plus the cursor for the next
+    page (None on the last one).
+
+    Keyset pagination on (created_at, id): each page is an index range scan
+    on ix_scans_user_created (or ix_scans_user_prediction_created with a
+    label filter), so deep pages cost the same as the first. Only the
+    columns ScanOut needs are selected.
+    """
+    Scan = models.scan.Scan
+    query = (
+        select(Scan.id, Scan.image_path, Scan.prediction, Scan.confidence, Scan.created_at, Scan.model_version)
+        .where(Scan.user_id == user_id)
+        .order_by(Scan.created_at.desc(), Scan.id.desc())
+        .limit(limit + 1)
+    )
+    if label is not None:
+        query = query.where(Scan.prediction == label)
+    if since is not None:
+        query = query.where(Scan.created_at >= since)
+    if until is not None:
+        query = query.where(Scan.created_at < until)
+    if cursor is not None:
+        query = query.where(tuple_(Scan.created_at, Scan.id) < tuple_(*decode_cursor(cursor)))
+
+    rows = (await db.execute(query)).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+async def get_user_scan(db: AsyncSession, user_id: int, scan_id: int):
+    query = select(models.scan.Scan).where(models.scan.Scan.id == scan_id, models.scan.Scan.user_id == user_id)
+    return (await db.execute(query)).scalars().first()
+
+async def bulk_create_scans(db: AsyncSession, rows: list[dict]):
+    """Inserts many Scan rows in one executemany round trip (no ORM objects), plus their rollups."""
+    if rows:
+        now = datetime.utcnow()
+        rows = [{**r, "created_at": r.get("created_at") or now} for r in rows]
+        await db.execute(insert(models.scan.Scan), rows)
+        await record_scans(db, rows)
+        await db.commit()
@@ -1,17 +1,20 @@
 # app/utils/image_filter.py
-import io
-from PIL import Image
 import numpy as np
+from app.ml.preprocess import prepare_image
 
 def is_mostly_grayscale(bytes_img, color_ratio_threshold=0.1):
     """
     Quick check to detect if an image is likely a grayscale chest X-ray.
     Returns True if grayscale, False if colorful (e.g., photo, document, etc.)
     """
-    img = Image.open(io.BytesIO(bytes_img)).convert('RGB')
-    arr = np.array(img) / 255.0
-    r, g, b = arr[:, :, 0], arr[:, :, 1], arr[:, :, 2]
+    return is_mostly_grayscale_array(prepare_image(bytes_img).rgb, color_ratio_threshold)
 
-    color_diff = np.abs(r - g) + np.abs(g - b) + np.abs(r - b)
-    color_frac = np.mean(color_diff > 0.02)  # fraction of colored pixels
+def is_mostly_grayscale_array(rgb, color_ratio_threshold=0.1):
+    """
+    Same check on an already decoded (H, W, 3) uint8 RGB array.
+    """
+    # |r-g| + |g-b| + |r-b| == 2 * (max - min), so a pixel counts as coloured
+    # when 2 * (max - min) / 255 > 0.02, i.e. max - min >= 3, all in uint8
+    spread = rgb.max(axis=2) - rgb.min(axis=2)
+    color_frac = np.count_nonzero(spread >= 3) / spread.size  # fraction of colored pixels
     return color_frac < color_ratio_threshold  # True -> likely grayscale
@@ -1,26 +1,326 @@
 # app/utils/storage.py
+import hashlib
 import os
-from pathlib import Path
+from abc import ABC, abstractmethod
+import tempfile
+import threading
 import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from fastapi.concurrency import run_in_threadpool
 from app.config import settings  # <--- IMPORT settings
 
 # Use settings.UPLOAD_DIR
 Path(settings.UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
 
-def save_file_local(file_bytes: bytes, original_filename: str | None = None) -> str:
-    ext = ".jpg"
+CHUNK_SIZE = 1024 * 1024
+
+# Leading bytes -> extension, so identical content always gets the same key
+# whatever the client called the file
+_MAGIC = [
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"BM", ".bmp"),
+    (b"II*\x00", ".tif"),
+    (b"MM\x00*", ".tif"),
+]
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def sniff_extension(head: bytes, original_filename: str | None = None) -> str:
+    for magic, ext in _MAGIC:
+        if head.startswith(magic):
+            return ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    if head[128:132] == b"DICM":
+        return ".dcm"
     if original_filename and "." in original_filename:
         ext = "." + original_filename.rsplit(".", 1)[1].lower()
-    unique_name = f"{uuid.uuid4().hex}{ext}"
-    
-    # Use settings.UPLOAD_DIR
-    save_path = os.path.join(settings.UPLOAD_DIR, unique_name)
-    
-    with open(save_path, "wb") as f:
-        f.write(file_bytes)
-    
-    # return path relative to server (served at /uploads/scans/<filename>)
-    # store only the filename (so URLs are predictable)
-    return unique_name
-
-# future: implement save_file_s3 with same return type (filename or URL)
\ No newline at end of file
+        if ext.isascii() and ext[1:].isalnum() and len(ext) <= 6:
+            return ext
+    return ".bin"
+
+
+def content_key(digest: str, ext: str) -> str:
+    """sha256 hex -> "ab/cd/abcd....ext": two levels of fan-out, at most 65536 leaf directories."""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+@dataclass
+class StagedUpload:
+    """An upload streamed to a staging file; `data` is kept for inference."""
+    path: str
+    data: bytes
+    sha256: str
+    key: str
+
+
+class StorageBackend(ABC):
+    """
+    Where saved uploads live. Uploads are written to a local staging file
+    first (see stage_upload), then put() under their content-addressed key;
+    putting a key that already exists just drops the staged copy.
+    """
+
+    def __init__(self, staging_dir: str):
+        self.staging_dir = staging_dir
+        os.makedirs(staging_dir, exist_ok=True)
+
+    def new_staging_file(self):
+        return tempfile.NamedTemporaryFile(dir=self.staging_dir, suffix=".part", delete=False)
+
+    def discard(self, staged_path: str):
+        try:
+            os.remove(staged_path)
+        except FileNotFoundError:
+            pass
+
+    @abstractmethod
+    def put(self, staged_path: str, key: str) -> bool:
+        """Moves a staged file to `key`; False if it was already stored (deduplicated)."""
+
+    @abstractmethod
+    def read(self, key: str) -> bytes:
+        """Raises FileNotFoundError for unknown keys."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Whether `key` is stored."""
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        """URL a client can fetch `key` from."""
+
+
+class LocalStorage(StorageBackend):
+    """Files under `root`, served by the /uploads/scans static mount."""
+
+    def __init__(self, root: str):
+        self.root = root
+        # Next to root (same filesystem, so put() is an atomic rename) but
+        # outside it, so partial files are never served by the static mount
+        super().__init__(root.rstrip(os.sep) + ".staging")
+
+    def _path(self, key: str) -> str:
+        return _local_path(key)
+
+    def put(self, staged_path: str, key: str) -> bool:
+        dest = self._path(key)
+        if os.path.exists(dest):
+            self.discard(staged_path)
+            return False
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        # Same content under the same name: if two uploads race, either rename wins
+        os.replace(staged_path, dest)
+        return True
+
+    def read(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def exists(self, key: str) -> bool:
+        return file_exists_local(key)
+
+    def url(self, key: str) -> str:
+        return public_url(key)
+
+
+class S3Storage(StorageBackend):
+    """
+    Objects in an S3 bucket, or any S3-compatible store (MinIO, LocalStack,
+    Ceph...) via S3_ENDPOINT_URL. Needs boto3. URLs are presigned GETs.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: str | None = None,
+                 region: str | None = None, url_expiry: int = 3600):
+        import boto3
+        from botocore.exceptions import ClientError
+
+        self._ClientError = ClientError
+        self.bucket = bucket
+        self.prefix = prefix
+        self.url_expiry = url_expiry
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None, region_name=region or None)
+        super().__init__(os.path.join(tempfile.gettempdir(), "pneumonia-upload-staging"))
+
+    def _missing(self, e) -> bool:
+        return e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    def put(self, staged_path: str, key: str) -> bool:
+        try:
+            if self.exists(key):
+                return False
+            self.client.upload_file(staged_path, self.bucket, self.prefix + key)
+            return True
+        finally:
+            self.discard(staged_path)
+
+    def read(self, key: str) -> bytes:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)["Body"].read()
+        except self._ClientError as e:
+            if self._missing(e):
+                raise FileNotFoundError(key)
+            raise
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+            return True
+        except self._ClientError as e:
+            if self._missing(e):
+                return False
+            raise
+
+    def url(self, key: str) -> str:
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": self.prefix + key}, ExpiresIn=self.url_expiry)
+
+
+def get_storage() -> StorageBackend:
+    if settings.STORAGE_BACKEND == "local":
+        return LocalStorage(settings.UPLOAD_DIR)
+    if settings.STORAGE_BACKEND == "s3":
+        return S3Storage(settings.S3_BUCKET, settings.S3_PREFIX, settings.S3_ENDPOINT_URL,
+                         settings.S3_REGION, settings.S3_URL_EXPIRY_SECONDS)
+    raise ValueError(f"unknown STORAGE_BACKEND {settings.STORAGE_BACKEND!r}, expected 'local' or 's3'")
+
+
+storage = get_storage()
+
+
+async def read_upload(file, max_bytes: int, staging=None) -> tuple[bytes, str]:
+    """
+    Reads an UploadFile in CHUNK_SIZE pieces, hashing as it goes and
+    optionally copying each chunk to `staging` (an open binary file).
+    Raises UploadTooLarge as soon as more than `max_bytes` arrive, without
+    reading the rest. Returns (bytes, sha256 hex).
+    """
+    digest = hashlib.sha256()
+    buf = bytearray()
+    while True:
+        chunk = await file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        if len(buf) + len(chunk) > max_bytes:
+            raise UploadTooLarge(f"Upload larger than {max_bytes} bytes")
+        digest.update(chunk)
+        buf += chunk
+        if staging is not None:
+            await run_in_threadpool(staging.write, chunk)
+    return bytes(buf), digest.hexdigest()
+
+
+async def stage_upload(file, max_bytes: int, backend: StorageBackend | None = None) -> StagedUpload:
+    """
+    Streams an upload to a staging file of the storage backend, hashing it on
+    the way. Call backend.put(staged.path, staged.key) to keep it, or
+    backend.discard(staged.path) to drop it.
+    """
+    backend = backend or storage
+    staging = await run_in_threadpool(backend.new_staging_file)
+    try:
+        with staging:
+            data, digest = await read_upload(file, max_bytes, staging)
+    except BaseException:
+        await run_in_threadpool(backend.discard, staging.name)
+        raise
+    return StagedUpload(staging.name, data, digest, content_key(digest, sniff_extension(data[:132], file.filename)))
+
+
+def _local_path(filename: str) -> str:
+    # filename is relative to UPLOAD_DIR; never let it escape that directory
+    rel = os.path.normpath(filename)
+    if os.path.isabs(rel) or rel.startswith(".."):
+        raise FileNotFoundError(filename)
+    return os.path.join(settings.UPLOAD_DIR, rel)
+
+def read_file_local(filename: str) -> bytes:
+    with open(_local_path(filename), "rb") as f:
+        return f.read()
+
+def file_exists_local(filename: str) -> bool:
+    try:
+        return os.path.isfile(_local_path(filename))
+    except FileNotFoundError:
+        return False
+
+# Running size of UPLOAD_DIR/heatmaps as seen by this process (measured on first write)
+_heatmap_bytes = None
+_heatmap_lock = threading.Lock()
+
+
+def save_heatmap_local(name: str, data: bytes) -> str:
+    """
+    Writes a heatmap artifact as UPLOAD_DIR/heatmaps/<name>.<format>, so it is
+    served by the same static mount as the uploads. Returns the relative path.
+    Heatmaps are derived (and rebuildable) data, so they always stay local,
+    and the oldest are removed once the directory exceeds HEATMAP_MAX_BYTES
+    (a cached result whose artifact is gone gets it generated again).
+    """
+    global _heatmap_bytes
+    rel = f"heatmaps/{name}.{settings.HEATMAP_FORMAT}"
+    save_path = _local_path(rel)
+    directory = os.path.dirname(save_path)
+    os.makedirs(directory, exist_ok=True)
+    try:
+        replaced = os.path.getsize(save_path)
+    except OSError:
+        replaced = 0
+    # Write-then-rename so a reader never sees a half-written file
+    tmp_path = f"{save_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, save_path)
+    if settings.HEATMAP_MAX_BYTES:
+        with _heatmap_lock:
+            if _heatmap_bytes is None:
+                _heatmap_bytes = sum(size for _, size, _ in _heatmap_files(directory))
+            else:
+                _heatmap_bytes += len(data) - replaced
+            if _heatmap_bytes > settings.HEATMAP_MAX_BYTES:
+                _heatmap_bytes = _trim_heatmaps(directory)
+    return rel
+
+
+def _heatmap_files(directory: str):
+    """(mtime, size, path) of the artifacts in `directory`."""
+    files = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(".tmp"):
+            continue
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        files.append((st.st_mtime, st.st_size, entry.path))
+    return files
+
+
+def _trim_heatmaps(directory: str) -> int:
+    # Drop the oldest artifacts until we're back under 90% of the budget;
+    # returns the size left (other processes' writes included)
+    files = sorted(_heatmap_files(directory))
+    total = sum(size for _, size, _ in files)
+    target = settings.HEATMAP_MAX_BYTES * 0.9
+    for _, size, path in files:
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+    return total
+
+def public_url(filename: str) -> str:
+    # Matches the StaticFiles mount in app/main.py
+    return f"/uploads/scans/{filename}"
+
+def media_url(key: str, variant: str = "original") -> str:
+    # Matches app/routers/media.py: any storage backend, cache headers, derivatives
+    return f"/media/{variant}/{key}"
@@ -0,0 +1,61 @@
+# app/utils/uploads.py
+import os
+import zipfile
+from app.config import settings
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp", ".dcm"}
+
+
+def _is_zip(upload) -> bool:
+    if upload.content_type in ("application/zip", "application/x-zip-compressed"):
+        return True
+    if upload.filename and upload.filename.lower().endswith(".zip"):
+        return True
+    upload.file.seek(0)
+    magic = upload.file.read(4)
+    upload.file.seek(0)
+    return magic == b"PK\x03\x04"
+
+
+def iter_upload_images(uploads):
+    """
+    Yields (name, bytes_or_error) for every image in a multipart batch, one
+    at a time. Zip archives are expanded member by member, straight from the
+    spooled upload, so only the current image is ever held in memory.
+    Oversized entries yield a ValueError instead of their bytes.
+    """
+    max_bytes = settings.BATCH_MAX_IMAGE_BYTES
+    for upload in uploads:
+        if not _is_zip(upload):
+            upload.file.seek(0)
+            data = upload.file.read(max_bytes + 1)
+            if len(data) > max_bytes:
+                yield upload.filename, ValueError(f"Image larger than {max_bytes} bytes")
+            else:
+                yield upload.filename, data
+            continue
+
+        try:
+            archive = zipfile.ZipFile(upload.file)
+        except zipfile.BadZipFile:
+            yield upload.filename, ValueError("Invalid zip archive")
+            continue
+        with archive:
+            for info in archive.infolist():
+                name = info.filename
+                base = os.path.basename(name)
+                if info.is_dir() or base.startswith(".") or name.startswith("__MACOSX/"):
+                    continue
+                if os.path.splitext(base)[1].lower() not in IMAGE_EXTENSIONS:
+                    continue
+                label = f"{upload.filename}/{name}"
+                # file_size comes from the archive itself; don't trust it blindly (zip bombs)
+                if info.file_size > max_bytes:
+                    yield label, ValueError(f"Image larger than {max_bytes} bytes")
+                    continue
+                with archive.open(info) as member:
+                    data = member.read(max_bytes + 1)
+                if len(data) > max_bytes:
+                    yield label, ValueError(f"Image larger than {max_bytes} bytes")
+                else:
+                    yield label, data
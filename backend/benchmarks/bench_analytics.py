@@ -0,0 +1,94 @@
+# benchmarks/bench_analytics.py
+"""
+/admin/analytics at scale: aggregating the scans table directly vs. reading
+the scan_daily_stats rollup, on a seeded scans table (default one million
+rows, seeded like bench_history). The rollup is built with the backfill
+statements, which are timed too.
+
+Run from the backend folder (uses a throwaway SQLite file by default):
+    python -m benchmarks.bench_analytics
+    python -m benchmarks.bench_analytics --database-url postgresql://... --rows 1000000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.bench_history import seed, timeit
+
+
+async def cases(SessionLocal):
+    from sqlalchemy import func, select
+    from app.models.scan import Scan
+    from app.services import analytics_service
+    from app.services.analytics_service import _bucket_sql
+
+    def raw(*columns):
+        # The same report computed from the scans table
+        async def run():
+            async with SessionLocal() as db:
+                return len((await db.execute(select(*columns, func.count()).group_by(*columns))).all())
+        return run
+
+    def rollup(fn):
+        async def run():
+            async with SessionLocal() as db:
+                result = await fn(db)
+                return len(result if isinstance(result, list) else result["labels"])
+        return run
+
+    return {
+        "daily volumes": (raw(func.date(Scan.created_at), Scan.prediction), rollup(analytics_service.daily_volumes)),
+        "label distribution": (raw(Scan.prediction), rollup(analytics_service.label_distribution)),
+        "confidence histogram": (raw(_bucket_sql()), rollup(analytics_service.confidence_histogram)),
+        "top users": (raw(Scan.user_id), rollup(analytics_service.top_users)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="defaults to a temporary SQLite file")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='bench-analytics-')}/analytics.db"
+    os.environ.setdefault("SECRET_KEY", "bench")
+    from app.database import AsyncSessionLocal, Base, engine
+    from app.models import analytics, job, scan, user  # noqa: F401  (registers the tables with Base)
+    from sqlalchemy import func, select
+    from app.services.analytics_service import backfill_statements
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    t0 = time.perf_counter()
+    seed(engine, args.rows, args.users, heavy_rows=0)
+    print(f"seeded {args.rows} scans in {time.perf_counter() - t0:.1f}s ({engine.dialect.name})", flush=True)
+
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        for stmt in backfill_statements():
+            conn.execute(stmt)
+        stats = conn.scalar(select(func.count()).select_from(analytics.ScanDailyStat))
+    print(f"backfilled {stats} rollup rows in {time.perf_counter() - t0:.1f}s", flush=True)
+
+    async def measure():
+        # One event loop for everything: pooled async connections are tied to it
+        results = {}
+        for name, (raw, rollup) in (await cases(AsyncSessionLocal)).items():
+            results[name] = (await timeit(raw, max(1, args.repeat // 5)), await timeit(rollup, args.repeat))
+            print(f"  {name:<20} done", flush=True)
+        return results
+
+    results = asyncio.run(measure())
+
+    print(f"\n{args.rows} scans, {stats} rollup rows")
+    print(f"{'report':<22} {'scans p50':>10} {'rollup p50':>11} {'rollup p90':>11}")
+    for name, (before, after) in results.items():
+        print(f"{name:<22} {before['p50_ms']:>10} {after['p50_ms']:>11} {after['p90_ms']:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# benchmarks/bench_backends.py
+"""
+Inference backends: Keras vs. exported TFLite variants.
+
+For every backend whose model file exists (export them first with
+`python -m app.cli.export_tflite`), a fresh process scores the sample set
+through app.ml.predict.predict_batch() and reports:
+
+  - parity  : label agreement (after the confidence threshold), top-1
+              agreement and max / mean absolute probability difference,
+              all against the Keras model
+  - latency : median ms for a single image and for a batch of --batch-size
+  - memory  : RSS after loading the model and peak RSS, both relative to
+              the bare interpreter (Linux only)
+
+Use real X-rays for a meaningful parity report (--images); without them a
+synthetic set is generated, which only exercises the plumbing.
+
+Run from the backend folder:
+    python -m benchmarks.bench_backends --images /data/xrays/sample --limit 500
+"""
+import argparse
+import io
+import json
+import multiprocessing as mp
+import os
+import queue
+import time
+
+import numpy as np
+from PIL import Image
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+os.environ.setdefault("SECRET_KEY", "bench")
+
+BACKENDS = [("keras", None), ("tflite", "fp16"), ("tflite", "dynamic"), ("tflite", "int8")]
+
+
+def make_image(seed: int) -> bytes:
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:512, 0:512]
+    base = (np.sin(x / rng.uniform(20, 120)) + np.cos(y / rng.uniform(20, 120))) * 60 + 128
+    arr = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(arr).save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def _status_mb(field: str) -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+
+def run_backend(backend, variant, batch, repeat, batch_size, out):
+    os.environ["INFERENCE_BACKEND"] = backend
+    if variant:
+        os.environ["TFLITE_VARIANT"] = variant
+    baseline = _status_mb("VmRSS")
+
+    from app.ml.predict import get_scoring_model, predict_batch
+    get_scoring_model()
+    predict_batch(batch[:1])  # warm-up / first allocation
+    loaded = _status_mb("VmRSS")
+
+    probs = np.concatenate([predict_batch(batch[i:i + batch_size]) for i in range(0, len(batch), batch_size)])
+
+    def timed(x):
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            predict_batch(x)
+            samples.append((time.perf_counter() - t0) * 1000.0)
+        return round(float(np.median(samples)), 2)
+
+    out.put({
+        "probs": probs,
+        "ms_single": timed(batch[:1]),
+        "ms_batch": timed(batch[:batch_size]),
+        "rss_loaded_mb": round(loaded - baseline, 1),
+        "rss_peak_mb": round(_status_mb("VmHWM") - baseline, 1),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default=None, help="directory or file list of sample images")
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    from app.config import settings
+    from app.ml.predict import label_prediction
+    from app.ml.preprocess import prepare_image
+    from app.ml.tflite_backend import tflite_path
+
+    if args.images:
+        from app.cli.bulk_score import list_images
+        blobs = []
+        for path in list_images(args.images)[:args.limit]:
+            with open(path, "rb") as f:
+                blobs.append(f.read())
+    else:
+        blobs = [make_image(i) for i in range(args.limit)]
+    inputs = []
+    for b in blobs:
+        try:
+            inputs.append(prepare_image(b).model_input)
+        except Exception:
+            continue  # unreadable sample; the API would reject it too
+    batch = np.concatenate(inputs)
+
+    ctx = mp.get_context("spawn")
+    results = []
+    reference = None
+    for backend, variant in BACKENDS:
+        path = tflite_path(settings.MODEL_PATH, variant) if variant else settings.MODEL_PATH
+        if not os.path.exists(path):
+            print(f"skipping {backend} {variant or ''}: {path} not found")
+            continue
+        print(f"running {backend} {variant or ''}", flush=True)
+        out = ctx.Queue()
+        p = ctx.Process(target=run_backend, args=(backend, variant, batch, args.repeat, args.batch_size, out))
+        p.start()
+        res = None
+        while res is None and (p.is_alive() or not out.empty()):
+            try:
+                res = out.get(timeout=1.0)
+            except queue.Empty:
+                pass
+        p.join()
+        if res is None:
+            print(f"{backend} {variant or ''} failed (exit code {p.exitcode})")
+            continue
+
+        probs = res.pop("probs")
+        if reference is None:
+            reference = probs
+        labels = [label_prediction(row)[0] for row in probs]
+        ref_labels = [label_prediction(row)[0] for row in reference]
+        diff = np.abs(probs - reference)
+        results.append({
+            "backend": backend if not variant else f"tflite-{variant}",
+            "model_mb": round(os.path.getsize(path) / 1e6, 1),
+            "label_agreement": round(float(np.mean([a == b for a, b in zip(labels, ref_labels)])), 4),
+            "top1_agreement": round(float(np.mean(probs.argmax(1) == reference.argmax(1))), 4),
+            "max_abs_diff": round(float(diff.max()), 5),
+            "mean_abs_diff": round(float(diff.mean()), 5),
+            **res,
+        })
+
+    print(f"\n{len(batch)} images, batch size {args.batch_size}")
+    print(f"{'backend':<15} {'MB':>5} {'labels':>7} {'top1':>6} {'max|d|':>8} {'mean|d|':>8} "
+          f"{'ms/1':>7} {'ms/batch':>9} {'RSS':>7} {'peak':>7}")
+    for r in results:
+        print(f"{r['backend']:<15} {r['model_mb']:>5} {r['label_agreement']:>7} {r['top1_agreement']:>6} "
+              f"{r['max_abs_diff']:>8} {r['mean_abs_diff']:>8} {r['ms_single']:>7} {r['ms_batch']:>9} "
+              f"{r['rss_loaded_mb']:>7} {r['rss_peak_mb']:>7}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/bench_batching.py
+"""
+Micro-batching vs. per-image inference.
+
+Fires N concurrent callers at the model and reports throughput and p50/p99
+latency for:
+  - per-image : the old path, model.predict() on a batch of one per call
+  - batched   : app.ml.batcher.MicroBatcher in front of one forward pass
+
+Run from the backend folder:
+    python -m benchmarks.bench_batching --requests 256 --concurrency 1 4 16 32
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+os.environ.setdefault("SECRET_KEY", "bench")
+
+
+def percentile(values, q):
+    return float(np.percentile(np.asarray(values) * 1000.0, q))
+
+
+def run_load(call, inputs, concurrency):
+    latencies = []
+    lock = threading.Lock()
+
+    def one(arr):
+        t0 = time.perf_counter()
+        call(arr)
+        dt = time.perf_counter() - t0
+        with lock:
+            latencies.append(dt)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, inputs))
+    wall = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": len(inputs),
+        "throughput_rps": round(len(inputs) / wall, 2),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    from app.ml import predict
+    from app.ml.batcher import MicroBatcher
+
+    rng = np.random.default_rng(0)
+    inputs = [
+        rng.random((1, predict.IMG_SIZE, predict.IMG_SIZE, 3), dtype=np.float32)
+        for _ in range(args.requests)
+    ]
+
+    # Warm up both paths so graph building isn't counted
+    predict.get_model().predict(inputs[0], verbose=0)
+    predict.predict_batch(np.concatenate(inputs[: args.max_batch_size]))
+
+    batcher = MicroBatcher(predict.predict_batch, args.max_batch_size, args.max_wait_ms)
+    per_image = lambda arr: predict.get_model().predict(arr, verbose=0)[0]
+
+    results = []
+    for c in args.concurrency:
+        results.append({"mode": "per-image", **run_load(per_image, inputs, c)})
+        results.append({"mode": "batched", **run_load(batcher.predict, inputs, c)})
+    batcher.close()
+
+    print(f"{'mode':<10} {'conc':>5} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for r in results:
+        print(f"{r['mode']:<10} {r['concurrency']:>5} {r['throughput_rps']:>9} {r['p50_ms']:>9} {r['p99_ms']:>9}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# benchmarks/bench_formats.py
+"""
+Decode throughput per upload format, through prepare_image (what the API
+and bulk_score run), plus the naive path for the high bit depth formats.
+
+  - new   : app.ml.preprocess.prepare_image(): DICOM / 16-bit windowed to
+            8-bit while being box-reduced in integer strips
+  - naive : decode everything at full size, convert to float32, window,
+            then resize (what a straightforward implementation would do)
+
+Formats: 8-bit JPEG and PNG, 16-bit PNG and TIFF, DICOM (12 bits stored,
+uncompressed and RLE Lossless). Each (format, size, mode) runs in a fresh
+process; RSS is the peak minus the resident size after imports (Linux).
+
+Run from the backend folder (DICOM needs pydicom):
+    python -m benchmarks.bench_formats --sizes 2048 4096 --repeat 5
+"""
+import argparse
+import io
+import json
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+os.environ.setdefault("SECRET_KEY", "bench")
+
+FORMATS = ["jpeg", "png8", "png16", "tiff16", "dicom", "dicom-rle"]
+WIDE = {"png16", "tiff16", "dicom", "dicom-rle"}
+
+
+def make(fmt: str, side: int) -> bytes:
+    from benchmarks.synthetic import make_dicom, make_xray, make_xray16
+    if fmt == "jpeg":
+        return make_xray(side, "JPEG")
+    if fmt == "png8":
+        return make_xray(side, "PNG")
+    if fmt == "png16":
+        return make_xray16(side, "PNG")
+    if fmt == "tiff16":
+        return make_xray16(side, "TIFF")
+    return make_dicom(side, compressed=fmt == "dicom-rle")
+
+
+def naive_path(data: bytes):
+    from PIL import Image
+    from app.ml.preprocess import IMG_SIZE
+    from app.ml.radiograph import apply_window, is_dicom
+
+    if is_dicom(data):
+        import pydicom
+        ds = pydicom.dcmread(io.BytesIO(data))
+        pixels = ds.pixel_array.astype(np.float32) * float(ds.RescaleSlope) + float(ds.RescaleIntercept)
+        gray = apply_window(pixels, float(ds.WindowCenter), float(ds.WindowWidth))
+    else:
+        gray = apply_window(np.asarray(Image.open(io.BytesIO(data))).astype(np.float32))
+    img = Image.fromarray(gray, "L").convert("RGB")
+    return np.asarray(img.resize((IMG_SIZE, IMG_SIZE)), dtype=np.float32)[np.newaxis] / 255.0
+
+
+def new_path(data: bytes):
+    from app.ml.preprocess import prepare_image
+    return prepare_image(data).model_input
+
+
+def run_one(mode, data, repeat, out):
+    from benchmarks.bench_preprocess import current_rss_mb, peak_rss_mb
+    fn = naive_path if mode == "naive" else new_path
+    import app.ml.preprocess, app.ml.radiograph  # noqa: F401
+    try:
+        import pydicom  # noqa: F401
+    except ImportError:
+        pass
+    baseline = current_rss_mb()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(data)
+        samples.append(time.perf_counter() - t0)
+    ms = float(np.median(samples)) * 1000.0
+    out.put({
+        "ms_per_image": round(ms, 1),
+        "images_per_sec": round(1000.0 / ms, 1),
+        "peak_rss_delta_mb": round(peak_rss_mb() - baseline, 1),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2048, 4096])
+    parser.add_argument("--formats", nargs="+", default=FORMATS, choices=FORMATS)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    results = []
+    for fmt in args.formats:
+        for side in args.sizes:
+            data = make(fmt, side)
+            for mode in ("naive", "new") if fmt in WIDE else ("new",):
+                out = ctx.Queue()
+                p = ctx.Process(target=run_one, args=(mode, data, args.repeat, out))
+                p.start()
+                res = out.get()
+                p.join()
+                results.append({"format": fmt, "side_px": side, "mode": mode, "file_mb": round(len(data) / 2**20, 1), **res})
+                print(f"  {fmt} {side} {mode} done", flush=True)
+
+    print(f"\n{'format':<10} {'side':>6} {'file MB':>8} {'mode':<6} {'ms/img':>9} {'img/s':>7} {'peak RSS +MB':>13}")
+    for r in results:
+        print(f"{r['format']:<10} {r['side_px']:>6} {r['file_mb']:>8} {r['mode']:<6} {r['ms_per_image']:>9} "
+              f"{r['images_per_sec']:>7} {r['peak_rss_delta_mb']:>13}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/bench_gradcam.py
+"""
+Grad-CAM latency: old two-pass path vs. the fused single pass.
+
+  - two-pass : model.predict() for the label, then a freshly built grad
+               model + GradientTape for the heatmap (the old predict.py code)
+  - fused    : app.ml.predict.predict_batch_with_gradcam, one traced pass
+               returning probabilities, activations and gradients
+
+Run from the backend folder:
+    python -m benchmarks.bench_gradcam --iterations 30 --batch-sizes 1 8 16
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+os.environ.setdefault("SECRET_KEY", "bench")
+
+
+def legacy_two_pass(model, arr, last_conv_layer_name):
+    """Copy of the pre-fusion code path, kept here only for comparison."""
+    import tensorflow as tf
+
+    prediction = model.predict(arr, verbose=0)[0]
+    pred_index = int(np.argmax(prediction))
+
+    grad_model = tf.keras.models.Model(
+        model.inputs, [model.get_layer(last_conv_layer_name).output, model.output]
+    )
+    with tf.GradientTape() as tape:
+        last_conv_layer_output, preds = grad_model(arr)
+        if isinstance(preds, (list, tuple)):
+            preds = preds[0]
+        class_channel = preds[:, pred_index]
+    grads = tape.gradient(class_channel, last_conv_layer_output)
+    pooled_grads = tf.reduce_mean(grads, axis=(0, 1, 2))
+    heatmap = tf.squeeze(last_conv_layer_output[0] @ pooled_grads[..., tf.newaxis])
+    heatmap = tf.maximum(heatmap, 0) / tf.math.reduce_max(heatmap)
+    return prediction, heatmap.numpy()
+
+
+def timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 16])
+    args = parser.parse_args()
+
+    from app.ml import predict
+
+    model = predict.get_model()
+    rng = np.random.default_rng(0)
+    single = rng.random((1, predict.IMG_SIZE, predict.IMG_SIZE, 3), dtype=np.float32)
+
+    # Warm up (tracing is a one-off cost of the fused path)
+    legacy_two_pass(model, single, predict.LAST_CONV_LAYER_NAME)
+    predict.predict_batch_with_gradcam(single)
+
+    results = []
+    for bs in args.batch_sizes:
+        batch = rng.random((bs, predict.IMG_SIZE, predict.IMG_SIZE, 3), dtype=np.float32)
+        predict.predict_batch_with_gradcam(batch)
+
+        # The old path could only do one image per call
+        legacy = timed(lambda: [legacy_two_pass(model, batch[i:i + 1], predict.LAST_CONV_LAYER_NAME)
+                                for i in range(bs)], args.iterations)
+        fused = timed(lambda: predict.predict_batch_with_gradcam(batch), args.iterations)
+        for mode, samples in (("two-pass", legacy), ("fused", fused)):
+            results.append({
+                "mode": mode,
+                "batch_size": bs,
+                "p50_ms": round(float(np.percentile(samples, 50)), 2),
+                "p99_ms": round(float(np.percentile(samples, 99)), 2),
+                "per_image_ms": round(float(np.median(samples)) / bs, 2),
+            })
+
+    print(f"{'mode':<9} {'batch':>5} {'p50 ms':>9} {'p99 ms':>9} {'ms/img':>8}")
+    for r in results:
+        print(f"{r['mode']:<9} {r['batch_size']:>5} {r['p50_ms']:>9} {r['p99_ms']:>9} {r['per_image_ms']:>8}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
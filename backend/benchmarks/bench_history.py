@@ -0,0 +1,158 @@
+# benchmarks/bench_history.py
+"""
+GET /scan/history at scale: the old "load everything" query vs. keyset
+pages, on a seeded scans table (default one million rows).
+
+Rows are spread over --users accounts, with one heavy "clinic" account
+holding --heavy-rows of them. The old query and a few page shapes (first
+page, a page deep into the history via its cursor, a label filter, a date
+window) are timed for the heavy account, first without the composite
+indexes, then with them. Each timing includes building the ScanOut
+models, like the endpoint does.
+
+Run from the backend folder (uses a throwaway SQLite file by default):
+    python -m benchmarks.bench_history
+    python -m benchmarks.bench_history --database-url postgresql://... --rows 1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+LABELS = ["NORMAL", "BACTERIAL", "VIRAL", "Uncertain / Unknown"]
+
+
+def seed(engine, rows: int, users: int, heavy_rows: int, batch: int = 50_000):
+    from sqlalchemy import insert
+    from app.models.scan import Scan
+    from app.models.user import User
+
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"email": f"user{i}@bench", "password": "x"} for i in range(1, users + 1)])
+        done = 0
+        while done < rows:
+            n = min(batch, rows - done)
+            conn.execute(insert(Scan), [
+                {
+                    # user 1 is the heavy account; the rest is spread over everyone else
+                    "user_id": 1 if done + i < heavy_rows else rng.randint(2, users),
+                    "image_path": f"{done + i:08x}.jpg",
+                    "prediction": rng.choice(LABELS),
+                    "confidence": rng.random(),
+                    "probs": {"NORMAL": 0.5, "BACTERIAL": 0.3, "VIRAL": 0.2},
+                    "created_at": start + timedelta(seconds=rng.randint(0, 86400 * 600)),
+                }
+                for i in range(n)
+            ])
+            done += n
+
+
+async def timeit(fn, repeat: int) -> dict:
+    await fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        n = await fn()
+        samples.append(time.perf_counter() - t0)
+    ms = np.asarray(samples) * 1000.0
+    return {"rows": n, "p50_ms": round(float(np.percentile(ms, 50)), 2), "p90_ms": round(float(np.percentile(ms, 90)), 2)}
+
+
+async def cases(SessionLocal, page: int):
+    from sqlalchemy import func, select
+    from app import models
+    from app.schemas.scan import ScanOut
+    from app.services.scan_service import get_user_scans
+
+    Scan = models.scan.Scan
+
+    async def legacy():
+        # What GET /scan/history used to do: every scan, full ORM objects
+        async with SessionLocal() as db:
+            scans = (await db.execute(select(Scan).where(Scan.user_id == 1).order_by(Scan.created_at.desc()))).scalars().all()
+            return len([ScanOut.model_validate(s) for s in scans])
+
+    def page_of(**kwargs):
+        async def run():
+            async with SessionLocal() as db:
+                items, _ = await get_user_scans(db, 1, page, **kwargs)
+                return len([ScanOut.model_validate(s) for s in items])
+        return run
+
+    async with SessionLocal() as db:
+        # The cursor after ~90% of the heavy account's history
+        count = await db.scalar(select(func.count()).select_from(Scan).where(Scan.user_id == 1))
+        deep = (await db.execute(
+            select(Scan.created_at, Scan.id).where(Scan.user_id == 1)
+            .order_by(Scan.created_at.desc(), Scan.id.desc()).offset(int(count * 0.9)).limit(1))).first()
+    from app.services.scan_service import encode_cursor
+    return {
+        "legacy (all rows)": legacy,
+        "first page": page_of(),
+        "deep page (90%)": page_of(cursor=encode_cursor(deep.created_at, deep.id)),
+        "label=VIRAL": page_of(label="VIRAL"),
+        "30-day window": page_of(since=datetime(2025, 3, 1), until=datetime(2025, 3, 31)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="defaults to a temporary SQLite file")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--heavy-rows", type=int, default=50_000, help="scans owned by the heavy account")
+    parser.add_argument("--page", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='bench-history-')}/history.db"
+    os.environ.setdefault("SECRET_KEY", "bench")
+    from app.database import AsyncSessionLocal, Base, engine
+    from app.models import analytics, job, scan, user  # noqa: F401  (registers the tables with Base)
+
+    indexes = [ix for ix in scan.Scan.__table__.indexes if ix.name.startswith("ix_scans_user_")]
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    for ix in indexes:
+        ix.drop(engine)
+
+    t0 = time.perf_counter()
+    seed(engine, args.rows, args.users, args.heavy_rows)
+    print(f"seeded {args.rows} scans in {time.perf_counter() - t0:.1f}s ({engine.dialect.name})", flush=True)
+
+    async def measure():
+        # One event loop for everything: pooled async connections are tied to it
+        results = {}
+        for phase in ("no index", "indexed"):
+            if phase == "indexed":
+                t0 = time.perf_counter()
+                for ix in indexes:
+                    ix.create(engine)
+                print(f"built {len(indexes)} indexes in {time.perf_counter() - t0:.1f}s", flush=True)
+            if engine.dialect.name == "sqlite":
+                with engine.connect() as conn:
+                    conn.exec_driver_sql("ANALYZE")
+            for name, fn in (await cases(AsyncSessionLocal, args.page)).items():
+                repeat = max(1, args.repeat // 5) if name.startswith("legacy") else args.repeat
+                results[(phase, name)] = await timeit(fn, repeat)
+                print(f"  {phase:<9} {name:<18} done", flush=True)
+        return results
+
+    results = asyncio.run(measure())
+
+    print(f"\nheavy account: {args.heavy_rows} of {args.rows} scans, page size {args.page}")
+    print(f"{'query':<20} {'rows':>7} {'no index p50':>13} {'indexed p50':>12} {'indexed p90':>12}")
+    for name in dict.fromkeys(n for _, n in results):
+        before, after = results[("no index", name)], results[("indexed", name)]
+        print(f"{name:<20} {after['rows']:>7} {before['p50_ms']:>13} {after['p50_ms']:>12} {after['p90_ms']:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# benchmarks/bench_preprocess.py
+"""
+Upload preprocessing: old double full-size decode vs. single draft-mode decode.
+
+  - old : is_mostly_grayscale() on a full-size float64 array, then a second
+          full-size decode + resize for the model (the pre-change code)
+  - new : app.ml.preprocess.prepare_image() once, filter on the reduced
+          uint8 image, model input from the same buffer
+
+Each (mode, image) pair runs in a fresh process so peak RSS isn't polluted
+by the other runs. Reported RSS is the peak minus the resident size right
+after imports (Linux only).
+
+Run from the backend folder:
+    python -m benchmarks.bench_preprocess --sizes 1024 3000 4500 --repeat 10
+"""
+import argparse
+import io
+import json
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+os.environ.setdefault("SECRET_KEY", "bench")
+
+
+def make_image(side: int, fmt: str) -> bytes:
+    # Smooth grayscale gradient + noise, roughly like a radiograph
+    rng = np.random.default_rng(side)
+    y, x = np.mgrid[0:side, 0:side]
+    base = (np.sin(x / 97.0) + np.cos(y / 53.0)) * 60 + 128
+    arr = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(np.stack([arr] * 3, axis=-1)).save(buf, format=fmt, quality=90)
+    return buf.getvalue()
+
+
+def old_path(data: bytes):
+    img = Image.open(io.BytesIO(data)).convert("RGB")
+    arr = np.array(img) / 255.0
+    r, g, b = arr[:, :, 0], arr[:, :, 1], arr[:, :, 2]
+    color_diff = np.abs(r - g) + np.abs(g - b) + np.abs(r - b)
+    is_gray = np.mean(color_diff > 0.02) < 0.1
+
+    img = Image.open(io.BytesIO(data)).convert("RGB").resize((150, 150))
+    model_input = np.expand_dims(np.asarray(img, dtype=np.float32) / 255.0, axis=0)
+    return is_gray, model_input
+
+
+def new_path(data: bytes):
+    from app.ml.preprocess import prepare_image
+    from app.utils.image_filter import is_mostly_grayscale_array
+
+    img = prepare_image(data)
+    return is_mostly_grayscale_array(img.rgb), img.model_input
+
+
+def _status_mb(field: str) -> float:
+    # VmHWM belongs to the process's own address space, so unlike ru_maxrss
+    # it isn't inherited from the (large) parent across fork/exec
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+
+def peak_rss_mb() -> float:
+    return _status_mb("VmHWM")
+
+
+def current_rss_mb() -> float:
+    return _status_mb("VmRSS")
+
+
+def run_one(mode, data, repeat, out):
+    fn = old_path if mode == "old" else new_path
+    # Import everything the path needs before taking the baseline
+    import app.ml.preprocess, app.utils.image_filter  # noqa: F401
+    baseline = current_rss_mb()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(data)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    out.put({
+        "ms_per_image": round(float(np.median(samples)), 2),
+        "peak_rss_delta_mb": round(peak_rss_mb() - baseline, 1),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 3000, 4500])
+    parser.add_argument("--formats", nargs="+", default=["JPEG", "PNG"])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    results = []
+    for fmt in args.formats:
+        for side in args.sizes:
+            data = make_image(side, fmt)
+            for mode in ("old", "new"):
+                out = ctx.Queue()
+                p = ctx.Process(target=run_one, args=(mode, data, args.repeat, out))
+                p.start()
+                res = out.get()
+                p.join()
+                results.append({"format": fmt, "side_px": side, "mode": mode,
+                                "bytes": len(data), **res})
+
+    print(f"{'format':<6} {'side':>6} {'mode':<4} {'ms/img':>9} {'peak RSS +MB':>13}")
+    for r in results:
+        print(f"{r['format']:<6} {r['side_px']:>6} {r['mode']:<4} {r['ms_per_image']:>9} {r['peak_rss_delta_mb']:>13}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# benchmarks/bench_startup.py
+"""
+Cold start: import time, time to ready and time to first prediction.
+
+Each scenario runs in a fresh interpreter that
+  1. imports app.main                       -> import_s
+  2. starts the app (lifespan) and polls /readyz until 200 -> ready_s
+  3. sends two /scan/predict requests       -> first_predict_ms, second_predict_ms
+ready_s and first_prediction_s are measured from the start of the process.
+
+Scenarios cover in-process inference and one worker process, each with and
+without warm-up (INFERENCE_WARMUP); without it, tracing and allocation
+land on the first request instead.
+
+Run from the backend folder:
+    python -m benchmarks.bench_startup --repeat 3
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+
+PROCESS_START = time.perf_counter()
+
+SCENARIOS = [
+    {"INFERENCE_WORKERS": "0", "INFERENCE_WARMUP": "true"},
+    {"INFERENCE_WORKERS": "0", "INFERENCE_WARMUP": "false"},
+    {"INFERENCE_WORKERS": "1", "INFERENCE_WARMUP": "true"},
+    {"INFERENCE_WORKERS": "1", "INFERENCE_WARMUP": "false"},
+]
+
+
+def child():
+    t0 = time.perf_counter()
+    from app.main import app
+    import_s = time.perf_counter() - t0
+    heavy = sorted(m for m in ("tensorflow", "keras", "cv2", "matplotlib") if m in sys.modules)
+
+    import numpy as np
+    from PIL import Image
+    from fastapi.testclient import TestClient
+
+    def xray(seed):
+        # Distinct images, so the second request isn't a prediction-cache hit
+        gray = (np.random.default_rng(seed).random((600, 600)) * 255).astype(np.uint8)
+        buf = io.BytesIO()
+        Image.fromarray(gray).convert("RGB").save(buf, format="JPEG")
+        return {"file": ("x.jpg", buf.getvalue(), "image/jpeg")}
+
+    with TestClient(app) as client:
+        while client.get("/readyz").status_code != 200:
+            time.sleep(0.05)
+        ready_s = time.perf_counter() - PROCESS_START
+
+        latencies = []
+        for seed in range(2):
+            files = xray(seed)
+            t = time.perf_counter()
+            r = client.post("/scan/predict", files=files)
+            r.raise_for_status()
+            latencies.append((time.perf_counter() - t) * 1000.0)
+        first_prediction_s = ready_s + latencies[0] / 1000.0
+
+    print(json.dumps({
+        "import_s": round(import_s, 2),
+        "heavy_modules_at_import": heavy,
+        "ready_s": round(ready_s, 2),
+        "first_prediction_s": round(first_prediction_s, 2),
+        "first_predict_ms": round(latencies[0], 1),
+        "second_predict_ms": round(latencies[1], 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child()
+
+    results = []
+    for scenario in SCENARIOS:
+        env = {**os.environ, "DATABASE_URL": os.environ.get("DATABASE_URL", "sqlite:///./bench.db"),
+               "SECRET_KEY": os.environ.get("SECRET_KEY", "bench"), **scenario}
+        runs = []
+        for _ in range(args.repeat):
+            out = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "--child"],
+                                 env=env, capture_output=True, text=True, check=True)
+            runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        best = {k: min(r[k] for r in runs) if isinstance(runs[0][k], (int, float)) else runs[0][k]
+                for k in runs[0]}
+        results.append({"workers": int(scenario["INFERENCE_WORKERS"]),
+                        "warmup": scenario["INFERENCE_WARMUP"] == "true", **best})
+
+    print(f"{'workers':>7} {'warmup':>6} {'import s':>9} {'ready s':>8} {'1st pred s':>11} "
+          f"{'1st ms':>8} {'2nd ms':>8}  heavy modules at import")
+    for r in results:
+        print(f"{r['workers']:>7} {str(r['warmup']):>6} {r['import_s']:>9} {r['ready_s']:>8} "
+              f"{r['first_prediction_s']:>11} {r['first_predict_ms']:>8} {r['second_predict_ms']:>8}  "
+              f"{','.join(r['heavy_modules_at_import']) or '-'}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# benchmarks/bench_tta.py
+"""
+Test-time augmentation: what it costs vs. how many uncertain results it
+removes.
+
+Every sample is scored once; the ones below CONFIDENCE_THRESHOLD are then
+re-scored with TTA for each --views count, with no latency budget, and
+the report gives per view count:
+
+  - uncertain : share of ALL samples still "Uncertain / Unknown" afterwards
+                (the first row, 0 views, is the baseline)
+  - resolved  : share of the uncertain ones that TTA moved above the threshold
+  - extra p50/p90 : added ms per uncertain image (augmenting + the batched pass)
+  - per study : added ms averaged over ALL samples, i.e. what the mean latency grows by
+  - unbatched : the same views scored as separate single-image calls, for comparison
+
+Use real X-rays for meaningful rates (--images); the synthetic set only
+exercises the plumbing.
+
+Run from the backend folder:
+    python -m benchmarks.bench_tta --images /data/xrays/sample --limit 500
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+os.environ.setdefault("SECRET_KEY", "bench")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default=None, help="directory or file list of sample images")
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--views", type=int, nargs="+", default=[2, 4, 8, 12])
+    args = parser.parse_args()
+
+    from app.config import settings
+    from app.ml import predict, tta
+    from app.ml.preprocess import prepare_image
+
+    if args.images:
+        from app.cli.bulk_score import list_images
+        blobs = []
+        for path in list_images(args.images)[:args.limit]:
+            with open(path, "rb") as f:
+                blobs.append(f.read())
+    else:
+        from benchmarks.synthetic import make_xray
+        blobs = [make_xray(512, seed=i) for i in range(args.limit)]
+    images = []
+    for b in blobs:
+        try:
+            images.append(prepare_image(b))
+        except Exception:
+            continue  # unreadable sample; the API would reject it too
+
+    loaded = predict.load()
+    scoring = loaded.scoring_model()
+    rows = list(loaded.predict_batch(np.concatenate([img.model_input for img in images])))
+    uncertain = [i for i, row in enumerate(rows) if float(np.max(row)) < predict.CONFIDENCE_THRESHOLD]
+    print(f"{len(images)} images, {len(uncertain)} uncertain without TTA (model {predict.model_version()})", flush=True)
+
+    settings.TTA_ENABLED = True
+    tta.budget.budget = 0.0  # measure the full cost of every view count
+    results = [{"views": 0, "uncertain": len(uncertain) / len(images), "resolved": 0.0,
+                "p50": 0.0, "p90": 0.0, "per_study": 0.0, "unbatched_p50": 0.0}]
+    for n in args.views:
+        settings.TTA_VIEWS = n
+        n = min(n, len(tta.VIEWS))
+        scoring.predict_on_batch(tta.augment(images[0].resized, n))  # trace / allocate this batch shape
+        extra, unbatched, still = [], [], 0
+        for i in uncertain:
+            t0 = time.perf_counter()
+            row = predict.refine_uncertain(loaded, [images[i]], [rows[i]])[0][0]
+            extra.append(time.perf_counter() - t0)
+            still += float(np.max(row)) < predict.CONFIDENCE_THRESHOLD
+            views = tta.augment(images[i].resized, n)
+            t0 = time.perf_counter()
+            for v in views:
+                scoring.predict_on_batch(v[np.newaxis])
+            unbatched.append(time.perf_counter() - t0)
+        ms = np.asarray(extra or [0.0]) * 1000.0
+        results.append({
+            "views": n,
+            "uncertain": still / len(images),
+            "resolved": 1 - still / len(uncertain) if uncertain else 0.0,
+            "p50": float(np.percentile(ms, 50)),
+            "p90": float(np.percentile(ms, 90)),
+            "per_study": float(ms.sum()) / len(images),
+            "unbatched_p50": float(np.percentile(np.asarray(unbatched or [0.0]) * 1000.0, 50)),
+        })
+        print(f"  {n} views done", flush=True)
+
+    print(f"\n{'views':>5} {'uncertain':>10} {'resolved':>9} {'extra p50':>10} {'extra p90':>10} "
+          f"{'per study':>10} {'unbatched p50':>14}")
+    for r in results:
+        print(f"{r['views']:>5} {r['uncertain']:>10.1%} {r['resolved']:>9.1%} {r['p50']:>10.1f} {r['p90']:>10.1f} "
+              f"{r['per_study']:>10.1f} {r['unbatched_p50']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
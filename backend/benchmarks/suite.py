@@ -0,0 +1,261 @@
+# benchmarks/suite.py
+"""
+Offline benchmark suite for the API: per-stage microbenchmarks plus load
+tests of the scan and auth endpoints, written as JSON that can be compared
+against a stored baseline.
+
+  stages : decode (prepare_image), grayscale filter, inference, Grad-CAM and
+           heatmap overlay + encode, on synthetic grayscale and colour images
+           at several resolutions and formats
+  load   : POST /scan/predict, POST /scan/predict/save, GET /scan/history
+           and POST /auth/login, each at a set of concurrency levels, through
+           an in-process ASGI client (no network, no server)
+
+Everything runs in one process against a throwaway SQLite database and
+upload directory; inference runs in-process (INFERENCE_WORKERS=0) and the
+prediction cache is off unless --cache is given, so repeated runs measure
+the same work. --model stub swaps in a tiny CNN with the real model's
+interface, which isolates the app's own overhead and needs no model file.
+
+Run from the backend folder:
+    python -m benchmarks.suite --model stub --out bench-results.json
+    python -m benchmarks.suite --model stub --baseline bench-results.json --fail-on-regression
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import build_stub_model, make_color, make_xray
+
+LOAD_ENDPOINTS = ("POST /scan/predict", "POST /scan/predict/save", "GET /scan/history", "POST /auth/login")
+
+
+def configure(workdir: str, cache: bool):
+    # Must run before anything under app/ is imported: settings are read once
+    os.makedirs(os.path.join(workdir, "uploads"), exist_ok=True)
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{workdir}/suite.db",
+        "SECRET_KEY": "bench",
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "INFERENCE_WORKERS": "0",
+        "PREDICTION_CACHE_ENABLED": str(cache).lower(),
+        "PREDICTION_CACHE_DIR": "",
+    })
+
+
+def summarize(samples, wall: float | None = None, errors: int = 0) -> dict:
+    ms = np.asarray(samples) * 1000.0
+    return {
+        "n": len(samples),
+        "errors": errors,
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p90_ms": round(float(np.percentile(ms, 90)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        # Sequential stages: 1 / mean latency; load tests: completed requests / wall time
+        "throughput_per_s": round(len(samples) / wall if wall else 1000.0 / float(ms.mean()), 2),
+    }
+
+
+def timeit(fn, repeat: int) -> dict:
+    fn()  # first call pays one-off costs (plugin imports, allocation)
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples)
+
+
+def bench_stages(args) -> dict:
+    from app.config import settings
+    from app.ml import predict
+    from app.ml.preprocess import prepare_image
+    from app.utils.image_filter import is_mostly_grayscale_array
+
+    results = {}
+    for side in args.sizes:
+        for fmt in ("JPEG", "PNG"):
+            for kind, make in (("gray", make_xray), ("color", make_color)):
+                data = make(side, fmt)
+                name = f"{kind}-{fmt.lower()}-{side}"
+                results[f"stage/decode/{name}"] = timeit(lambda: prepare_image(data), args.repeat)
+                img = prepare_image(data)
+                results[f"stage/filter/{name}"] = timeit(lambda: is_mostly_grayscale_array(img.rgb), args.repeat)
+
+    img = prepare_image(make_xray(1024))
+    batch = np.repeat(img.model_input, 16, axis=0)
+    results["stage/inference/batch-1"] = timeit(lambda: predict.predict_batch(batch[:1]), args.repeat)
+    results["stage/inference/batch-16"] = timeit(lambda: predict.predict_batch(batch), args.repeat)
+    results["stage/gradcam/batch-1"] = timeit(lambda: predict.predict_batch_with_gradcam(batch[:1]), args.repeat)
+    results["stage/gradcam/batch-16"] = timeit(lambda: predict.predict_batch_with_gradcam(batch), args.repeat)
+    _, heatmaps = predict.predict_batch_with_gradcam(batch[:1])
+    results[f"stage/overlay_encode/{settings.HEATMAP_FORMAT}"] = timeit(
+        lambda: predict.render_heatmap_artifact(img.resized, heatmaps[0]), args.repeat)
+    return results
+
+
+async def load_test(send, total: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    jobs = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in jobs:
+            t0 = time.perf_counter()
+            response = await send(i)
+            latencies.append(time.perf_counter() - t0)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+async def bench_load(args) -> dict:
+    import httpx
+    from app.main import app
+    from app.database import AsyncSessionLocal
+    from app.ml.engine import inference_engine
+    from app.services.scan_service import bulk_create_scans
+
+    images = [make_xray(args.image_side, "JPEG", seed=i) for i in range(args.image_pool)]
+    email, password = "bench@example.com", "bench-password"
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        while not inference_engine.ready:
+            await asyncio.sleep(0.05)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            r = await client.post("/auth/register", json={"email": email, "password": password})
+            r.raise_for_status()
+            auth = {"Authorization": f"Bearer {r.json()['access_token']}"}
+            user_id = 1
+            async with AsyncSessionLocal() as db:
+                await bulk_create_scans(db, [
+                    {"user_id": user_id, "image_path": f"seed-{i}.jpg", "prediction": "NORMAL",
+                     "confidence": 0.9, "probs": {"NORMAL": 0.9, "BACTERIAL": 0.05, "VIRAL": 0.05}}
+                    for i in range(args.history_rows)
+                ])
+
+            def upload(i):
+                return {"file": ("scan.jpg", images[i % len(images)], "image/jpeg")}
+
+            senders = {
+                "POST /scan/predict": lambda i: client.post("/scan/predict", files=upload(i)),
+                "POST /scan/predict/save": lambda i: client.post("/scan/predict/save", files=upload(i), headers=auth),
+                "GET /scan/history": lambda i: client.get("/scan/history", headers=auth),
+                "POST /auth/login": lambda i: client.post("/auth/login", json={"email": email, "password": password}),
+            }
+            for endpoint in args.endpoints:
+                send = senders[endpoint]
+                await send(0)  # warm the route
+                for c in args.concurrency:
+                    results[f"load/{endpoint}/c{c}"] = await load_test(send, args.requests, c)
+                    print(f"  {endpoint} c={c}: done", flush=True)
+    return results
+
+
+def meta(args) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    from app.ml.predict import model_version
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "tensorflow": sys.modules["tensorflow"].__version__ if "tensorflow" in sys.modules else None,
+        "model": args.model,
+        "model_version": model_version(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Prints p50 / throughput deltas vs. the baseline; returns the regressed benchmark names."""
+    regressions = []
+    print(f"\n{'benchmark':<48} {'p50 ms':>9} {'base':>9} {'Δp50':>7} {'tput/s':>9} {'base':>9} {'Δtput':>7}")
+    for name, cur in current["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if base is None:
+            continue
+        d_p50 = cur["p50_ms"] / base["p50_ms"] - 1 if base["p50_ms"] else 0.0
+        d_tput = cur["throughput_per_s"] / base["throughput_per_s"] - 1 if base["throughput_per_s"] else 0.0
+        regressed = d_p50 > tolerance or d_tput < -tolerance
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<48} {cur['p50_ms']:>9} {base['p50_ms']:>9} {d_p50:>+7.0%} "
+              f"{cur['throughput_per_s']:>9} {base['throughput_per_s']:>9} {d_tput:>+7.0%}"
+              f"{'  REGRESSED' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", choices=["stub", "real"], default="stub")
+    parser.add_argument("--only", choices=["stages", "load"], default=None)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024, 2048])
+    parser.add_argument("--repeat", type=int, default=20, help="samples per stage benchmark")
+    parser.add_argument("--endpoints", nargs="+", choices=LOAD_ENDPOINTS, default=list(LOAD_ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=64, help="requests per endpoint and concurrency level")
+    parser.add_argument("--image-side", type=int, default=1024)
+    parser.add_argument("--image-pool", type=int, default=32, help="distinct upload images")
+    parser.add_argument("--history-rows", type=int, default=500, help="scans seeded for GET /scan/history")
+    parser.add_argument("--cache", action="store_true", help="keep the prediction cache on")
+    parser.add_argument("--out", default=None, help="write results JSON here")
+    parser.add_argument("--baseline", default=None, help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-suite-")
+    configure(workdir, args.cache)
+    if args.model == "stub":
+        # Before app.config is imported, like the rest of configure()
+        os.environ["MODEL_PATH"] = build_stub_model(os.path.join(workdir, "stub.keras"))
+
+    benchmarks = {}
+    if args.only in (None, "stages"):
+        print("stages...", flush=True)
+        benchmarks.update(bench_stages(args))
+    if args.only in (None, "load"):
+        print("load tests...", flush=True)
+        benchmarks.update(asyncio.run(bench_load(args)))
+
+    results = {"meta": meta(args), "benchmarks": benchmarks}
+    print(f"\n{'benchmark':<48} {'n':>5} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'tput/s':>9} {'err':>4}")
+    for name, r in benchmarks.items():
+        print(f"{name:<48} {r['n']:>5} {r['p50_ms']:>9} {r['p90_ms']:>9} {r['p99_ms']:>9} "
+              f"{r['throughput_per_s']:>9} {r['errors']:>4}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nwrote {args.out}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            if args.fail_on_regression:
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
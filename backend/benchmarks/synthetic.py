@@ -0,0 +1,97 @@
+# benchmarks/synthetic.py
+"""Deterministic synthetic inputs shared by the benchmarks."""
+import io
+
+import numpy as np
+from PIL import Image
+
+
+def make_xray(side: int, fmt: str = "JPEG", seed: int = 0) -> bytes:
+    """Grayscale radiograph look-alike: smooth gradients plus noise, stored as RGB."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:side, 0:side]
+    fx, fy = rng.uniform(40, 120, size=2) * side / 1024
+    base = (np.sin(x / fx) + np.cos(y / fy)) * 60 + 128
+    arr = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+    return _encode(np.stack([arr] * 3, axis=-1), fmt)
+
+
+def make_color(side: int, fmt: str = "JPEG", seed: int = 0) -> bytes:
+    """A colourful photo stand-in that the grayscale filter should reject."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:side, 0:side] / side
+    arr = np.stack([x * 255, y * 255, (1 - x) * 200 + rng.normal(0, 10, x.shape)], axis=-1)
+    return _encode(np.clip(arr, 0, 255).astype(np.uint8), fmt)
+
+
+def _xray16(side: int, seed: int, bits: int) -> np.ndarray:
+    """make_xray's pattern as `bits`-bit unsigned values in a uint16 array."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:side, 0:side]
+    fx, fy = rng.uniform(40, 120, size=2) * side / 1024
+    top = (1 << bits) - 1
+    base = ((np.sin(x / fx) + np.cos(y / fy)) * 0.25 + 0.5) * top
+    return np.clip(base + rng.normal(0, top * 0.05, base.shape), 0, top).astype(np.uint16)
+
+
+def make_xray16(side: int, fmt: str = "PNG", seed: int = 0) -> bytes:
+    """16-bit grayscale radiograph look-alike (PNG or TIFF)."""
+    return _encode(_xray16(side, seed, 16), fmt)
+
+
+def make_dicom(side: int, seed: int = 0, bits_stored: int = 12, compressed: bool = False,
+               monochrome1: bool = False) -> bytes:
+    """
+    A DX DICOM file of make_xray's pattern: 16 bits allocated, `bits_stored`
+    used, with a window/level. `compressed` uses RLE Lossless instead of
+    Explicit VR Little Endian. Needs pydicom.
+    """
+    from pydicom.dataset import Dataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, RLELossless, generate_uid
+
+    arr = _xray16(side, seed, bits_stored)
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.1.1"  # Digital X-Ray Image Storage - For Presentation
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds = Dataset()
+    ds.file_meta = meta
+    ds.SOPClassUID, ds.SOPInstanceUID = meta.MediaStorageSOPClassUID, meta.MediaStorageSOPInstanceUID
+    ds.Modality = "DX"
+    ds.Rows = ds.Columns = side
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME1" if monochrome1 else "MONOCHROME2"
+    ds.BitsAllocated, ds.BitsStored, ds.HighBit, ds.PixelRepresentation = 16, bits_stored, bits_stored - 1, 0
+    ds.RescaleSlope, ds.RescaleIntercept = 1, 0
+    ds.WindowCenter, ds.WindowWidth = (1 << bits_stored) // 2, (1 << bits_stored) * 3 // 4
+    ds.PixelData = arr.tobytes()
+    if compressed:
+        ds.compress(RLELossless, arr)
+    buf = io.BytesIO()
+    ds.save_as(buf, enforce_file_format=True)
+    return buf.getvalue()
+
+
+def _encode(arr: np.ndarray, fmt: str) -> bytes:
+    buf = io.BytesIO()
+    Image.fromarray(arr).save(buf, format=fmt, **({"quality": 90} if fmt == "JPEG" else {}))
+    return buf.getvalue()
+
+
+def build_stub_model(path: str, size: int = 150, classes: int = 3, seed: int = 0):
+    """
+    Saves a tiny Keras CNN with the real model's interface (input size,
+    a "Conv_1" layer for Grad-CAM, softmax over the classes). Inference
+    then costs almost nothing, so timings isolate the app's own overhead.
+    """
+    import tensorflow as tf
+    from tensorflow import keras
+
+    tf.random.set_seed(seed)
+    inputs = keras.Input((size, size, 3))
+    x = keras.layers.Conv2D(8, 3, strides=4, activation="relu")(inputs)
+    x = keras.layers.Conv2D(16, 3, strides=2, activation="relu", name="Conv_1")(x)
+    x = keras.layers.GlobalAveragePooling2D()(x)
+    outputs = keras.layers.Dense(classes, activation="softmax")(x)
+    keras.Model(inputs, outputs).save(path)
+    return path
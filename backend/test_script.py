@@ -31,7 +31,7 @@ def main():
         print("🤖 Model loaded. Running prediction...")
 
         # 4. Call your prediction function with the bytes
-        label, confidence, probs = predict_from_bytes(image_bytes)
+        label, confidence, probs, _heatmap = predict_from_bytes(image_bytes, with_heatmap=False)
 
         # 5. Print the result
         print("\n--- Prediction Result ---")
@@ -5,7 +5,8 @@ import apiClient from './apiClient';
 export interface PredictionResult {
   prediction: string;
   confidence: number;
-  heatmap: string; // <-- NEW: Add the heatmap property
+  heatmap_url: string | null; // Grad-CAM overlay, served from the backend's uploads mount
+  heatmap?: string | null; // base64 copy, only when requested with ?heatmap=base64
   // We'll ignore the 'probabilities' list for now
 }
 
@@ -13,6 +13,7 @@ import ConfidenceAlert from "@/components/ConfidenceAlert";
 import { generatePDFReport } from "@/utils/reportGenerator";
 import { useTranslation } from "react-i18next";
 import { analyzeImageApi, type PredictionResult } from '@/api/scanApi';
+import apiClient from '@/api/apiClient';
 
 
 
@@ -234,7 +235,7 @@ const Upload = () => {
                       </button>
                     </div>
                     <AnimatePresence>
-                      {result && result.heatmap && (
+                      {result && result.heatmap_url && (
                         <motion.div
                           className="mt-4"
                           initial={{ opacity: 0, height: 0 }}
@@ -245,7 +246,7 @@ const Upload = () => {
                             AI Focus (Heatmap)
                           </p>
                           <img
-                            src={`data:image/jpeg;base64,${result.heatmap}`}
+                            src={`${apiClient.defaults.baseURL}${result.heatmap_url}`}
                             alt="Prediction heatmap"
                             className="w-full rounded-xl shadow-soft"
                           />